@@ -29,4 +29,8 @@ class InvalidTimesheetException(BusinessLogicException):
     default_code = 'invalid_timesheet'
 
 
-
+class PreconditionFailedException(APIException):
+    """Resource changed since the client last read it (If-Match mismatch)."""
+    status_code = 412
+    default_detail = 'The resource has been modified. Reload and try again.'
+    default_code = 'precondition_failed'
@@ -0,0 +1,14 @@
+"""
+Delete expired idempotency keys.
+"""
+from django.core.management.base import BaseCommand
+from common.utils import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    """Evict idempotency keys past their TTL; meant to run on a schedule."""
+    help = 'Delete expired Idempotency-Key records.'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency key(s).'))
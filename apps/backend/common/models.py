@@ -1,7 +1,9 @@
 """
 Common models shared across apps.
 """
+from django.conf import settings
 from django.db import models
+from rest_framework.utils.encoders import JSONEncoder
 
 
 class BaseModel(models.Model):
@@ -44,4 +46,28 @@ class SoftDeleteModel(BaseModel):
         self.save(update_fields=['is_deleted', 'updated_at'])
 
 
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied Idempotency-Key and the response it produced.
 
+    The row is reserved before the request is processed (status_code is
+    null until then) and expires after a TTL.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=JSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}:{self.key}'
@@ -0,0 +1,38 @@
+"""
+Upload handlers shared across apps.
+"""
+import hashlib
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+
+
+class ChecksumUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream each uploaded file to a temporary file, hashing it on the way.
+
+    Chunks go straight to disk and into a SHA-256 digest, never into
+    memory. A file that grows past max_file_size is dropped as soon as it
+    does and its name recorded in `oversized`; completed files carry their
+    digest as `sha256`.
+    """
+
+    def __init__(self, request=None, max_file_size=None):
+        super().__init__(request)
+        self.max_file_size = max_file_size
+        self.oversized = []
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.max_file_size is not None and start + len(raw_data) > self.max_file_size:
+            self.file.close()
+            self.oversized.append(self.file_name)
+            raise SkipFile()
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.digest.hexdigest()
+        return file
@@ -1,11 +1,23 @@
 """
 Common utility functions.
 """
+import hashlib
+import json
 import logging
+from datetime import timedelta
+from functools import wraps
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from audit.models import AuditLog
+from .models import IdempotencyKey
 
 logger = logging.getLogger('audit')
 
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
 
 def log_audit_action(user, action, entity, entity_id, metadata=None, request=None):
     """Log an audit action."""
@@ -89,3 +101,89 @@ class AuditTrailMixin:
             request=request
         )
 
+
+def request_fingerprint(request):
+    """Hash of the method, path and payload of a request (files by name, size and checksum if known)."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        # Multipart data also carries the uploads; they are fingerprinted below
+        data = {key: values for key, values in data.lists() if key not in request.FILES}
+    payload = {
+        'method': request.method,
+        'path': request.path,
+        'data': data,
+        'files': sorted(
+            (name, file.name, file.size, getattr(file, 'sha256', ''))
+            for name, files in request.FILES.lists()
+            for file in files
+        ),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, cls=JSONEncoder).encode()).hexdigest()
+
+
+def idempotent(view_method):
+    """
+    Make a POST view safe to retry with an `Idempotency-Key` header.
+
+    The first request reserves the key for the user, then the view runs and
+    a successful response is stored. A replay with the same payload gets
+    the stored response back without running the view. Reusing the key for
+    a different payload returns 422; a replay while the first request is
+    still running returns 409. Failed requests release the key so the
+    client can retry. Keys expire after IDEMPOTENCY_KEY_TTL.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        fingerprint = request_fingerprint(request)
+        now = timezone.now()
+        with transaction.atomic():
+            record, created = IdempotencyKey.objects.select_for_update().get_or_create(
+                user=request.user,
+                key=key[:255],
+                defaults={'fingerprint': fingerprint, 'expires_at': now + IDEMPOTENCY_KEY_TTL},
+            )
+            if not created and record.expires_at <= now:
+                record.fingerprint = fingerprint
+                record.status_code = None
+                record.response_body = None
+                record.expires_at = now + IDEMPOTENCY_KEY_TTL
+                record.save()
+                created = True
+
+        if not created:
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {'detail': 'This Idempotency-Key was already used for a different request.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.status_code is None:
+                return Response(
+                    {'detail': 'A request with this Idempotency-Key is still being processed.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response(record.response_body, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if status.is_success(response.status_code):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code, response_body=response.data
+            )
+        else:
+            record.delete()
+        return response
+
+    return wrapper
+
+
+def purge_expired_idempotency_keys(now=None):
+    """Delete expired idempotency keys; returns how many were removed."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
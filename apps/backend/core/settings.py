@@ -118,6 +118,27 @@ USE_TZ = True
 # URL Configuration
 APPEND_SLASH = False  # Disable trailing slash redirect for REST API endpoints
 
+# Cache
+# The holiday, leave calendar and defaulter caches are invalidated by bumping
+# version keys, so every worker must share one cache: set CACHE_URL to a Redis
+# URL in any deployment with more than one process. Without it each process
+# falls back to its own in-memory cache (fine for development and tests).
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'hrms',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
@@ -126,6 +147,12 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Leave attachment uploads (per-file cap in bytes, files per leave)
+LEAVE_ATTACHMENT_MAX_BYTES = config('LEAVE_ATTACHMENT_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+LEAVE_ATTACHMENT_MAX_FILES = config('LEAVE_ATTACHMENT_MAX_FILES', default=10, cast=int)
+# Opt-in: re-encode JPEG (lossy, quality 85) and PNG uploads when that makes them smaller
+LEAVE_ATTACHMENT_COMPRESS_IMAGES = config('LEAVE_ATTACHMENT_COMPRESS_IMAGES', default=False, cast=bool)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -3,7 +3,7 @@ Leave admin.
 """
 from django.contrib import admin
 from common.admin import BaseAdmin
-from .models import Leave, LeaveBalance
+from .models import Leave, LeaveBalance, LeaveLedgerEntry, MonthlyLeaveUsage
 
 
 @admin.register(Leave)
@@ -12,13 +12,48 @@ class LeaveAdmin(BaseAdmin):
     list_display = ('employee', 'leave_type', 'start_date', 'end_date', 'status')
     search_fields = ('employee__employee_id', 'employee__user__email')
     list_filter = ('leave_type', 'status', 'start_date')
+    # Decisions go through the approve/reject/cancel endpoints, which post to the ledger
+    readonly_fields = BaseAdmin.readonly_fields + (
+        'status', 'approved_by', 'approved_at', 'number_of_days', 'days_by_month'
+    )
+    # Fields the balance and usage rollup were computed from, once a leave is decided
+    booked_fields = ('employee', 'leave_type', 'start_date', 'end_date', 'start_half_day', 'end_half_day')
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly_fields = super().get_readonly_fields(request, obj)
+        if obj is not None and obj.status != 'pending':
+            readonly_fields += self.booked_fields
+        return readonly_fields
 
 
 @admin.register(LeaveBalance)
 class LeaveBalanceAdmin(admin.ModelAdmin):
-    """Leave balance admin."""
+    """Leave balance admin; balances only change through the ledger."""
     list_display = ('employee', 'sick_leave', 'casual_leave', 'earned_leave')
     search_fields = ('employee__employee_id', 'employee__user__email')
+    readonly_fields = ('paid_leave', 'sick_leave', 'casual_leave', 'earned_leave', 'updated_at')
+
+
+@admin.register(LeaveLedgerEntry)
+class LeaveLedgerEntryAdmin(admin.ModelAdmin):
+    """Read-only leave balance ledger."""
+    list_display = ('employee', 'leave_type', 'kind', 'delta', 'leave', 'created_by', 'created_at')
+    search_fields = ('employee__employee_id', 'employee__user__email')
+    list_filter = ('leave_type', 'kind', 'created_at')
 
+    def has_add_permission(self, request):
+        return False
 
+    def has_change_permission(self, request, obj=None):
+        return False
 
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MonthlyLeaveUsage)
+class MonthlyLeaveUsageAdmin(admin.ModelAdmin):
+    """Monthly leave usage rollup admin; rebuilt with the rebuild_leave_usage command."""
+    list_display = ('employee', 'leave_type', 'month', 'days')
+    search_fields = ('employee__employee_id', 'employee__user__email')
+    list_filter = ('leave_type', 'month')
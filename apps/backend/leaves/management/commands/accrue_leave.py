@@ -0,0 +1,39 @@
+"""
+Post monthly leave accruals, or close a year with carry-over lapses.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from leaves.services import accrue_leave, carry_over_leave
+
+
+class Command(BaseCommand):
+    """Run the leave policy for a period; meant to run on a schedule."""
+    help = 'Credit leave accruals for a month, or lapse balances above the carry-over caps with --carry-over.'
+
+    def add_arguments(self, parser):
+        today = timezone.localdate()
+        parser.add_argument('--year', type=int, default=today.year)
+        parser.add_argument('--month', type=int, default=today.month)
+        parser.add_argument(
+            '--carry-over', action='store_true',
+            help='Close --year: lapse balances above the carry-over caps instead of accruing.'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report totals without writing anything.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+        if not 1 <= month <= 12:
+            raise CommandError('month must be between 1 and 12.')
+
+        if options['carry_over']:
+            totals = carry_over_leave(year, dry_run=options['dry_run'], batch_size=options['batch_size'])
+            period = f'carry-over for {year}'
+        else:
+            totals = accrue_leave(year, month, dry_run=options['dry_run'], batch_size=options['batch_size'])
+            period = f'accrual for {year}-{month:02d}'
+
+        for leave_type, total in totals.items():
+            self.stdout.write(f"{leave_type}: {total['employees']} employee(s), {total['days']} day(s)")
+        verb = 'Would post' if options['dry_run'] else 'Posted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {period}.'))
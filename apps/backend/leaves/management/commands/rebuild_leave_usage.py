@@ -0,0 +1,17 @@
+"""
+Rebuild the monthly leave usage rollup from approved leaves.
+"""
+from django.core.management.base import BaseCommand
+from leaves.services import rebuild_leave_usage
+
+
+class Command(BaseCommand):
+    """Repair job for the utilisation report's rollup; approvals keep it current otherwise."""
+    help = 'Recompute MonthlyLeaveUsage from approved leaves.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = rebuild_leave_usage(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} monthly usage row(s).'))
@@ -0,0 +1,27 @@
+"""
+Recalculate the working-day duration of leaves.
+"""
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from leaves.models import Leave
+from leaves.services import recalculate_leave_days
+
+
+class Command(BaseCommand):
+    """Recompute number_of_days of pending leaves, e.g. after holidays change."""
+    help = 'Recalculate number_of_days for pending leaves from working days and holidays.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='Only leaves ending on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        leaves = Leave.objects.all()
+        if options['start']:
+            try:
+                leaves = leaves.filter(end_date__gte=date.fromisoformat(options['start']))
+            except ValueError:
+                raise CommandError('--from must be a YYYY-MM-DD date.')
+
+        changed = recalculate_leave_days(leaves, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated {changed} leave(s).'))
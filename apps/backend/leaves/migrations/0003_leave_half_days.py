@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leaves", "0002_leavebalance_paid_leave_alter_leave_leave_type_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leave",
+            name="end_half_day",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="leave",
+            name="start_half_day",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BALANCE_LEAVE_TYPES = ("paid_leave", "sick_leave", "casual_leave", "earned_leave")
+
+
+def open_ledgers(apps, schema_editor):
+    """Seed each existing balance with opening entries so ledger sums match it."""
+    LeaveBalance = apps.get_model("leaves", "LeaveBalance")
+    LeaveLedgerEntry = apps.get_model("leaves", "LeaveLedgerEntry")
+    LeaveLedgerEntry.objects.bulk_create(
+        [
+            LeaveLedgerEntry(
+                employee_id=balance["employee_id"],
+                leave_type=leave_type,
+                kind="opening",
+                delta=balance[leave_type],
+            )
+            for balance in LeaveBalance.objects.values("employee_id", *BALANCE_LEAVE_TYPES)
+            for leave_type in BALANCE_LEAVE_TYPES
+            if balance[leave_type]
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0003_add_fk_fields_with_data_migration"),
+        ("leaves", "0003_leave_half_days"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaveLedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "leave_type",
+                    models.CharField(
+                        choices=[
+                            ("paid_leave", "Paid Leave"),
+                            ("sick_leave", "Sick Leave"),
+                            ("casual_leave", "Casual Leave"),
+                            ("earned_leave", "Earned Leave"),
+                            ("unpaid_leave", "Unpaid Leave"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("opening", "Opening Balance"),
+                            ("approval", "Leave Approved"),
+                            ("reversal", "Leave Reversed"),
+                            ("accrual", "Accrual"),
+                            ("carry_over", "Carry Over"),
+                            ("adjustment", "Adjustment"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("delta", models.DecimalField(decimal_places=1, max_digits=5)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="employees.employee",
+                    ),
+                ),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leave_ledger",
+                        to="employees.employee",
+                    ),
+                ),
+                (
+                    "leave",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger_entries",
+                        to="leaves.leave",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "leave ledger entries",
+                "ordering": ["created_at", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["employee", "leave_type", "created_at"],
+                        name="leaves_leav_employe_d8f39b_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
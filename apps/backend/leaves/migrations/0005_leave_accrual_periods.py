@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leaves", "0004_leave_ledger"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leaveledgerentry",
+            name="period",
+            field=models.CharField(blank=True, default="", max_length=7),
+        ),
+        migrations.AlterField(
+            model_name="leavebalance",
+            name="casual_leave",
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=4),
+        ),
+        migrations.AlterField(
+            model_name="leavebalance",
+            name="paid_leave",
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=4),
+        ),
+        migrations.AlterField(
+            model_name="leavebalance",
+            name="sick_leave",
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=4),
+        ),
+        migrations.AddConstraint(
+            model_name="leaveledgerentry",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("period", ""), _negated=True),
+                fields=("employee", "leave_type", "kind", "period"),
+                name="leave_ledger_unique_period",
+            ),
+        ),
+    ]
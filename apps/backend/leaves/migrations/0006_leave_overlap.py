@@ -0,0 +1,81 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:27
+
+from django.db import migrations, models
+
+# Active leaves of one employee may not share a day. btree_gist lets the
+# GiST index combine employee equality with range overlap; the index also
+# serves "who is out on a date" lookups on the same daterange expression.
+ADD_OVERLAP_CONSTRAINT = """
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+ALTER TABLE leaves_leave ADD CONSTRAINT leave_no_overlap EXCLUDE USING gist (
+    employee_id WITH =,
+    daterange(start_date, end_date, '[]') WITH &&
+) WHERE (NOT is_deleted AND status IN ('pending', 'approved'));
+"""
+
+DROP_OVERLAP_CONSTRAINT = "ALTER TABLE leaves_leave DROP CONSTRAINT IF EXISTS leave_no_overlap;"
+
+# Pairs of active leaves that would violate the constraint
+FIND_OVERLAPS = """
+SELECT a.id, b.id FROM leaves_leave a
+JOIN leaves_leave b ON b.employee_id = a.employee_id AND b.id > a.id
+    AND b.start_date <= a.end_date AND a.start_date <= b.end_date
+WHERE NOT a.is_deleted AND a.status IN ('pending', 'approved')
+    AND NOT b.is_deleted AND b.status IN ('pending', 'approved')
+ORDER BY a.id, b.id;
+"""
+
+
+def add_overlap_constraint(apps, schema_editor):
+    """
+    PostgreSQL only; other databases rely on the locked check in leaves.services.
+
+    Existing overlaps are reported and the migration stopped, rather than
+    failing on the constraint: reject or cancel one leave of each listed
+    pair and re-run the migration.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(FIND_OVERLAPS)
+        overlaps = cursor.fetchall()
+    if overlaps:
+        raise RuntimeError(
+            "Cannot add the leave overlap constraint: these pending/approved leaves overlap: "
+            f"{', '.join(f'{a} and {b}' for a, b in overlaps)}. "
+            "Reject or cancel one leave of each pair and re-run the migration."
+        )
+    schema_editor.execute(ADD_OVERLAP_CONSTRAINT)
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_OVERLAP_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leaves", "0005_leave_accrual_periods"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="leave",
+            name="leaves_leav_employe_15eea4_idx",
+        ),
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                fields=["employee", "start_date", "end_date"],
+                name="leaves_leav_employe_302729_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                fields=["start_date", "end_date"], name="leaves_leav_start_d_b9a7ca_idx"
+            ),
+        ),
+        migrations.RunPython(add_overlap_constraint, drop_overlap_constraint),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0003_add_fk_fields_with_data_migration"),
+        ("leaves", "0006_leave_overlap"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthlyLeaveUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "leave_type",
+                    models.CharField(
+                        choices=[
+                            ("paid_leave", "Paid Leave"),
+                            ("sick_leave", "Sick Leave"),
+                            ("casual_leave", "Casual Leave"),
+                            ("earned_leave", "Earned Leave"),
+                            ("unpaid_leave", "Unpaid Leave"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("month", models.DateField()),
+                (
+                    "days",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=5),
+                ),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leave_usage",
+                        to="employees.employee",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["month", "employee", "leave_type"],
+                "indexes": [
+                    models.Index(
+                        fields=["month", "leave_type"],
+                        name="leaves_mont_month_f5f3d5_idx",
+                    )
+                ],
+                "unique_together": {("employee", "leave_type", "month")},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leaves", "0007_monthly_leave_usage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leaveattachment",
+            name="checksum",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="leaveattachment",
+            name="size",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-19 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leaves", "0008_leave_attachment_checksums"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leave",
+            name="days_by_month",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
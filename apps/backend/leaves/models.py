@@ -1,9 +1,10 @@
 """
 Leave models.
 """
+from django.contrib.postgres.fields import DateRangeField
 from django.db import models
 from employees.models import Employee
-from common.models import SoftDeleteModel
+from common.models import SoftDeleteManager, SoftDeleteModel
 
 LEAVE_TYPE_CHOICES = (
     ('paid_leave', 'Paid Leave'),
@@ -13,12 +14,55 @@ LEAVE_TYPE_CHOICES = (
     ('unpaid_leave', 'Unpaid Leave'),
 )
 
+# Leave types with a tracked balance; each is a LeaveBalance column
+BALANCE_LEAVE_TYPES = ('paid_leave', 'sick_leave', 'casual_leave', 'earned_leave')
+
+LEDGER_KIND_CHOICES = (
+    ('opening', 'Opening Balance'),
+    ('approval', 'Leave Approved'),
+    ('reversal', 'Leave Reversed'),
+    ('accrual', 'Accrual'),
+    ('carry_over', 'Carry Over'),
+    ('adjustment', 'Adjustment'),
+)
+
 LEAVE_STATUS_CHOICES = (
     ('pending', 'Pending'),
     ('approved', 'Approved'),
     ('rejected', 'Rejected'),
 )
 
+# Leaves that hold their dates; an employee's active leaves never overlap
+ACTIVE_LEAVE_STATUSES = ('pending', 'approved')
+
+
+class LeavePeriod(models.Func):
+    """
+    The inclusive daterange a leave covers (PostgreSQL only).
+
+    Matches the expression of the leave_no_overlap exclusion constraint, so
+    range lookups on it are served by that constraint's GiST index.
+    """
+    function = 'daterange'
+    template = "%(function)s(%(expressions)s, '[]')"
+    output_field = DateRangeField()
+
+    def __init__(self, start='start_date', end='end_date', **extra):
+        super().__init__(start, end, **extra)
+
+
+class LeaveQuerySet(models.QuerySet):
+    """Leave queryset with list and detail loading strategies."""
+
+    def for_list(self):
+        """Flat rows for list views: attachments are only counted."""
+        # Meta.ordering does not apply to aggregate queries, so restate it
+        return self.annotate(attachment_count=models.Count('attachments')).order_by('-start_date', '-id')
+
+    def with_attachments(self):
+        """Leaves with their attachments loaded up front."""
+        return self.prefetch_related('attachments')
+
 
 class Leave(SoftDeleteModel):
     """Leave model."""
@@ -27,6 +71,12 @@ class Leave(SoftDeleteModel):
     start_date = models.DateField()
     end_date = models.DateField()
     number_of_days = models.DecimalField(max_digits=4, decimal_places=1)
+    # number_of_days split by calendar month ({'YYYY-MM': 'days'}), computed with it;
+    # the usage rollup adds and removes exactly this split
+    days_by_month = models.JSONField(default=dict, blank=True)
+    # Half days off at either end of the leave
+    start_half_day = models.BooleanField(default=False)
+    end_half_day = models.BooleanField(default=False)
     reason = models.TextField(blank=True)
     status = models.CharField(
         max_length=20,
@@ -42,22 +92,43 @@ class Leave(SoftDeleteModel):
     )
     approved_at = models.DateTimeField(null=True, blank=True)
 
+    objects = SoftDeleteManager.from_queryset(LeaveQuerySet)()
+
     class Meta:
         ordering = ['-start_date']
         indexes = [
-            models.Index(fields=['employee', 'start_date']),
+            models.Index(fields=['employee', 'start_date', 'end_date']),
+            models.Index(fields=['start_date', 'end_date']),
             models.Index(fields=['status']),
         ]
+        # PostgreSQL also gets the leave_no_overlap exclusion constraint
+        # (migration 0006), which Meta cannot express portably
 
     def __str__(self):
         return f'{self.employee.employee_id} - {self.leave_type} ({self.start_date})'
 
+    def save(self, *args, **kwargs):
+        """Save and invalidate cached leave calendars (soft deletes included)."""
+        super().save(*args, **kwargs)
+        from .services import invalidate_leave_calendars
+        invalidate_leave_calendars()
+
+    def delete(self, *args, **kwargs):
+        """Delete and invalidate cached leave calendars."""
+        result = super().delete(*args, **kwargs)
+        from .services import invalidate_leave_calendars
+        invalidate_leave_calendars()
+        return result
+
 
 class LeaveAttachment(models.Model):
     """Leave attachment model."""
     leave = models.ForeignKey(Leave, on_delete=models.CASCADE, related_name='attachments')
     file = models.FileField(upload_to='leave_attachments/')
     name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(default=0)
+    # SHA-256 of the stored file
+    checksum = models.CharField(max_length=64, blank=True, default='')
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -68,11 +139,11 @@ class LeaveAttachment(models.Model):
 
 
 class LeaveBalance(models.Model):
-    """Leave balance model."""
+    """Leave balance model; credits come from the accrual policy (leaves.services.LEAVE_POLICY)."""
     employee = models.OneToOneField(Employee, on_delete=models.CASCADE, related_name='leave_balance')
-    paid_leave = models.DecimalField(max_digits=4, decimal_places=1, default=5)
-    sick_leave = models.DecimalField(max_digits=4, decimal_places=1, default=5)
-    casual_leave = models.DecimalField(max_digits=4, decimal_places=1, default=5)
+    paid_leave = models.DecimalField(max_digits=4, decimal_places=1, default=0)
+    sick_leave = models.DecimalField(max_digits=4, decimal_places=1, default=0)
+    casual_leave = models.DecimalField(max_digits=4, decimal_places=1, default=0)
     earned_leave = models.DecimalField(max_digits=4, decimal_places=1, default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -80,4 +151,79 @@ class LeaveBalance(models.Model):
         return f'{self.employee.employee_id} - Leave Balance'
 
 
+class LeaveLedgerEntry(models.Model):
+    """
+    Append-only record of every leave balance change.
 
+    LeaveBalance is a snapshot kept in step with the sum of these entries.
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_ledger')
+    leave_type = models.CharField(max_length=20, choices=LEAVE_TYPE_CHOICES)
+    kind = models.CharField(max_length=20, choices=LEDGER_KIND_CHOICES)
+    delta = models.DecimalField(max_digits=5, decimal_places=1)
+    leave = models.ForeignKey(
+        Leave,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries'
+    )
+    created_by = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    # Policy period a scheduled entry belongs to ('2026' or '2026-03'), so
+    # accrual and carry-over runs post at most once per period
+    period = models.CharField(max_length=7, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        verbose_name_plural = 'leave ledger entries'
+        indexes = [
+            models.Index(fields=['employee', 'leave_type', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['employee', 'leave_type', 'kind', 'period'],
+                condition=~models.Q(period=''),
+                name='leave_ledger_unique_period',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.employee_id} {self.leave_type} {self.delta:+} ({self.kind})'
+
+    def save(self, *args, **kwargs):
+        """Ledger entries are never changed once written."""
+        if self.pk:
+            raise ValueError('Leave ledger entries are append-only.')
+        super().save(*args, **kwargs)
+
+
+class MonthlyLeaveUsage(models.Model):
+    """
+    Approved leave days per employee, leave type and calendar month.
+
+    A rollup kept in step with approvals and cancellations, so utilisation
+    reports never scan leaves_leave; leaves.services.rebuild_leave_usage()
+    recomputes it for repair.
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_usage')
+    leave_type = models.CharField(max_length=20, choices=LEAVE_TYPE_CHOICES)
+    # First day of the month
+    month = models.DateField()
+    days = models.DecimalField(max_digits=5, decimal_places=1, default=0)
+
+    class Meta:
+        ordering = ['month', 'employee', 'leave_type']
+        unique_together = ['employee', 'leave_type', 'month']
+        indexes = [
+            models.Index(fields=['month', 'leave_type']),
+        ]
+
+    def __str__(self):
+        return f'{self.employee_id} {self.leave_type} {self.month:%Y-%m}: {self.days}'
@@ -9,8 +9,8 @@ class LeaveAttachmentSerializer(serializers.ModelSerializer):
     """Leave attachment serializer."""
     class Meta:
         model = LeaveAttachment
-        fields = ('id', 'file', 'name', 'uploaded_at')
-        read_only_fields = ('id', 'uploaded_at')
+        fields = ('id', 'file', 'name', 'size', 'checksum', 'uploaded_at')
+        read_only_fields = ('id', 'size', 'checksum', 'uploaded_at')
 
 
 class LeaveSerializer(serializers.ModelSerializer):
@@ -21,10 +21,40 @@ class LeaveSerializer(serializers.ModelSerializer):
         model = Leave
         fields = (
             'id', 'employee', 'leave_type', 'start_date', 'end_date',
-            'number_of_days', 'reason', 'status', 'approved_by',
+            'start_half_day', 'end_half_day', 'number_of_days', 'reason', 'status', 'approved_by',
             'approved_at', 'attachments', 'created_at', 'updated_at'
         )
-        read_only_fields = ('id', 'approved_by', 'approved_at', 'created_at', 'updated_at')
+        # Status only changes through approve/reject, which keep the ledger in step
+        read_only_fields = (
+            'id', 'employee', 'number_of_days', 'status', 'approved_by', 'approved_at', 'created_at', 'updated_at'
+        )
+
+    def validate(self, attrs):
+        """Validate the date range, including dates a partial update keeps."""
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date < start_date:
+            raise serializers.ValidationError("end_date cannot be before start_date.")
+        return attrs
+
+
+class LeaveListSerializer(serializers.ModelSerializer):
+    """
+    Lightweight leave serializer for list views.
+
+    Expects a queryset built with Leave.objects.for_list(), which
+    annotates attachment_count; attachments themselves are on the detail view.
+    """
+    attachment_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Leave
+        fields = (
+            'id', 'employee', 'leave_type', 'start_date', 'end_date',
+            'start_half_day', 'end_half_day', 'number_of_days', 'reason', 'status', 'approved_by',
+            'approved_at', 'attachment_count', 'created_at', 'updated_at'
+        )
+        read_only_fields = fields
 
 
 class CreateLeaveSerializer(serializers.Serializer):
@@ -34,8 +64,16 @@ class CreateLeaveSerializer(serializers.Serializer):
     )
     start_date = serializers.DateField()
     end_date = serializers.DateField()
+    start_half_day = serializers.BooleanField(default=False)
+    end_half_day = serializers.BooleanField(default=False)
     reason = serializers.CharField(required=False, allow_blank=True)
 
+    def validate(self, attrs):
+        """Validate the date range."""
+        if attrs['end_date'] < attrs['start_date']:
+            raise serializers.ValidationError("end_date cannot be before start_date.")
+        return attrs
+
 
 class LeaveBalanceSerializer(serializers.ModelSerializer):
     """Leave balance serializer."""
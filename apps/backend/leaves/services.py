@@ -0,0 +1,828 @@
+"""
+Leave services.
+"""
+import hashlib
+from calendar import monthrange
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_FLOOR
+from io import BytesIO
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from common.exceptions import BusinessLogicException, InsufficientLeaveException
+from employees.models import Employee
+from settings.services import get_holiday_version, get_holidays_between, holidays_between
+from .models import (
+    Leave, LeaveAttachment, LeaveBalance, LeaveLedgerEntry, LeavePeriod, MonthlyLeaveUsage,
+    ACTIVE_LEAVE_STATUSES, BALANCE_LEAVE_TYPES, LEAVE_TYPE_CHOICES
+)
+
+HALF_DAY = Decimal('0.5')
+
+# Leave policy (docs/backend/06-business-rules.md), in days. Annual grants
+# post once per calendar year, pro-rated from the joining month; monthly
+# grants post from the joining month on. usable_after_months holds the
+# leave type back until that much service at the leave's start date.
+# carry_over caps what survives year end (None keeps it all).
+LEAVE_POLICY = {
+    'paid_leave': {'annual': Decimal('5'), 'carry_over': Decimal('0')},
+    'sick_leave': {'annual': Decimal('5'), 'carry_over': Decimal('0')},
+    'casual_leave': {'annual': Decimal('5'), 'carry_over': Decimal('0')},
+    'earned_leave': {
+        'monthly': Decimal('1.5'),
+        'usable_after_months': 12,
+        'carry_over': None,
+        'employment_types': ('full_time', 'part_time'),
+    },
+}
+ACCRUING_STATUSES = ('active', 'on_leave')
+
+CALENDAR_VERSION_KEY = 'leaves:calendar:version'
+CALENDAR_CACHE_TIMEOUT = 10 * 60
+MAX_CALENDAR_DAYS = 93
+
+# Storage writes (and optional image compression) for attachments run off the request thread
+attachment_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='leave-attachments')
+COMPRESSIBLE_IMAGE_FORMATS = ('JPEG', 'PNG')
+
+
+def count_weekdays(start, end):
+    """Number of Monday-Friday dates from start to end, inclusive, without iterating days."""
+    if end < start:
+        return 0
+    days = (end - start).days + 1
+    full_weeks, remainder = divmod(days, 7)
+    first = start.weekday()
+    return full_weeks * 5 + sum(1 for offset in range(remainder) if (first + offset) % 7 < 5)
+
+
+def count_working_days(start, end, holidays, start_half_day=False, end_half_day=False):
+    """
+    Working days from start to end, inclusive, as a Decimal.
+
+    Weekdays are counted arithmetically and the weekday holidays in range
+    are subtracted, so the cost does not grow with the length of the leave.
+    A half day on the first or last date counts 0.5 if that date is a
+    working day; a one-day leave with either flag counts 0.5.
+    """
+    if end < start:
+        return Decimal(0)
+
+    def is_working_day(day):
+        return day.weekday() < 5 and day not in holidays
+
+    days = Decimal(count_weekdays(start, end) - sum(
+        1 for day in holidays if start <= day <= end and day.weekday() < 5
+    ))
+    if start == end:
+        return days * HALF_DAY if (start_half_day or end_half_day) else days
+    if start_half_day and is_working_day(start):
+        days -= HALF_DAY
+    if end_half_day and is_working_day(end):
+        days -= HALF_DAY
+    return days
+
+
+def split_leave_days(start, end, start_half_day=False, end_half_day=False, holidays=None):
+    """
+    (number_of_days, days_by_month) of a leave, in working days.
+
+    Uses the cached holiday calendars unless `holidays` is given.
+    days_by_month is the per-month split stored on the leave; it always
+    adds up to number_of_days.
+    """
+    if holidays is None:
+        holidays = get_holidays_between(start, end)
+    months = leave_days_by_month(start, end, holidays, start_half_day, end_half_day)
+    return sum(months.values(), Decimal(0)), {f'{month:%Y-%m}': str(days) for month, days in months.items()}
+
+
+def recalculate_leave_days(leaves=None, batch_size=1000):
+    """
+    Recompute number_of_days for many pending leaves; returns how many changed.
+
+    Approved leaves are left alone: their days are already in the ledger
+    and the usage rollup. Holiday calendars for the whole span are loaded
+    once, then leaves are streamed and only changed rows are written back
+    with bulk_update in batches.
+    """
+    leaves = (Leave.objects.all() if leaves is None else leaves).filter(status='pending')
+    span = leaves.aggregate(first=Min('start_date'), last=Max('end_date'))
+    if span['first'] is None:
+        return 0
+    holidays = get_holidays_between(span['first'], span['last'])
+
+    changed = 0
+    batch = []
+    now = timezone.now()
+    for leave in leaves.only(
+        'id', 'start_date', 'end_date', 'start_half_day', 'end_half_day', 'number_of_days', 'days_by_month',
+        'updated_at'
+    ).iterator(chunk_size=batch_size):
+        days, days_by_month = split_leave_days(
+            leave.start_date, leave.end_date, leave.start_half_day, leave.end_half_day, holidays
+        )
+        if (leave.number_of_days, leave.days_by_month) != (days, days_by_month):
+            leave.number_of_days = days
+            leave.days_by_month = days_by_month
+            leave.updated_at = now
+            batch.append(leave)
+        if len(batch) >= batch_size:
+            changed += _save_days(batch)
+            batch = []
+    return changed + _save_days(batch)
+
+
+@transaction.atomic
+def _save_days(leaves):
+    """Write number_of_days (and its split) for the leaves of a batch that are still pending once locked."""
+    pending = set(
+        Leave.objects.select_for_update().filter(pk__in=[leave.pk for leave in leaves], status='pending')
+        .values_list('pk', flat=True)
+    )
+    leaves = [leave for leave in leaves if leave.pk in pending]
+    Leave.objects.bulk_update(leaves, ['number_of_days', 'days_by_month', 'updated_at'])
+    return len(leaves)
+
+
+def overlapping_leaves(employee, start, end):
+    """Active leaves of an employee sharing at least one day with start..end."""
+    return Leave.objects.filter(
+        employee=employee, status__in=ACTIVE_LEAVE_STATUSES, start_date__lte=end, end_date__gte=start
+    )
+
+
+def ensure_no_overlap(employee, start, end, exclude=None):
+    """
+    Raise BusinessLogicException if start..end overlaps an active leave.
+
+    Locks the employee row first, so concurrent bookings for the same
+    employee are checked one at a time. Call inside a transaction.
+    """
+    Employee.objects.select_for_update().filter(pk=employee.pk).first()
+    clash = overlapping_leaves(employee, start, end)
+    if exclude is not None:
+        clash = clash.exclude(pk=exclude.pk)
+    clash = clash.order_by('start_date').first()
+    if clash:
+        raise BusinessLogicException(overlap_message(clash))
+
+
+def overlap_message(leave):
+    """Error message naming the leave a booking clashes with."""
+    return (
+        f'These dates overlap your {leave.get_leave_type_display()} '
+        f'from {leave.start_date} to {leave.end_date}.'
+    )
+
+
+@transaction.atomic
+def add_months(day, months):
+    """The same day `months` later, clamped to the end of a shorter month."""
+    year, month = divmod(day.month - 1 + months, 12)
+    year, month = day.year + year, month + 1
+    return date(year, month, min(day.day, monthrange(year, month)[1]))
+
+
+def ensure_leave_usable(employee, leave_type, start):
+    """Raise BusinessLogicException if the policy holds `leave_type` back on `start` (e.g. earned leave in year one)."""
+    months = LEAVE_POLICY.get(leave_type, {}).get('usable_after_months')
+    if not months:
+        return
+    usable_from = add_months(employee.date_of_joining, months)
+    if start < usable_from:
+        label = dict(LEAVE_TYPE_CHOICES)[leave_type]
+        raise BusinessLogicException(
+            f'{label} can be taken from {usable_from}, after {months} months of service.'
+        )
+
+
+def book_leave(employee, **fields):
+    """
+    Create a leave after checking it against the policy and the employee's active leaves.
+
+    On PostgreSQL the leave_no_overlap exclusion constraint backs the check
+    up; a violation surfaces as the same BusinessLogicException.
+    """
+    ensure_leave_usable(employee, fields['leave_type'], fields['start_date'])
+    ensure_no_overlap(employee, fields['start_date'], fields['end_date'])
+    try:
+        with transaction.atomic():
+            return Leave.objects.create(employee=employee, **fields)
+    except IntegrityError as exc:
+        if 'leave_no_overlap' not in str(exc):
+            raise
+        clash = overlapping_leaves(employee, fields['start_date'], fields['end_date']).first()
+        raise BusinessLogicException(overlap_message(clash) if clash else 'These dates overlap another leave.')
+
+
+def leaves_covering(day, statuses=('approved',)):
+    """
+    Leaves that include `day`, i.e. who is out on that date.
+
+    On PostgreSQL the lookup is written against LeavePeriod so the planner
+    can use the exclusion constraint's GiST index; elsewhere it is a range
+    scan on the (start_date, end_date) index.
+    """
+    leaves = Leave.objects.filter(status__in=statuses)
+    if connection.vendor == 'postgresql':
+        return leaves.alias(period=LeavePeriod()).filter(period__contains=day)
+    return leaves.filter(start_date__lte=day, end_date__gte=day)
+
+
+def get_calendar_version():
+    """Current leave calendar version; bumped whenever a leave changes."""
+    version = cache.get(CALENDAR_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(CALENDAR_VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_leave_calendars():
+    """Retire every cached leave calendar once the current transaction commits."""
+    def bump():
+        try:
+            cache.incr(CALENDAR_VERSION_KEY)
+        except ValueError:
+            cache.set(CALENDAR_VERSION_KEY, 2, None)
+    transaction.on_commit(bump)
+
+
+def team_members(employee):
+    """The employee, their direct reports and colleagues sharing their reporting manager."""
+    members = Q(pk=employee.pk) | Q(reporting_manager=employee)
+    if employee.reporting_manager_id:
+        members |= Q(reporting_manager_id=employee.reporting_manager_id)
+    return Employee.objects.filter(members)
+
+
+def get_leave_calendar(members, scope_key, start, end):
+    """
+    Cached leave calendar of a group of employees from start to end.
+
+    Cached per (scope_key, window) under the current leave and holiday
+    versions, so any leave or holiday change retires it.
+    """
+    key = f'leaves:calendar:{get_calendar_version()}:{get_holiday_version()}:{scope_key}:{start}:{end}'
+    calendar = cache.get(key)
+    if calendar is None:
+        calendar = build_leave_calendar(members, start, end)
+        cache.set(key, calendar, CALENDAR_CACHE_TIMEOUT)
+    return calendar
+
+
+def build_leave_calendar(members, start, end):
+    """
+    Who is out on each working day from start to end.
+
+    One interval query over the (employee, start_date, end_date) index
+    finds the members' active leaves; they are spread over the window in
+    Python, skipping weekends and holidays. Days map to compact
+    [employee pk, leave_type, status, half_day] entries.
+    """
+    holidays = holidays_between(start, end, include_optional=True)
+    closed = {holiday.date for holiday in holidays if not holiday.is_optional}
+    leaves = Leave.objects.filter(
+        employee__in=members, status__in=ACTIVE_LEAVE_STATUSES, start_date__lte=end, end_date__gte=start
+    ).values_list(
+        'employee_id', 'employee__employee_id', 'employee__user__first_name', 'employee__user__last_name',
+        'leave_type', 'status', 'start_date', 'end_date', 'start_half_day', 'end_half_day',
+    )
+
+    employees = {}
+    days = {}
+    for (pk, employee_id, first_name, last_name, leave_type, leave_status,
+         leave_start, leave_end, start_half_day, end_half_day) in leaves:
+        employees[pk] = {'employee_id': employee_id, 'name': f'{first_name} {last_name}'.strip()}
+        day = max(leave_start, start)
+        while day <= min(leave_end, end):
+            if day.weekday() < 5 and day not in closed:
+                half_day = (day == leave_start and start_half_day) or (day == leave_end and end_half_day)
+                days.setdefault(day.isoformat(), []).append([pk, leave_type, leave_status, half_day])
+            day += timedelta(days=1)
+
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'holidays': [
+            {'date': holiday.date.isoformat(), 'name': holiday.name, 'is_optional': holiday.is_optional}
+            for holiday in holidays
+        ],
+        'employees': employees,
+        'days': dict(sorted(days.items())),
+    }
+
+
+def get_or_create_balance(employee):
+    """
+    Get an employee's balance snapshot, opening it if needed.
+
+    A new balance is credited with what the policy owes for the current
+    month, posted through the ledger exactly as the scheduled run would.
+    """
+    with transaction.atomic():
+        balance, created = LeaveBalance.objects.get_or_create(employee=employee)
+        if created:
+            today = timezone.localdate()
+            accrue_leave(today.year, today.month, employees=[employee.pk])
+            balance.refresh_from_db()
+    return balance
+
+
+def post_balance_change(employee, leave_type, delta, kind, leave=None, actor=None, require_funds=False):
+    """
+    Apply one balance change: a ledger entry plus an F() update of the snapshot.
+
+    With `require_funds`, the snapshot UPDATE only matches while the
+    balance covers the debit, so concurrent debits cannot overdraw it; a
+    miss raises InsufficientLeaveException. Call inside a transaction.
+    """
+    balances = LeaveBalance.objects.filter(employee=employee)
+    if require_funds:
+        balances = balances.filter(**{f'{leave_type}__gte': -delta})
+    if not balances.update(**{leave_type: F(leave_type) + delta, 'updated_at': timezone.now()}):
+        available = LeaveBalance.objects.filter(employee=employee).values_list(leave_type, flat=True).first()
+        label = dict(LEAVE_TYPE_CHOICES)[leave_type]
+        raise InsufficientLeaveException(
+            f'Insufficient {label} balance: {available} day(s) available, {-delta} requested.'
+        )
+    LeaveLedgerEntry.objects.create(
+        employee=employee, leave_type=leave_type, kind=kind, delta=delta, leave=leave, created_by=actor
+    )
+
+
+@transaction.atomic
+def approve_leave(leave, approver):
+    """
+    Approve a pending leave and deduct it from the balance.
+
+    The leave is re-read under a row lock, so two approvers cannot both
+    succeed and the deduction uses the committed dates and days even if an
+    edit raced the request; the deduction is a conditional F() UPDATE on
+    the snapshot plus one ledger row. A short balance rolls the approval
+    back with InsufficientLeaveException.
+    """
+    locked = Leave.objects.select_for_update().filter(pk=leave.pk).first()
+    if locked is None:
+        raise NotFound('Leave not found.')
+    if locked.status != 'pending':
+        raise BusinessLogicException(f'Can only approve pending leaves. Current status: {locked.status}')
+
+    now = timezone.now()
+    Leave.objects.filter(pk=locked.pk).update(status='approved', approved_by=approver, approved_at=now, updated_at=now)
+    invalidate_leave_calendars()
+    record_leave_usage(locked)
+
+    if locked.leave_type in BALANCE_LEAVE_TYPES:
+        get_or_create_balance(locked.employee)
+        post_balance_change(
+            locked.employee, locked.leave_type, -locked.number_of_days, 'approval',
+            leave=locked, actor=approver, require_funds=True
+        )
+
+    leave.refresh_from_db()
+    return leave
+
+
+@transaction.atomic
+def reject_leave(leave, approver):
+    """Reject a pending leave."""
+    if not Leave.objects.filter(pk=leave.pk, status='pending').update(status='rejected', updated_at=timezone.now()):
+        raise BusinessLogicException(f'Can only reject pending leaves. Current status: {leave.status}')
+    invalidate_leave_calendars()
+    leave.status = 'rejected'
+    return leave
+
+
+@transaction.atomic
+def cancel_leave(leave, actor):
+    """
+    Soft delete a leave, crediting the balance (and usage rollup) back if it had been approved.
+
+    The leave is re-read under a row lock, so the reversal follows its
+    committed status: a racing approval is waited for, and a second
+    cancellation finds nothing to delete. The credit is what the ledger
+    holds against the leave, i.e. exactly what its approval debited.
+    """
+    leave = Leave.objects.select_for_update().filter(pk=leave.pk).first()
+    if leave is None:
+        raise NotFound('Leave not found.')
+    if leave.status == 'approved':
+        record_leave_usage(leave, sign=-1)
+        debited = LeaveLedgerEntry.objects.filter(leave=leave).aggregate(total=Sum('delta'))['total']
+        if debited:
+            post_balance_change(leave.employee, leave.leave_type, -debited, 'reversal', leave=leave, actor=actor)
+    leave.soft_delete()
+
+
+def rebuild_balances(employees=None):
+    """
+    Recompute balance snapshots from the ledger; returns how many changed.
+
+    One grouped SUM over the ledger, then bulk_update of the snapshots
+    that drifted. Used to repair snapshots, never on the request path.
+    """
+    balances = LeaveBalance.objects.all()
+    ledger = LeaveLedgerEntry.objects.all()
+    if employees is not None:
+        balances = balances.filter(employee__in=employees)
+        ledger = ledger.filter(employee__in=employees)
+
+    sums = {
+        (employee_id, leave_type): total
+        for employee_id, leave_type, total in ledger.values('employee_id', 'leave_type')
+        .annotate(total=Sum('delta')).values_list('employee_id', 'leave_type', 'total')
+    }
+    changed = []
+    for balance in balances:
+        drifted = False
+        for leave_type in BALANCE_LEAVE_TYPES:
+            total = sums.get((balance.employee_id, leave_type), 0)
+            if getattr(balance, leave_type) != total:
+                setattr(balance, leave_type, total)
+                drifted = True
+        if drifted:
+            changed.append(balance)
+    LeaveBalance.objects.bulk_update(changed, BALANCE_LEAVE_TYPES, batch_size=1000)
+    return len(changed)
+
+
+def leave_days_by_month(start, end, holidays, start_half_day=False, end_half_day=False):
+    """Working days of a leave split by calendar month, as {first of month: days}."""
+    months = {}
+    month_start = start.replace(day=1)
+    while month_start <= end:
+        month_end = month_start.replace(day=monthrange(month_start.year, month_start.month)[1])
+        segment_start, segment_end = max(start, month_start), min(end, month_end)
+        days = count_working_days(
+            segment_start, segment_end, holidays,
+            start_half_day and segment_start == start, end_half_day and segment_end == end
+        )
+        if days:
+            months[month_start] = days
+        month_start = month_end + timedelta(days=1)
+    return months
+
+
+def leave_usage_months(leave, holidays=None):
+    """
+    A leave's days for the usage rollup, as {first of month: days}.
+
+    This is the split stored with its number_of_days, so the rollup agrees
+    with the ledger and a cancellation removes exactly what the approval
+    added, whatever happened to the holiday calendar in between. Leaves
+    booked before the split was stored fall back to the current calendar.
+    """
+    if leave.days_by_month:
+        return {date.fromisoformat(f'{month}-01'): Decimal(days) for month, days in leave.days_by_month.items()}
+    if holidays is None:
+        holidays = get_holidays_between(leave.start_date, leave.end_date)
+    return leave_days_by_month(leave.start_date, leave.end_date, holidays, leave.start_half_day, leave.end_half_day)
+
+
+def record_leave_usage(leave, sign=1):
+    """
+    Add an approved leave's days to the monthly usage rollup (sign=-1 removes them).
+
+    Each touched month is an F() increment, creating the row on first use.
+    Call inside a transaction.
+    """
+    for month, days in leave_usage_months(leave).items():
+        usage = MonthlyLeaveUsage.objects.filter(
+            employee_id=leave.employee_id, leave_type=leave.leave_type, month=month
+        )
+        if usage.update(days=F('days') + sign * days):
+            continue
+        try:
+            with transaction.atomic():
+                MonthlyLeaveUsage.objects.create(
+                    employee_id=leave.employee_id, leave_type=leave.leave_type, month=month, days=sign * days
+                )
+        except IntegrityError:
+            # Another transaction created the row first
+            usage.update(days=F('days') + sign * days)
+
+
+def rebuild_leave_usage(batch_size=1000):
+    """
+    Recompute the monthly usage rollup from approved leaves; returns the row count.
+
+    A repair job, never on the request path: streams every approved leave
+    once, summing the month splits stored on the leaves (the holiday
+    calendars for the whole span are loaded up front for leaves without
+    one), then replaces the rollup in one transaction. Approvals that commit
+    while it runs may be missed, so run it when the system is quiet.
+    """
+    leaves = Leave.objects.filter(status='approved')
+    span = leaves.aggregate(first=Min('start_date'), last=Max('end_date'))
+    totals = defaultdict(Decimal)
+    if span['first'] is not None:
+        holidays = get_holidays_between(span['first'], span['last'])
+        rows = leaves.only(
+            'employee_id', 'leave_type', 'start_date', 'end_date', 'start_half_day', 'end_half_day', 'days_by_month'
+        ).iterator(chunk_size=batch_size)
+        for leave in rows:
+            for month, days in leave_usage_months(leave, holidays).items():
+                totals[(leave.employee_id, leave.leave_type, month)] += days
+
+    with transaction.atomic():
+        MonthlyLeaveUsage.objects.all().delete()
+        MonthlyLeaveUsage.objects.bulk_create([
+            MonthlyLeaveUsage(employee_id=employee_id, leave_type=leave_type, month=month, days=days)
+            for (employee_id, leave_type, month), days in totals.items()
+        ], batch_size=batch_size)
+    return len(totals)
+
+
+def get_leave_utilisation(employees, start, end):
+    """
+    Leave utilisation of a set of employees for the months start..end.
+
+    Reads only the monthly usage rollup and the balance snapshots (two
+    queries), so multi-year windows cost the same as a single month.
+    Utilisation is the share of available days used: taken in the window
+    over taken plus the current balance.
+    """
+    usage = (
+        MonthlyLeaveUsage.objects.filter(employee__in=employees, month__range=(start, end))
+        .exclude(days=0)
+        .order_by('employee__employee_id', 'month', 'leave_type')
+        .values_list(
+            'employee_id', 'employee__employee_id', 'employee__user__first_name', 'employee__user__last_name',
+            'employee__department__name', 'leave_type', 'month', 'days',
+        )
+    )
+
+    report = {}
+    departments = defaultdict(lambda: defaultdict(Decimal))
+    for pk, employee_id, first_name, last_name, department, leave_type, month, days in usage:
+        row = report.setdefault(pk, {
+            'employee': pk,
+            'employee_id': employee_id,
+            'employee_name': f'{first_name} {last_name}'.strip(),
+            'department': department,
+            'months': {},
+            'taken': defaultdict(Decimal),
+        })
+        row['months'].setdefault(f'{month:%Y-%m}', {})[leave_type] = days
+        row['taken'][leave_type] += days
+        departments[department][leave_type] += days
+
+    balances = {
+        balance['employee_id']: balance
+        for balance in LeaveBalance.objects.filter(employee_id__in=report).values('employee_id', *BALANCE_LEAVE_TYPES)
+    }
+    for pk, row in report.items():
+        balance = balances.get(pk, {})
+        row['taken'] = dict(row['taken'])
+        row['balance'] = {leave_type: balance.get(leave_type) for leave_type in BALANCE_LEAVE_TYPES}
+        row['utilisation'] = {}
+        for leave_type in BALANCE_LEAVE_TYPES:
+            taken = row['taken'].get(leave_type, Decimal('0'))
+            available = taken + (balance.get(leave_type) or 0)
+            row['utilisation'][leave_type] = round(taken * 100 / available, 1) if available > 0 else None
+
+    return {
+        'from': f'{start:%Y-%m}',
+        'to': f'{end:%Y-%m}',
+        'employees': list(report.values()),
+        'departments': {department: dict(totals) for department, totals in departments.items()},
+    }
+
+
+def accruing_employees(start, end):
+    """Employees on the books at some point from start to end."""
+    return Employee.objects.filter(
+        employment_status__in=ACCRUING_STATUSES,
+        date_of_joining__lte=end,
+    ).filter(Q(termination_date__isnull=True) | Q(termination_date__gte=start))
+
+
+def accrual_credits(employment_type, joined, year, month):
+    """(leave_type, period, days) credits the policy owes one employee for a month."""
+    credits = []
+    for leave_type, policy in LEAVE_POLICY.items():
+        if employment_type not in policy.get('employment_types', (employment_type,)):
+            continue
+        if 'annual' in policy:
+            months = 12 if joined.year < year else 13 - joined.month
+            days = (policy['annual'] * months / 12 / HALF_DAY).to_integral_value(ROUND_FLOOR) * HALF_DAY
+            period = str(year)
+        else:
+            days, period = policy['monthly'], f'{year}-{month:02d}'
+        if days:
+            credits.append((leave_type, period, days))
+    return credits
+
+
+def accrue_leave(year, month, employees=None, dry_run=False, batch_size=1000):
+    """
+    Post the policy's credits for one month to every eligible employee.
+
+    Employees are read in primary-key batches; each batch commits on its
+    own with one bulk_create of ledger entries and one bulk_update of the
+    snapshots. Credits already posted for a period are skipped, so a
+    repeated or interrupted run just resumes. Returns per-leave-type
+    totals; with dry_run nothing is written.
+    """
+    eligible = accruing_employees(date(year, month, 1), date(year, month, monthrange(year, month)[1]))
+    if employees is not None:
+        eligible = eligible.filter(pk__in=employees)
+    periods = (str(year), f'{year}-{month:02d}')
+
+    totals = {leave_type: {'employees': 0, 'days': Decimal('0')} for leave_type in LEAVE_POLICY}
+    for batch in _batches(eligible, ('pk', 'employment_type', 'date_of_joining'), batch_size):
+        with transaction.atomic():
+            posted = set(LeaveLedgerEntry.objects.filter(
+                employee_id__in=[row[0] for row in batch], kind='accrual', period__in=periods
+            ).values_list('employee_id', 'leave_type', 'period'))
+            entries = [
+                LeaveLedgerEntry(employee_id=pk, leave_type=leave_type, kind='accrual', delta=days, period=period)
+                for pk, employment_type, joined in batch
+                for leave_type, period, days in accrual_credits(employment_type, joined, year, month)
+                if (pk, leave_type, period) not in posted
+            ]
+            _tally(totals, entries)
+            if entries and not dry_run:
+                _post_ledger_batch(entries, _lock_balances({entry.employee_id for entry in entries}))
+    return totals
+
+
+def carry_over_leave(year, employees=None, dry_run=False, batch_size=1000):
+    """
+    Lapse balances above the policy's carry-over caps at the end of a year.
+
+    The year-end balance is the ledger sum before 1 January, so credits
+    for the new year never lapse; each lapse is a negative carry_over
+    entry of at most the current balance. Batched, resumable and
+    dry-run capable like accrue_leave().
+    """
+    caps = {
+        leave_type: policy['carry_over']
+        for leave_type, policy in LEAVE_POLICY.items()
+        if policy['carry_over'] is not None
+    }
+    year_end = timezone.make_aware(datetime(year + 1, 1, 1))
+    holders = Employee.objects.filter(leave_balance__isnull=False)
+    if employees is not None:
+        holders = holders.filter(pk__in=employees)
+
+    totals = {leave_type: {'employees': 0, 'days': Decimal('0')} for leave_type in caps}
+    for batch in _batches(holders, ('pk',), batch_size):
+        ids = [pk for pk, in batch]
+        with transaction.atomic():
+            if dry_run:
+                balances = {
+                    balance.employee_id: balance for balance in LeaveBalance.objects.filter(employee_id__in=ids)
+                }
+            else:
+                balances = _lock_balances(ids)
+            posted = set(LeaveLedgerEntry.objects.filter(
+                employee_id__in=ids, kind='carry_over', period=str(year)
+            ).values_list('employee_id', 'leave_type'))
+            year_end_totals = (
+                LeaveLedgerEntry.objects.filter(employee_id__in=ids, leave_type__in=caps, created_at__lt=year_end)
+                .values('employee_id', 'leave_type')
+                .annotate(total=Sum('delta'))
+                .values_list('employee_id', 'leave_type', 'total')
+            )
+            entries = []
+            for employee_id, leave_type, total in year_end_totals:
+                lapse = min(total - caps[leave_type], getattr(balances[employee_id], leave_type))
+                if lapse > 0 and (employee_id, leave_type) not in posted:
+                    entries.append(LeaveLedgerEntry(
+                        employee_id=employee_id, leave_type=leave_type, kind='carry_over',
+                        delta=-lapse, period=str(year)
+                    ))
+            _tally(totals, entries)
+            if entries and not dry_run:
+                _post_ledger_batch(entries, balances)
+    return totals
+
+
+def _batches(queryset, fields, batch_size):
+    """Yield value rows in primary-key order, one keyset page at a time."""
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list(*fields)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1][0]
+
+
+def _lock_balances(employee_ids):
+    """Lock the balance snapshots of a batch, opening any that are missing."""
+    balances = {
+        balance.employee_id: balance
+        for balance in LeaveBalance.objects.select_for_update().filter(employee_id__in=employee_ids)
+    }
+    missing = [pk for pk in employee_ids if pk not in balances]
+    if missing:
+        LeaveBalance.objects.bulk_create([LeaveBalance(employee_id=pk) for pk in missing], ignore_conflicts=True)
+        balances.update({
+            balance.employee_id: balance
+            for balance in LeaveBalance.objects.select_for_update().filter(employee_id__in=missing)
+        })
+    return balances
+
+
+def _post_ledger_batch(entries, balances):
+    """Write ledger entries and fold them into their locked balance snapshots."""
+    now = timezone.now()
+    changed = {}
+    for entry in entries:
+        balance = balances[entry.employee_id]
+        setattr(balance, entry.leave_type, getattr(balance, entry.leave_type) + entry.delta)
+        balance.updated_at = now
+        changed[entry.employee_id] = balance
+    LeaveLedgerEntry.objects.bulk_create(entries)
+    LeaveBalance.objects.bulk_update(changed.values(), [*BALANCE_LEAVE_TYPES, 'updated_at'])
+
+
+def _tally(totals, entries):
+    """Add a batch's entries to the per-leave-type totals."""
+    for entry in entries:
+        totals[entry.leave_type]['employees'] += 1
+        totals[entry.leave_type]['days'] += entry.delta
+
+
+def save_leave_attachments(leave, uploads):
+    """
+    Store uploaded files for a leave and insert their rows with one bulk_create.
+
+    Files are written to storage in parallel on the attachment pool; rows
+    are inserted only once every write succeeded, and stored files are
+    removed again if anything fails. With LEAVE_ATTACHMENT_COMPRESS_IMAGES
+    images are compressed before they are written, so the row, the
+    response and any idempotent replay describe the file actually stored.
+    Call inside a transaction.
+    """
+    if not uploads:
+        return []
+    storage = LeaveAttachment._meta.get_field('file').storage
+    compress = settings.LEAVE_ATTACHMENT_COMPRESS_IMAGES
+    futures = [attachment_pool.submit(_store_attachment, upload, compress) for upload in uploads]
+    wait(futures)
+    stored = [future.result() for future in futures if future.exception() is None]
+    try:
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+        return LeaveAttachment.objects.bulk_create([
+            LeaveAttachment(leave=leave, file=name, name=upload.name, size=size, checksum=checksum)
+            for upload, (name, size, checksum) in zip(uploads, stored)
+        ])
+    except Exception:
+        for name, size, checksum in stored:
+            storage.delete(name)
+        raise
+
+
+def _store_attachment(upload, compress=False):
+    """Write one upload to storage, compressed if asked and smaller; returns (stored name, size, SHA-256)."""
+    field = LeaveAttachment._meta.get_field('file')
+    content, size, checksum = upload, upload.size, getattr(upload, 'sha256', None)
+    if compress:
+        compressed = compress_image(upload.read())
+        upload.seek(0)
+        if compressed is not None:
+            content = ContentFile(compressed)
+            size, checksum = len(compressed), hashlib.sha256(compressed).hexdigest()
+    if checksum is None:
+        digest = hashlib.sha256()
+        for chunk in upload.chunks():
+            digest.update(chunk)
+        checksum = digest.hexdigest()
+        upload.seek(0)
+    name = field.storage.save(field.generate_filename(None, upload.name), content, max_length=field.max_length)
+    return name, size, checksum
+
+
+def compress_image(data):
+    """
+    Re-encode JPEG or PNG bytes; returns the result if smaller, else None.
+
+    PNGs are optimised losslessly; JPEGs are re-encoded at quality 85,
+    which is lossy. Anything else (or unreadable) returns None.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        if image.format not in COMPRESSIBLE_IMAGE_FORMATS:
+            return None
+        buffer = BytesIO()
+        options = {'quality': 85} if image.format == 'JPEG' else {}
+        image.save(buffer, format=image.format, optimize=True, **options)
+    except OSError:
+        # Not an image Pillow can read or write
+        return None
+    compressed = buffer.getvalue()
+    return compressed if len(compressed) < len(data) else None
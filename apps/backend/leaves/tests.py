@@ -0,0 +1,630 @@
+"""
+Tests for leave APIs and services.
+"""
+import hashlib
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+from PIL import Image
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+from employees.models import Employee
+from settings.models import Holiday
+from settings.services import get_holiday_calendar
+from .models import Leave, LeaveAttachment, LeaveBalance, LeaveLedgerEntry, MonthlyLeaveUsage
+from .services import (
+    approve_leave, count_working_days, recalculate_leave_days, rebuild_balances, accrue_leave, carry_over_leave,
+    rebuild_leave_usage
+)
+
+User = get_user_model()
+
+
+class LeaveTestCase(APITestCase):
+    """Base test case with an employee."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.client = APIClient()
+        self.employee = self.create_employee('employee@example.com', 'EMP002')
+
+    def create_employee(self, email, employee_id, manager=None):
+        """Create a user with an employee profile."""
+        user = User.objects.create_user(
+            email=email,
+            password='testpass123',
+            first_name=employee_id.title(),
+            last_name='User'
+        )
+        return Employee.objects.create(
+            user=user,
+            employee_id=employee_id,
+            employment_type='full_time',
+            date_of_joining=date(2024, 1, 1),
+            reporting_manager=manager,
+        )
+
+    def authenticate(self, employee):
+        """Authenticate as a freshly loaded user, as a real request would be."""
+        self.client.force_authenticate(user=User.objects.get(pk=employee.user_id))
+
+
+class LeaveDurationTests(LeaveTestCase):
+    """Tests for the working-day duration engine."""
+
+    def test_count_working_days(self):
+        """Weekends and weekday holidays are skipped; half days count 0.5."""
+        christmas = {date(2025, 12, 25)}
+        # Mon 22nd - Fri 2nd: 10 weekdays, one holiday
+        self.assertEqual(count_working_days(date(2025, 12, 22), date(2026, 1, 2), christmas), 9)
+        self.assertEqual(
+            count_working_days(date(2025, 12, 22), date(2025, 12, 26), christmas, True, True), Decimal('3.0')
+        )
+        self.assertEqual(count_working_days(date(2025, 12, 27), date(2025, 12, 28), set()), 0)
+        self.assertEqual(count_working_days(date(2025, 12, 22), date(2025, 12, 22), set(), end_half_day=True), 0.5)
+
+    def test_create_stores_working_days(self):
+        """New leaves get their duration from the server, with holidays applied."""
+        Holiday.objects.create(name='Christmas', date=date(2025, 12, 25))
+        self.authenticate(self.employee)
+
+        response = self.client.post('/api/v1/leaves/', {
+            'leave_type': 'casual_leave', 'start_date': '2025-12-24', 'end_date': '2025-12-29',
+            'end_half_day': True,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Decimal(response.data['number_of_days']), Decimal('2.5'))
+
+        response = self.client.post('/api/v1/leaves/', {
+            'leave_type': 'casual_leave', 'start_date': '2025-12-27', 'end_date': '2025-12-28',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_validates_dates(self):
+        """Updates reject reversed ranges and ranges without a working day."""
+        leave = Leave.objects.create(
+            employee=self.employee, leave_type='casual_leave', start_date=date(2030, 1, 7),
+            end_date=date(2030, 1, 8), number_of_days=2
+        )
+        self.authenticate(self.employee)
+        response = self.client.patch(f'/api/v1/leaves/{leave.id}/', {'end_date': '2030-01-06'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(
+            f'/api/v1/leaves/{leave.id}/', {'start_date': '2030-01-05', 'end_date': '2030-01-06'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        leave.refresh_from_db()
+        self.assertEqual(leave.number_of_days, 2)
+
+    def test_recalculate_after_holiday_change(self):
+        """Bulk recalculation picks up a newly added holiday on pending leaves despite the cached calendar."""
+        leave = Leave.objects.create(
+            employee=self.employee, leave_type='paid_leave', start_date=date(2025, 12, 22),
+            end_date=date(2025, 12, 26), number_of_days=5, days_by_month={'2025-12': '5'}
+        )
+        approved = Leave.objects.create(
+            employee=self.employee, leave_type='sick_leave', start_date=date(2025, 12, 29),
+            end_date=date(2025, 12, 29), number_of_days=1, days_by_month={'2025-12': '1'}, status='approved'
+        )
+        self.assertEqual(recalculate_leave_days(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(name='Christmas', date=date(2025, 12, 25))
+            Holiday.objects.create(name='Year end', date=date(2025, 12, 29))
+
+        # Approved leaves keep the days their ledger entries were posted with
+        self.assertEqual(recalculate_leave_days(), 1)
+        leave.refresh_from_db()
+        self.assertEqual((leave.number_of_days, leave.days_by_month), (4, {'2025-12': '4'}))
+        approved.refresh_from_db()
+        self.assertEqual(approved.number_of_days, 1)
+        self.assertEqual(recalculate_leave_days(), 0)
+
+
+class LeaveApprovalTests(LeaveTestCase):
+    """Tests for approval against the balance ledger."""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = self.create_employee('manager@example.com', 'MGR001')
+        self.employee.reporting_manager = self.manager
+        self.employee.save()
+        self.leave = Leave.objects.create(
+            employee=self.employee, leave_type='casual_leave', start_date=date(2030, 1, 7),
+            end_date=date(2030, 1, 9), number_of_days=3
+        )
+
+    def test_admin_cannot_change_decisions_or_balances(self):
+        """The admin leaves status, decided bookings and balances to the ledger-backed services."""
+        leave_admin, balance_admin = admin.site._registry[Leave], admin.site._registry[LeaveBalance]
+        self.assertIn('status', leave_admin.get_readonly_fields(None, self.leave))
+        self.assertNotIn('end_date', leave_admin.get_readonly_fields(None, self.leave))
+        self.leave.status = 'approved'
+        self.assertIn('end_date', leave_admin.get_readonly_fields(None, self.leave))
+        self.assertIn('casual_leave', balance_admin.get_readonly_fields(None))
+
+    def test_approve_deducts_balance(self):
+        """Approval deducts the days and writes a ledger entry that matches the snapshot."""
+        self.authenticate(self.manager)
+        response = self.client.post(f'/api/v1/leaves/{self.leave.id}/approve/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'approved')
+
+        balance = LeaveBalance.objects.get(employee=self.employee)
+        self.assertEqual(balance.casual_leave, 2)
+        entry = LeaveLedgerEntry.objects.get(employee=self.employee, kind='approval')
+        self.assertEqual((entry.delta, entry.leave_id), (-3, self.leave.id))
+        self.assertEqual(rebuild_balances(), 0)
+
+        # A second approval finds the leave already approved
+        response = self.client.post(f'/api/v1/leaves/{self.leave.id}/approve/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(LeaveLedgerEntry.objects.filter(kind='approval').count(), 1)
+
+    def test_insufficient_balance_rolls_back(self):
+        """A short balance rejects the approval and leaves the leave pending."""
+        Leave.objects.filter(pk=self.leave.pk).update(number_of_days=10)
+        self.authenticate(self.manager)
+
+        response = self.client.post(f'/api/v1/leaves/{self.leave.id}/approve/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, 'pending')
+        self.assertFalse(LeaveLedgerEntry.objects.filter(kind='approval').exists())
+
+    def test_approval_debits_the_committed_days(self):
+        """The deduction follows the locked row, not the copy the caller loaded before an edit."""
+        stale = Leave.objects.get(pk=self.leave.pk)
+        Leave.objects.filter(pk=self.leave.pk).update(number_of_days=2)
+        approve_leave(stale, self.manager)
+
+        self.assertEqual((stale.status, stale.number_of_days), ('approved', 2))
+        entry = LeaveLedgerEntry.objects.get(employee=self.employee, kind='approval')
+        self.assertEqual(entry.delta, -2)
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).casual_leave, 3)
+
+    def test_approved_leave_cannot_be_edited(self):
+        """Dates of an approved leave are frozen, keeping balance and rollup in step."""
+        self.authenticate(self.manager)
+        self.client.post(f'/api/v1/leaves/{self.leave.id}/approve/')
+
+        self.authenticate(self.employee)
+        response = self.client.patch(f'/api/v1/leaves/{self.leave.id}/', {'end_date': '2030-01-11'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.leave.refresh_from_db()
+        self.assertEqual((self.leave.end_date, self.leave.number_of_days), (date(2030, 1, 9), 3))
+
+    def test_status_cannot_be_written_directly(self):
+        """PATCHing status is ignored, so deleting the leave credits nothing back."""
+        self.authenticate(self.employee)
+        response = self.client.patch(f'/api/v1/leaves/{self.leave.id}/', {'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'pending')
+
+        self.client.get('/api/v1/leaves/balance/')
+        response = self.client.delete(f'/api/v1/leaves/{self.leave.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).casual_leave, 5)
+        self.assertFalse(LeaveLedgerEntry.objects.filter(kind='reversal').exists())
+
+    def test_only_reviewers_can_approve(self):
+        """Employees cannot approve their own leave; cancelling an approved leave credits it back."""
+        self.authenticate(self.employee)
+        response = self.client.post(f'/api/v1/leaves/{self.leave.id}/approve/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.authenticate(self.manager)
+        self.client.post(f'/api/v1/leaves/{self.leave.id}/approve/')
+        self.authenticate(self.employee)
+        response = self.client.delete(f'/api/v1/leaves/{self.leave.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).casual_leave, 5)
+        self.assertEqual(rebuild_balances(), 0)
+
+    def test_cancel_soft_deletes_and_credits_the_debited_days(self):
+        """Cancelling keeps the leave (soft deleted) and its ledger links, and credits what was debited."""
+        self.authenticate(self.manager)
+        self.client.post(f'/api/v1/leaves/{self.leave.id}/approve/')
+        Leave.objects.filter(pk=self.leave.pk).update(number_of_days=1)
+
+        self.authenticate(self.employee)
+        response = self.client.delete(f'/api/v1/leaves/{self.leave.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(Leave.all_objects.get(pk=self.leave.pk).is_deleted)
+        self.assertFalse(Leave.objects.filter(pk=self.leave.pk).exists())
+        self.assertEqual(
+            sorted(LeaveLedgerEntry.objects.filter(leave=self.leave).values_list('kind', 'delta')),
+            [('approval', -3), ('reversal', 3)]
+        )
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).casual_leave, 5)
+
+
+class LeaveAccrualTests(LeaveTestCase):
+    """Tests for the policy-driven accrual and carry-over runs."""
+
+    def setUp(self):
+        super().setUp()
+        self.joiner = self.create_employee('joiner@example.com', 'EMP003')
+        self.joiner.date_of_joining = date(2026, 3, 10)
+        self.joiner.employment_type = 'intern'
+        self.joiner.save()
+
+    def test_accrual_is_idempotent_per_period(self):
+        """Annual grants are pro-rated for joiners, interns earn no earned leave, and reruns post nothing."""
+        dry = accrue_leave(2026, 3, dry_run=True)
+        self.assertEqual(dry['casual_leave'], {'employees': 2, 'days': Decimal('9.0')})
+        self.assertFalse(LeaveLedgerEntry.objects.exists())
+
+        self.assertEqual(accrue_leave(2026, 3, batch_size=1), dry)
+        balance = LeaveBalance.objects.get(employee=self.joiner)
+        self.assertEqual((balance.casual_leave, balance.earned_leave), (4, 0))
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).earned_leave, Decimal('1.5'))
+
+        self.assertEqual(accrue_leave(2026, 3)['casual_leave']['employees'], 0)
+        totals = accrue_leave(2026, 4)
+        self.assertEqual(totals['casual_leave']['employees'], 0)
+        self.assertEqual(totals['earned_leave'], {'employees': 1, 'days': Decimal('1.5')})
+        self.assertEqual(rebuild_balances(), 0)
+
+    def test_earned_leave_accrues_from_joining_but_waits_a_year(self):
+        """Earned leave accrues monthly from the joining month; it can be booked after a year of service."""
+        self.joiner.employment_type = 'full_time'
+        self.joiner.save()
+        for month in range(3, 13):
+            accrue_leave(2026, month, employees=[self.joiner.pk])
+        self.assertEqual(LeaveBalance.objects.get(employee=self.joiner).earned_leave, 15)
+
+        self.authenticate(self.joiner)
+        payload = {'leave_type': 'earned_leave', 'start_date': '2027-03-09', 'end_date': '2027-03-09'}
+        response = self.client.post('/api/v1/leaves/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['detail'], 'Earned Leave can be taken from 2027-03-10, after 12 months of service.'
+        )
+        payload.update(start_date='2027-03-10', end_date='2027-03-10')
+        self.assertEqual(self.client.post('/api/v1/leaves/', payload, format='json').status_code, 201)
+
+    def test_carry_over_lapses_capped_balances(self):
+        """Year end lapses sick and casual leave but carries earned leave forward."""
+        accrue_leave(2026, 3)
+        totals = carry_over_leave(2026)
+        self.assertEqual(totals['casual_leave'], {'employees': 2, 'days': Decimal('-9.0')})
+        self.assertNotIn('earned_leave', totals)
+
+        balance = LeaveBalance.objects.get(employee=self.employee)
+        self.assertEqual((balance.casual_leave, balance.earned_leave), (0, Decimal('1.5')))
+        self.assertEqual(carry_over_leave(2026)['casual_leave']['employees'], 0)
+        self.assertEqual(rebuild_balances(), 0)
+
+
+class LeaveOverlapTests(LeaveTestCase):
+    """Tests for overlap-safe booking and who-is-out lookups."""
+
+    def setUp(self):
+        super().setUp()
+        self.leave = Leave.objects.create(
+            employee=self.employee, leave_type='casual_leave', start_date=date(2030, 1, 7),
+            end_date=date(2030, 1, 9), number_of_days=3
+        )
+        self.authenticate(self.employee)
+
+    def book(self, start, end):
+        return self.client.post('/api/v1/leaves/', {
+            'leave_type': 'sick_leave', 'start_date': start, 'end_date': end,
+        }, format='json')
+
+    def test_overlapping_booking_rejected(self):
+        """Active leaves cannot overlap; rejected ones free their dates."""
+        response = self.book('2030-01-09', '2030-01-10')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('2030-01-07', response.data['detail'])
+
+        response = self.book('2030-01-10', '2030-01-10')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.patch(f'/api/v1/leaves/{self.leave.id}/', {'end_date': '2030-01-10'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        Leave.objects.filter(pk=self.leave.pk).update(status='rejected')
+        self.assertEqual(self.book('2030-01-08', '2030-01-08').status_code, status.HTTP_201_CREATED)
+
+    def test_who_is_out(self):
+        """Only approved leaves covering the date are listed, limited to the caller's team."""
+        Leave.objects.filter(pk=self.leave.pk).update(status='approved')
+        Leave.objects.create(
+            employee=self.create_employee('outsider@example.com', 'EMP009'), leave_type='casual_leave',
+            start_date=date(2030, 1, 9), end_date=date(2030, 1, 9), number_of_days=1, status='approved'
+        )
+        response = self.client.get('/api/v1/leaves/out/', {'date': '2030-01-09'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['employee_id'] for row in response.data], ['EMP002'])
+        self.assertEqual(self.client.get('/api/v1/leaves/out/', {'date': '2030-01-10'}).data, [])
+
+
+class LeaveCalendarTests(LeaveTestCase):
+    """Tests for the team leave calendar."""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = self.create_employee('manager@example.com', 'MGR001')
+        self.employee.reporting_manager = self.manager
+        self.employee.save()
+        self.outsider = self.create_employee('outsider@example.com', 'EMP009')
+        Holiday.objects.create(name='Republic Day', date=date(2030, 1, 28))
+        for employee in (self.employee, self.outsider):
+            Leave.objects.create(
+                employee=employee, leave_type='casual_leave', start_date=date(2030, 1, 25),
+                end_date=date(2030, 1, 29), end_half_day=True, number_of_days=2.5
+            )
+
+    def test_team_calendar(self):
+        """Working days of the window list the team's leaves, holidays excluded."""
+        self.authenticate(self.manager)
+        response = self.client.get('/api/v1/leaves/calendar/', {'from': '2030-01-27', 'to': '2030-01-31'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['holidays'][0]['date'], '2030-01-28')
+        self.assertEqual(list(response.data['employees']), [self.employee.pk])
+        self.assertEqual(response.data['days'], {'2030-01-29': [[self.employee.pk, 'casual_leave', 'pending', True]]})
+
+        response = self.client.get('/api/v1/leaves/calendar/', {'from': '2030-01-27', 'to': '2029-01-31'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_calendar_cache_invalidated_by_leave_changes(self):
+        """A new leave retires the cached calendar once it commits."""
+        params = {'from': '2030-02-04', 'to': '2030-02-08'}
+        self.authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/v1/leaves/calendar/', params).data['days'], {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Leave.objects.create(
+                employee=self.employee, leave_type='sick_leave', start_date=date(2030, 2, 5),
+                end_date=date(2030, 2, 5), number_of_days=1
+            )
+        self.assertEqual(list(self.client.get('/api/v1/leaves/calendar/', params).data['days']), ['2030-02-05'])
+
+
+class HolidayCalendarTests(LeaveTestCase):
+    """Tests for the shared holiday calendar."""
+
+    def test_holidays_endpoint_revalidates_with_etag(self):
+        """The year's calendar comes from settings.Holiday; its ETag changes once a change commits."""
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(name='Republic Day', date=date(2030, 1, 26))
+            Holiday.objects.create(name='Holi', date=date(2030, 3, 19), is_optional=True)
+        self.authenticate(self.employee)
+
+        response = self.client.get('/api/v1/leaves/holidays/', {'year': 2030})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([holiday['name'] for holiday in response.data], ['Republic Day', 'Holi'])
+        etag = response['ETag']
+
+        response = self.client.get('/api/v1/leaves/holidays/', {'year': 2030}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(name='Christmas', date=date(2030, 12, 25))
+            # Until the transaction commits, other requests keep the cached calendar
+            response = self.client.get('/api/v1/leaves/holidays/', {'year': 2030}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get('/api/v1/leaves/holidays/', {'year': 2030}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        calendar = get_holiday_calendar(2030)
+        self.assertTrue(calendar.is_holiday(date(2030, 12, 25)))
+        self.assertFalse(calendar.is_holiday(date(2030, 3, 19)))
+        first_half = calendar.between(date(2030, 1, 1), date(2030, 6, 30))
+        self.assertEqual([holiday.name for holiday in first_half], ['Republic Day'])
+
+
+class LeaveListTests(LeaveTestCase):
+    """Tests for role-scoped leave lists and their query counts."""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = self.create_employee('manager@example.com', 'MGR001')
+        self.employee.reporting_manager = self.manager
+        self.employee.save()
+        self.outsider = self.create_employee('outsider@example.com', 'EMP009')
+
+    def create_leave(self, employee, start, attachments=0):
+        leave = Leave.objects.create(
+            employee=employee, leave_type='casual_leave', start_date=start, end_date=start, number_of_days=1
+        )
+        for number in range(attachments):
+            LeaveAttachment.objects.create(leave=leave, file=f'leave_attachments/{number}.pdf', name=f'{number}.pdf')
+        return leave
+
+    def test_list_is_scoped_and_counts_attachments(self):
+        """Managers see their reports' leaves; list rows count attachments in a constant number of queries."""
+        self.create_leave(self.employee, date(2030, 1, 7), attachments=2)
+        self.create_leave(self.outsider, date(2030, 1, 7))
+        self.authenticate(self.manager)
+
+        # roles, manager profile, count, page
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/v1/leaves/')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['attachment_count'], 2)
+        self.assertNotIn('attachments', response.data['results'][0])
+
+        for day in range(8, 12):
+            self.create_leave(self.employee, date(2030, 1, day), attachments=1)
+        self.authenticate(self.manager)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/v1/leaves/')
+        self.assertEqual(response.data['count'], 5)
+
+    def test_detail_includes_attachments(self):
+        """The detail view nests attachments; other employees' leaves are not found."""
+        leave = self.create_leave(self.employee, date(2030, 1, 7), attachments=2)
+        self.authenticate(self.employee)
+        response = self.client.get(f'/api/v1/leaves/{leave.id}/')
+        self.assertEqual(len(response.data['attachments']), 2)
+
+        self.authenticate(self.outsider)
+        response = self.client.get(f'/api/v1/leaves/{leave.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LeaveUtilisationTests(LeaveTestCase):
+    """Tests for the monthly usage rollup and the utilisation report."""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = self.create_employee('manager@example.com', 'MGR001')
+        self.employee.reporting_manager = self.manager
+        self.employee.save()
+        # Thu 30 Jan - Tue 4 Feb 2030: two working days in each month
+        self.leave = Leave.objects.create(
+            employee=self.employee, leave_type='casual_leave', start_date=date(2030, 1, 30),
+            end_date=date(2030, 2, 4), number_of_days=4
+        )
+
+    def usage(self):
+        return {
+            (row.month.month, row.leave_type): row.days
+            for row in MonthlyLeaveUsage.objects.filter(employee=self.employee)
+        }
+
+    def test_rollup_follows_approval_and_cancellation(self):
+        """Approval adds days per month, cancellation takes them back, and a rebuild agrees."""
+        self.authenticate(self.manager)
+        self.client.post(f'/api/v1/leaves/{self.leave.id}/approve/')
+        self.assertEqual(self.usage(), {(1, 'casual_leave'): 2, (2, 'casual_leave'): 2})
+        self.assertEqual(rebuild_leave_usage(), 2)
+        self.assertEqual(self.usage(), {(1, 'casual_leave'): 2, (2, 'casual_leave'): 2})
+
+        self.authenticate(self.employee)
+        self.client.delete(f'/api/v1/leaves/{self.leave.id}/')
+        self.assertEqual(self.usage(), {(1, 'casual_leave'): 0, (2, 'casual_leave'): 0})
+        self.assertEqual(rebuild_leave_usage(), 0)
+
+    def test_rollup_uses_the_booked_split(self):
+        """Holidays added after booking change neither what approval adds nor what cancellation removes."""
+        self.authenticate(self.employee)
+        response = self.client.post('/api/v1/leaves/', {
+            'leave_type': 'casual_leave', 'start_date': '2030-03-28', 'end_date': '2030-04-02',
+        }, format='json')
+        self.assertEqual(response.data['number_of_days'], '4.0')
+        leave = Leave.objects.get(pk=response.data['id'])
+        self.assertEqual(leave.days_by_month, {'2030-03': '2', '2030-04': '2'})
+
+        Holiday.objects.create(name='Founders Day', date=date(2030, 3, 29))
+        self.authenticate(self.manager)
+        self.client.post(f'/api/v1/leaves/{leave.id}/approve/')
+        self.assertEqual(self.usage(), {(3, 'casual_leave'): 2, (4, 'casual_leave'): 2})
+        self.assertEqual(LeaveLedgerEntry.objects.get(leave=leave, kind='approval').delta, -4)
+        self.assertEqual(rebuild_leave_usage(), 2)
+
+        Holiday.objects.create(name='Spring Day', date=date(2030, 4, 1))
+        self.authenticate(self.employee)
+        self.client.delete(f'/api/v1/leaves/{leave.id}/')
+        self.assertEqual(self.usage(), {(3, 'casual_leave'): 0, (4, 'casual_leave'): 0})
+
+    def test_utilisation_report(self):
+        """The report reads the rollup and relates it to the remaining balance."""
+        self.authenticate(self.manager)
+        self.client.post(f'/api/v1/leaves/{self.leave.id}/approve/')
+
+        # roles, rollup, balances (the profile is cached from the approval)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/reports/leaves/', {'from': '2029-01', 'to': '2030-12'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = response.data['employees'][0]
+        self.assertEqual(row['months'], {'2030-01': {'casual_leave': 2}, '2030-02': {'casual_leave': 2}})
+        self.assertEqual((row['taken']['casual_leave'], row['balance']['casual_leave']), (4, 1))
+        self.assertEqual(row['utilisation']['casual_leave'], 80)
+
+        response = self.client.get('/api/v1/reports/leaves/', {'from': '2030-13'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LeaveAttachmentUploadTests(LeaveTestCase):
+    """Tests for streamed, checksummed attachment uploads."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, LEAVE_ATTACHMENT_MAX_BYTES=1024)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.authenticate(self.employee)
+
+    def upload(self, *files):
+        return self.client.post('/api/v1/leaves/', {
+            'leave_type': 'sick_leave', 'start_date': '2030-01-07', 'end_date': '2030-01-07',
+            'attachments': list(files),
+        }, format='multipart')
+
+    def test_attachments_stored_with_checksums(self):
+        """Every file is stored, and its row carries size and SHA-256."""
+        contents = [b'certificate', b'prescription' * 10]
+        response = self.upload(*(
+            SimpleUploadedFile(f'{number}.txt', content) for number, content in enumerate(contents)
+        ))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        attachments = sorted(response.data['attachments'], key=lambda attachment: attachment['name'])
+        self.assertEqual(
+            [(attachment['size'], attachment['checksum']) for attachment in attachments],
+            [(len(content), hashlib.sha256(content).hexdigest()) for content in contents]
+        )
+        for attachment in LeaveAttachment.objects.all():
+            with attachment.file.open('rb') as stored:
+                self.assertEqual(hashlib.sha256(stored.read()).hexdigest(), attachment.checksum)
+
+    def test_idempotent_create_with_binary_attachment(self):
+        """A retried multipart create replays the first response instead of booking twice."""
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8)).save(buffer, format='PNG')
+        responses = [
+            self.client.post('/api/v1/leaves/', {
+                'leave_type': 'sick_leave', 'start_date': '2030-01-07', 'end_date': '2030-01-07',
+                'attachments': [SimpleUploadedFile('scan.png', buffer.getvalue())],
+            }, format='multipart', HTTP_IDEMPOTENCY_KEY='leave-1')
+            for attempt in range(2)
+        ]
+        self.assertEqual([response.status_code for response in responses], [201, 201])
+        self.assertEqual(responses[1]['Idempotent-Replayed'], 'true')
+        self.assertEqual(Leave.objects.count(), 1)
+
+    def test_oversized_attachment_rejected(self):
+        """A file over the cap fails the request before the leave is booked."""
+        response = self.upload(SimpleUploadedFile('ok.txt', b'ok'), SimpleUploadedFile('scan.pdf', b'x' * 2048))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('scan.pdf', response.data['detail'])
+        self.assertFalse(Leave.objects.exists())
+
+    def test_image_compression_is_opt_in(self):
+        """Images are stored as uploaded unless compression is enabled; then the stored file is described."""
+        buffer = BytesIO()
+        Image.effect_noise((64, 64), 40).convert('RGB').save(buffer, format='JPEG', quality=100)
+        original = buffer.getvalue()
+        files = [('scan.jpg', original), ('note.txt', b'note')]
+
+        for compress in (False, True):
+            Leave.objects.all().delete()
+            with override_settings(LEAVE_ATTACHMENT_MAX_BYTES=1024 * 1024, LEAVE_ATTACHMENT_COMPRESS_IMAGES=compress):
+                response = self.upload(*(SimpleUploadedFile(name, content) for name, content in files))
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            described = {attachment['name']: attachment for attachment in response.data['attachments']}
+            for attachment in LeaveAttachment.objects.filter(leave_id=response.data['id']):
+                with attachment.file.open('rb') as stored:
+                    content = stored.read()
+                self.assertEqual((len(content), hashlib.sha256(content).hexdigest()), (
+                    described[attachment.name]['size'], described[attachment.name]['checksum']
+                ))
+                self.assertTrue(described[attachment.name]['file'].endswith(attachment.file.name))
+                if attachment.name == 'note.txt':
+                    self.assertEqual(content, b'note')
+                else:
+                    self.assertEqual(content == original, not compress)
+                    self.assertEqual(len(content) < len(original), compress)
@@ -1,14 +1,30 @@
 """
 Leave views.
 """
+from calendar import monthrange
 from datetime import date
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from .models import Leave, LeaveBalance, LeaveAttachment
-from .serializers import LeaveSerializer, CreateLeaveSerializer, LeaveBalanceSerializer, LeaveAttachmentSerializer
+from employees.models import Employee
+from settings.services import get_holiday_calendar
+from .models import Leave
+from .serializers import (
+    LeaveSerializer, LeaveListSerializer, CreateLeaveSerializer, LeaveBalanceSerializer, LeaveAttachmentSerializer
+)
+from .services import (
+    split_leave_days, book_leave, ensure_leave_usable, ensure_no_overlap, leaves_covering,
+    team_members, get_leave_calendar, MAX_CALENDAR_DAYS,
+    get_or_create_balance, approve_leave, reject_leave, cancel_leave, save_leave_attachments
+)
+from common.exceptions import BusinessLogicException
+from common.uploads import ChecksumUploadHandler
+from common.utils import idempotent
 
 
 class LeavePagination(PageNumberPagination):
@@ -27,42 +43,101 @@ class LeaveViewSet(viewsets.ModelViewSet):
     search_fields = ['employee__employee_id', 'leave_type']
     ordering_fields = ['start_date', 'created_at']
 
+    def get_queryset(self):
+        """Filter leaves based on user role."""
+        queryset = self.scope_queryset(Leave.objects.all())
+        if self.action in ['list', 'my_leaves']:
+            return queryset.for_list()
+        return queryset.with_attachments()
+
+    def scope_queryset(self, queryset):
+        """Restrict a leave queryset to what the current user may see."""
+        user = self.request.user
+        if set(user.get_role_names()) & {'system_admin', 'hr_user'}:
+            # HR and admins see all leaves
+            return queryset
+        # Everyone else sees their own leaves and their direct reports'
+        return queryset.filter(Q(employee=user.employee) | Q(employee__reporting_manager=user.employee))
+
+    def get_serializer_class(self):
+        """Return appropriate serializer based on action."""
+        if self.action in ['list', 'my_leaves']:
+            return LeaveListSerializer
+        return LeaveSerializer
+
+    def initial(self, request, *args, **kwargs):
+        """Stream attachment uploads to disk with checksums and a per-file size cap."""
+        if self.action == 'create':
+            request.upload_handlers = [
+                ChecksumUploadHandler(request, max_file_size=settings.LEAVE_ATTACHMENT_MAX_BYTES)
+            ]
+        super().initial(request, *args, **kwargs)
+
+    @idempotent
     def create(self, request, *args, **kwargs):
-        """Create a leave with file attachments."""
-        data = request.data
-        leave_type = data.get('leave_type')
-        start_date_str = data.get('start_date')
-        end_date_str = data.get('end_date')
-        reason = data.get('reason', '')
-        
-        try:
-            # Create the leave
-            leave = Leave.objects.create(
-                employee=request.user.employee,
-                leave_type=leave_type,
-                start_date=start_date_str,
-                end_date=end_date_str,
-                reason=reason,
-                number_of_days=0  # Will be calculated by frontend or business logic
+        """Create a leave with file attachments. Retries are safe with an Idempotency-Key header."""
+        serializer = CreateLeaveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        files = request.FILES.getlist('attachments')
+        oversized = ', '.join(request.upload_handlers[0].oversized)
+        if oversized:
+            return Response(
+                {'detail': f'Attachments larger than {settings.LEAVE_ATTACHMENT_MAX_BYTES} bytes: {oversized}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(files) > settings.LEAVE_ATTACHMENT_MAX_FILES:
+            return Response(
+                {'detail': f'At most {settings.LEAVE_ATTACHMENT_MAX_FILES} attachments per leave.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Handle file attachments
-            files = request.FILES.getlist('attachments')
-            for file in files:
-                LeaveAttachment.objects.create(
-                    leave=leave,
-                    file=file,
-                    name=file.name
-                )
-            
-            serializer = self.get_serializer(leave)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        except Exception as e:
+
+        number_of_days, days_by_month = split_leave_days(
+            data['start_date'], data['end_date'], data['start_half_day'], data['end_half_day']
+        )
+        if not number_of_days:
             return Response(
-                {'detail': str(e)},
+                {'detail': 'The selected dates do not include any working day.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        with transaction.atomic():
+            # Checked against the employee's other leaves under a row lock
+            leave = book_leave(
+                request.user.employee, number_of_days=number_of_days, days_by_month=days_by_month, **data
+            )
+            save_leave_attachments(leave, files)
+
+        serializer = self.get_serializer(leave)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_update(self, serializer):
+        """
+        Recalculate the working-day duration from the (possibly changed) dates.
+
+        Only pending leaves can be edited: approved ones are already in the
+        ledger and the usage rollup, so they are cancelled and re-filed instead.
+        """
+        instance = serializer.instance
+        data = serializer.validated_data
+        start_date = data.get('start_date', instance.start_date)
+        end_date = data.get('end_date', instance.end_date)
+        with transaction.atomic():
+            if not Leave.objects.select_for_update().filter(pk=instance.pk, status='pending').exists():
+                raise BusinessLogicException(f'Can only edit pending leaves. Current status: {instance.status}')
+            ensure_leave_usable(instance.employee, data.get('leave_type', instance.leave_type), start_date)
+            ensure_no_overlap(instance.employee, start_date, end_date, exclude=instance)
+            number_of_days, days_by_month = split_leave_days(
+                start_date,
+                end_date,
+                data.get('start_half_day', instance.start_half_day),
+                data.get('end_half_day', instance.end_half_day)
+            )
+            if not number_of_days:
+                raise BusinessLogicException('The selected dates do not include any working day.')
+            serializer.save(number_of_days=number_of_days, days_by_month=days_by_month)
+
     def destroy(self, request, *args, **kwargs):
         """Delete a leave only if start_date is in the future."""
         leave = self.get_object()
@@ -74,13 +149,15 @@ class LeaveViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        return super().destroy(request, *args, **kwargs)
+        # Approved leaves give their days back to the balance
+        cancel_leave(leave, request.user.employee)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'])
     def my_leaves(self, request):
         """Get current user's leaves with pagination."""
         employee = request.user.employee
-        leaves = Leave.objects.filter(employee=employee)
+        leaves = Leave.objects.filter(employee=employee).for_list()
         
         # Apply pagination
         page = self.paginate_queryset(leaves)
@@ -93,55 +170,145 @@ class LeaveViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def balance(self, request):
-        """Get leave balance. Create if doesn't exist."""
+        """Get leave balance. Open it (with ledger entries) if it doesn't exist."""
         employee = request.user.employee
-        balance, created = LeaveBalance.objects.get_or_create(
-            employee=employee,
-            defaults={
-                'paid_leave': 5,
-                'sick_leave': 5,
-                'casual_leave': 5,
-                'earned_leave': 0,
-            }
-        )
+        balance = get_or_create_balance(employee)
         serializer = LeaveBalanceSerializer(balance)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def holidays(self, request):
-        """Get holidays list."""
-        # Static holidays list - can be moved to model later
-        holidays = [
-            {'date': '2025-01-01', 'name': 'New Year Day'},
-            {'date': '2025-01-26', 'name': 'Republic Day'},
-            {'date': '2025-03-08', 'name': 'Holi'},
-            {'date': '2025-04-14', 'name': 'Ambedkar Jayanti'},
-            {'date': '2025-04-18', 'name': 'Good Friday'},
-            {'date': '2025-05-23', 'name': 'Buddha Purnima'},
-            {'date': '2025-08-15', 'name': 'Independence Day'},
-            {'date': '2025-08-29', 'name': 'Janmashtami'},
-            {'date': '2025-09-16', 'name': 'Milad-un-Nabi'},
-            {'date': '2025-10-02', 'name': 'Gandhi Jayanti'},
-            {'date': '2025-10-12', 'name': 'Dussehra'},
-            {'date': '2025-10-13', 'name': 'Diwali'},
-            {'date': '2025-10-14', 'name': 'Diwali (Day 2)'},
-            {'date': '2025-10-29', 'name': 'Govardhan Puja'},
-            {'date': '2025-11-01', 'name': 'Diwali (Day 5)'},
-            {'date': '2025-12-25', 'name': 'Christmas'},
-        ]
-        return Response(holidays)
+        """
+        Get the holiday calendar of a year.
+
+        Query params: year (default: current year). Sends an ETag that
+        only changes with the year's holidays; If-None-Match gets a 304.
+        """
+        try:
+            year = int(request.query_params.get('year', date.today().year))
+        except ValueError:
+            return Response({'detail': 'year must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= year <= 9999:
+            return Response({'detail': 'Invalid year.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        calendar = get_holiday_calendar(year)
+        headers = {'ETag': calendar.etag, 'Cache-Control': 'private, no-cache'}
+        if calendar.etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response([holiday._asdict() for holiday in calendar.holidays], headers=headers)
+
+    @action(detail=False, methods=['get'])
+    def out(self, request):
+        """
+        Who is on approved leave on a date.
+
+        HR and admins see everyone; others see their team, as on the calendar.
+        Query params: date (YYYY-MM-DD; default: today).
+        """
+        try:
+            day = date.fromisoformat(request.query_params.get('date') or date.today().isoformat())
+        except ValueError:
+            return Response({'detail': 'date must be YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        leaves = leaves_covering(day)
+        if not set(request.user.get_role_names()) & {'system_admin', 'hr_user'}:
+            leaves = leaves.filter(employee__in=team_members(request.user.employee))
+        leaves = leaves.select_related('employee__user').order_by('employee__employee_id')
+        return Response([
+            {
+                'employee': leave.employee_id,
+                'employee_id': leave.employee.employee_id,
+                'employee_name': leave.employee.user.get_full_name(),
+                'start_date': leave.start_date,
+                'end_date': leave.end_date,
+                'start_half_day': leave.start_half_day,
+                'end_half_day': leave.end_half_day,
+            }
+            for leave in leaves
+        ])
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        Who is out on each working day of a window, with holidays.
+
+        Query params: from, to (YYYY-MM-DD; default: the current month),
+        scope=team (default; you, your reports and your manager's reports)
+        or department (your department; HR and admins may pass department).
+        """
+        today = date.today()
+        month_end = today.replace(day=monthrange(today.year, today.month)[1])
+        try:
+            start = date.fromisoformat(request.query_params.get('from') or today.replace(day=1).isoformat())
+            end = date.fromisoformat(request.query_params.get('to') or month_end.isoformat())
+        except ValueError:
+            return Response({'detail': 'from and to must be YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start or (end - start).days >= MAX_CALENDAR_DAYS:
+            return Response(
+                {'detail': f'to must be on or after from, and the window at most {MAX_CALENDAR_DAYS} days.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        employee = request.user.employee
+        scope = request.query_params.get('scope', 'team')
+        if scope == 'team':
+            members, scope_key = team_members(employee), f'team:{employee.pk}'
+        elif scope == 'department':
+            department_id = employee.department_id
+            if request.query_params.get('department'):
+                if not set(request.user.get_role_names()) & {'system_admin', 'hr_user'}:
+                    return Response(
+                        {'detail': 'Only HR can view other departments.'},
+                        status=status.HTTP_403_FORBIDDEN
+                    )
+                try:
+                    department_id = int(request.query_params['department'])
+                except ValueError:
+                    return Response({'detail': 'department must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+            if not department_id:
+                return Response({'detail': 'No department to show.'}, status=status.HTTP_400_BAD_REQUEST)
+            members, scope_key = Employee.objects.filter(department_id=department_id), f'department:{department_id}'
+        else:
+            return Response({'detail': 'scope must be team or department.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(get_leave_calendar(members, scope_key, start, end))
+
+    def can_review(self, leave):
+        """Reporting managers review their reports' leaves; HR and admins review anyone's."""
+        user = self.request.user
+        if leave.employee_id == user.employee.id:
+            return False
+        if set(user.get_role_names()) & {'system_admin', 'hr_user'}:
+            return True
+        return leave.employee.reporting_manager_id == user.employee.id
 
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
-        """Approve a leave."""
-        # TODO: Implement leave approval logic
-        return Response({'detail': 'Leave approved'})
+        """Approve a leave, deducting it from the employee's balance."""
+        leave = self.get_object()
+        if not self.can_review(leave):
+            return Response(
+                {'detail': 'Only the reporting manager or HR can approve this leave.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        approve_leave(leave, request.user.employee)
+        serializer = self.get_serializer(leave)
+        return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def reject(self, request, pk=None):
         """Reject a leave."""
-        # TODO: Implement leave rejection logic
-        return Response({'detail': 'Leave rejected'})
+        leave = self.get_object()
+        if not self.can_review(leave):
+            return Response(
+                {'detail': 'Only the reporting manager or HR can reject this leave.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        reject_leave(leave, request.user.employee)
+        serializer = self.get_serializer(leave)
+        return Response(serializer.data)
 
 
 
@@ -1,12 +1,22 @@
 """
 Report views.
 """
+from datetime import date
+from django.db.models import Q
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from employees.models import Employee
 from timesheets.models import Timesheet
 from leaves.models import Leave
+from leaves.services import get_leave_utilisation
+
+
+def parse_month(value):
+    """First day of a YYYY-MM month; raises ValueError otherwise."""
+    year, month = value.split('-')
+    return date(int(year), int(month), 1)
 
 
 class ReportViewSet(viewsets.ViewSet):
@@ -21,9 +31,34 @@ class ReportViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['get'])
     def leaves(self, request):
-        """Get leave report."""
-        # TODO: Implement leave report logic
-        return Response({'detail': 'Leave report'})
+        """
+        Get the leave utilisation report.
+
+        Query params: from, to (YYYY-MM; default: the current year),
+        department (HR and admins only). HR and admins see everyone;
+        others see themselves and their direct reports.
+        """
+        today = date.today()
+        try:
+            start = parse_month(request.query_params.get('from') or f'{today.year}-01')
+            end = parse_month(request.query_params.get('to') or f'{today.year}-12')
+        except ValueError:
+            return Response({'detail': 'from and to must be YYYY-MM.'}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start:
+            return Response({'detail': 'to must not be before from.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        if set(user.get_role_names()) & {'system_admin', 'hr_user'}:
+            employees = Employee.objects.all()
+            if request.query_params.get('department'):
+                try:
+                    employees = employees.filter(department_id=int(request.query_params['department']))
+                except ValueError:
+                    return Response({'detail': 'department must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            employees = Employee.objects.filter(Q(pk=user.employee.pk) | Q(reporting_manager=user.employee))
+
+        return Response(get_leave_utilisation(employees, start, end))
 
     @action(detail=False, methods=['get'])
     def billing(self, request):
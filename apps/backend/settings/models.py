@@ -66,6 +66,19 @@ class Holiday(SoftDeleteModel):
     def __str__(self):
         return f"{self.name} ({self.date})"
 
+    def save(self, *args, **kwargs):
+        """Save and invalidate cached holiday calendars (soft deletes included)."""
+        super().save(*args, **kwargs)
+        from .services import invalidate_holiday_calendars
+        invalidate_holiday_calendars()
+
+    def delete(self, *args, **kwargs):
+        """Delete and invalidate cached holiday calendars."""
+        result = super().delete(*args, **kwargs)
+        from .services import invalidate_holiday_calendars
+        invalidate_holiday_calendars()
+        return result
+
 
 class Client(SoftDeleteModel):
     """Client model."""
@@ -0,0 +1,96 @@
+"""
+Settings services.
+"""
+import hashlib
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from django.core.cache import cache
+from django.db import transaction
+from .models import Holiday
+
+HOLIDAY_VERSION_KEY = 'holidays:version'
+HOLIDAY_CALENDAR_TIMEOUT = 24 * 60 * 60
+
+CalendarHoliday = namedtuple('CalendarHoliday', ('date', 'name', 'is_optional'))
+
+
+def get_holiday_version():
+    """Current holiday calendar version; bumped whenever a holiday changes."""
+    version = cache.get(HOLIDAY_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(HOLIDAY_VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_holiday_calendars():
+    """Retire every cached calendar once the current transaction commits."""
+    def bump():
+        try:
+            cache.incr(HOLIDAY_VERSION_KEY)
+        except ValueError:
+            cache.set(HOLIDAY_VERSION_KEY, 2, None)
+    transaction.on_commit(bump)
+
+
+class HolidayCalendar:
+    """
+    One year's holidays, sorted by date.
+
+    Lookups bisect the sorted dates, so they cost O(log n) whatever the
+    size of the year. The ETag changes whenever the year's holidays do.
+    """
+
+    def __init__(self, year, holidays):
+        self.year = year
+        self.holidays = tuple(holidays)
+        self.dates = [holiday.date for holiday in self.holidays]
+        self.closed_dates = [holiday.date for holiday in self.holidays if not holiday.is_optional]
+        digest = hashlib.md5(repr(self.holidays).encode()).hexdigest()
+        self.etag = f'"{year}-{digest}"'
+
+    def is_holiday(self, day):
+        """Whether a date is a non-optional holiday."""
+        index = bisect_left(self.closed_dates, day)
+        return index < len(self.closed_dates) and self.closed_dates[index] == day
+
+    def between(self, start, end, include_optional=False):
+        """Holidays from start to end, inclusive, in date order."""
+        holidays = self.holidays[bisect_left(self.dates, start):bisect_right(self.dates, end)]
+        if include_optional:
+            return list(holidays)
+        return [holiday for holiday in holidays if not holiday.is_optional]
+
+
+def get_holiday_calendar(year):
+    """
+    The HolidayCalendar of a year.
+
+    Calendars are loaded once per year and cached under the current
+    version, so a holiday change invalidates them all without deleting
+    keys one by one.
+    """
+    key = f'holidays:{get_holiday_version()}:{year}'
+    calendar = cache.get(key)
+    if calendar is None:
+        calendar = HolidayCalendar(year, (
+            CalendarHoliday(*row)
+            for row in Holiday.objects.filter(date__year=year)
+            .order_by('date', 'name')
+            .values_list('date', 'name', 'is_optional')
+        ))
+        cache.set(key, calendar, HOLIDAY_CALENDAR_TIMEOUT)
+    return calendar
+
+
+def holidays_between(start, end, include_optional=False):
+    """Holidays from start to end, inclusive, in date order."""
+    holidays = []
+    for year in range(start.year, end.year + 1):
+        holidays.extend(get_holiday_calendar(year).between(start, end, include_optional))
+    return holidays
+
+
+def get_holidays_between(start, end):
+    """Non-optional holiday dates from start to end, inclusive."""
+    return {holiday.date for holiday in holidays_between(start, end)}
@@ -3,14 +3,17 @@ Timesheet admin.
 """
 from django.contrib import admin
 from common.admin import BaseAdmin
-from .models import Timesheet, TimesheetRow
+from .models import (
+    Timesheet, TimesheetRow, TimesheetApprovalDelegation, TimesheetTemplate, TimesheetTemplateRow,
+    TimesheetTransition
+)
 
 
 class TimesheetRowInline(admin.TabularInline):
     """Inline admin for timesheet rows."""
     model = TimesheetRow
-    fields = ('project', 'task_description', 'sun_hours', 'mon_hours', 'tue_hours',
-              'wed_hours', 'thu_hours', 'fri_hours', 'sat_hours')
+    fields = ('project', 'task_description', 'sun_minutes', 'mon_minutes', 'tue_minutes',
+              'wed_minutes', 'thu_minutes', 'fri_minutes', 'sat_minutes')
     extra = 0
 
 
@@ -23,17 +26,71 @@ class TimesheetAdmin(BaseAdmin):
     inlines = [TimesheetRowInline]
     readonly_fields = ('total_hours', 'submitted_at', 'approved_at', 'approved_by')
 
+    def save_related(self, request, form, formsets, change):
+        """Refresh the stored daily totals after inline rows are saved."""
+        super().save_related(request, form, formsets, change)
+        timesheet = form.instance
+        timesheet.recalculate_daily_totals()
+        timesheet.save()
+
 
 @admin.register(TimesheetRow)
 class TimesheetRowAdmin(admin.ModelAdmin):
-    """Timesheet row admin."""
+    """Read-only timesheet rows; edit them inline on the timesheet, which refreshes its daily totals."""
     list_display = ('timesheet', 'project', 'task_description', 'get_row_total')
     search_fields = ('timesheet__employee__employee_id', 'project__name', 'task_description')
     list_filter = ('project', 'created_at')
-    
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
     def get_row_total(self, obj):
         return obj.get_row_total()
     get_row_total.short_description = 'Total Hours'
 
 
+@admin.register(TimesheetApprovalDelegation)
+class TimesheetApprovalDelegationAdmin(BaseAdmin):
+    """Timesheet approval delegation admin."""
+    list_display = ('manager', 'delegate', 'start_date', 'end_date')
+    search_fields = ('manager__employee_id', 'delegate__employee_id')
+    list_filter = ('start_date',)
+
+
+class TimesheetTemplateRowInline(admin.TabularInline):
+    """Inline admin for timesheet template rows."""
+    model = TimesheetTemplateRow
+    fields = ('project', 'task_description', 'sun_minutes', 'mon_minutes', 'tue_minutes',
+              'wed_minutes', 'thu_minutes', 'fri_minutes', 'sat_minutes')
+    extra = 0
+
+
+@admin.register(TimesheetTemplate)
+class TimesheetTemplateAdmin(BaseAdmin):
+    """Timesheet template admin."""
+    list_display = ('employee', 'name')
+    search_fields = ('employee__employee_id', 'name')
+    inlines = [TimesheetTemplateRowInline]
+
+
+@admin.register(TimesheetTransition)
+class TimesheetTransitionAdmin(admin.ModelAdmin):
+    """Read-only timesheet status history."""
+    list_display = ('timesheet', 'from_status', 'to_status', 'actor', 'at')
+    search_fields = ('timesheet__employee__employee_id', 'actor__employee_id')
+    list_filter = ('to_status', 'at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
+    def has_delete_permission(self, request, obj=None):
+        return False
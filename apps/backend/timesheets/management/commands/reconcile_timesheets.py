@@ -0,0 +1,35 @@
+"""
+Cross-check logged timesheet hours against approved leaves and holidays.
+"""
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from timesheets.models import Timesheet
+from timesheets.services import reconcile_timesheets
+
+
+class Command(BaseCommand):
+    """Report hours logged on leave days or holidays; meant to run on a schedule."""
+    help = 'Flag timesheet hours logged on approved-leave days and holidays for a period.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First date (YYYY-MM-DD); default: first of last month.')
+        parser.add_argument('--to', dest='end', help='Last date (YYYY-MM-DD); default: end of last month.')
+
+    def handle(self, *args, **options):
+        last_month_end = timezone.localdate().replace(day=1) - timedelta(days=1)
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else last_month_end.replace(day=1)
+            end = date.fromisoformat(options['end']) if options['end'] else last_month_end
+        except ValueError:
+            raise CommandError('--from and --to must be YYYY-MM-DD dates.')
+        if end < start:
+            raise CommandError('--to must be on or after --from.')
+
+        conflicts = reconcile_timesheets(Timesheet.objects.all(), start, end)
+        for conflict in conflicts:
+            self.stdout.write(
+                f"{conflict['employee_id']} {conflict['date']}: {conflict['hours']}h on "
+                f"{conflict['conflict']} ({conflict['reason']})"
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(conflicts)} conflict(s) between {start} and {end}.'))
@@ -0,0 +1,29 @@
+"""
+Compute the timesheet defaulter report for a month and refresh its cache.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from timesheets.services import get_defaulters
+
+
+class Command(BaseCommand):
+    """Compute timesheet defaulters; meant to run on a schedule."""
+    help = 'Find employees with missing or unsubmitted timesheets and cache the report.'
+
+    def add_arguments(self, parser):
+        today = timezone.localdate()
+        parser.add_argument('--year', type=int, default=today.year)
+        parser.add_argument('--month', type=int, default=today.month)
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+        if not 1 <= month <= 12:
+            raise CommandError('month must be between 1 and 12.')
+
+        report = get_defaulters(year, month, refresh=True)
+        for defaulter in report['defaulters']:
+            weeks = ', '.join(f"{week['week_start']} ({week['status']})" for week in defaulter['weeks'])
+            self.stdout.write(f"{defaulter['employee_id']} {defaulter['employee_name']}: {weeks}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(report['defaulters'])} defaulter(s) for {year}-{month:02d}."
+        ))
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.8 on 2026-10-19 01:50
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+DAYS = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")
+
+
+def backfill_daily_totals(apps, schema_editor):
+    """Populate the per-day totals from existing rows in a single UPDATE."""
+    Timesheet = apps.get_model("timesheets", "Timesheet")
+    TimesheetRow = apps.get_model("timesheets", "TimesheetRow")
+
+    def day_sum(day):
+        return Subquery(
+            TimesheetRow.objects.filter(timesheet=OuterRef("pk"))
+            .values("timesheet")
+            .annotate(total=Sum(f"{day}_hours"))
+            .values("total")[:1]
+        )
+
+    Timesheet.objects.filter(rows__isnull=False).update(
+        **{f"{day}_total": day_sum(day) for day in DAYS}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("timesheets", "0002_timesheetrow_delete_timesheetentry_and_more"),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name="timesheet",
+                name=f"{day}_total",
+                field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+            )
+            for day in DAYS
+        ],
+        migrations.RunPython(backfill_daily_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:05
+
+from django.db import migrations, models
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+
+DAYS = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")
+
+
+def to_minutes(field):
+    return Cast(Round(F(field) * 60), IntegerField())
+
+
+def to_hours(field):
+    return Round(F(field) / 60.0, 2)
+
+
+def hours_to_minutes(apps, schema_editor):
+    """Convert decimal hour columns to integer minutes with set-based UPDATEs."""
+    Timesheet = apps.get_model("timesheets", "Timesheet")
+    TimesheetRow = apps.get_model("timesheets", "TimesheetRow")
+    TimesheetRow.objects.update(**{f"{day}_minutes": to_minutes(f"{day}_hours") for day in DAYS})
+    Timesheet.objects.update(**{f"{day}_total_minutes": to_minutes(f"{day}_total") for day in DAYS})
+
+
+def minutes_to_hours(apps, schema_editor):
+    Timesheet = apps.get_model("timesheets", "Timesheet")
+    TimesheetRow = apps.get_model("timesheets", "TimesheetRow")
+    TimesheetRow.objects.update(**{f"{day}_hours": to_hours(f"{day}_minutes") for day in DAYS})
+    Timesheet.objects.update(**{f"{day}_total": to_hours(f"{day}_total_minutes") for day in DAYS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("timesheets", "0003_timesheet_daily_totals"),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name="timesheetrow",
+                name=f"{day}_minutes",
+                field=models.PositiveSmallIntegerField(default=0),
+            )
+            for day in DAYS
+        ],
+        *[
+            migrations.AddField(
+                model_name="timesheet",
+                name=f"{day}_total_minutes",
+                field=models.PositiveIntegerField(default=0),
+            )
+            for day in DAYS
+        ],
+        migrations.RunPython(hours_to_minutes, minutes_to_hours),
+        *[
+            migrations.RemoveField(model_name="timesheetrow", name=f"{day}_hours")
+            for day in DAYS
+        ],
+        *[
+            migrations.RemoveField(model_name="timesheet", name=f"{day}_total")
+            for day in DAYS
+        ],
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.8 on 2026-10-19 01:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0003_add_fk_fields_with_data_migration"),
+        ("timesheets", "0004_timesheet_integer_minutes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimesheetApprovalDelegation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("is_deleted", models.BooleanField(default=False)),
+                ("start_date", models.DateField()),
+                ("end_date", models.DateField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["-start_date"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="timesheet",
+            index=models.Index(
+                condition=models.Q(("status", "submitted")),
+                fields=["employee", "week_start"],
+                name="timesheet_pending_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="timesheetapprovaldelegation",
+            name="delegate",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="delegated_approvals",
+                to="employees.employee",
+            ),
+        ),
+        migrations.AddField(
+            model_name="timesheetapprovaldelegation",
+            name="manager",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="approval_delegations",
+                to="employees.employee",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="timesheetapprovaldelegation",
+            index=models.Index(
+                fields=["delegate", "start_date"], name="timesheets__delegat_1fc9c2_idx"
+            ),
+        ),
+    ]
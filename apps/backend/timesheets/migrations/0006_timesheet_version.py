@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("timesheets", "0005_approval_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="timesheet",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0002_add_allocation_percentage_and_role_choices"),
+        ("employees", "0003_add_fk_fields_with_data_migration"),
+        ("timesheets", "0006_timesheet_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimesheetTemplate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("is_deleted", models.BooleanField(default=False)),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timesheet_templates",
+                        to="employees.employee",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="TimesheetTemplateRow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("task_description", models.CharField(max_length=255)),
+                ("sun_minutes", models.PositiveSmallIntegerField(default=0)),
+                ("mon_minutes", models.PositiveSmallIntegerField(default=0)),
+                ("tue_minutes", models.PositiveSmallIntegerField(default=0)),
+                ("wed_minutes", models.PositiveSmallIntegerField(default=0)),
+                ("thu_minutes", models.PositiveSmallIntegerField(default=0)),
+                ("fri_minutes", models.PositiveSmallIntegerField(default=0)),
+                ("sat_minutes", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="projects.project",
+                    ),
+                ),
+                (
+                    "template",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rows",
+                        to="timesheets.timesheettemplate",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+                "unique_together": {("template", "project", "task_description")},
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="timesheettemplate",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_deleted", False)),
+                fields=("employee", "name"),
+                name="unique_active_timesheet_template",
+            ),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:11
+
+from django.db import migrations, models
+
+DAY_TOTAL_FIELDS = [f"{day}_total_minutes" for day in ("sun", "mon", "tue", "wed", "thu", "fri", "sat")]
+
+
+def check_daily_totals(apps, schema_editor):
+    """
+    Refuse to add the cap while stored totals already exceed it.
+
+    Adding the CHECK constraints would fail on those rows with a bare
+    database error. Fix the listed timesheets first (reduce the row hours
+    and the matching day totals) and re-run the migration.
+    """
+    Timesheet = apps.get_model("timesheets", "Timesheet")
+    over_cap = models.Q()
+    for field in DAY_TOTAL_FIELDS:
+        over_cap |= models.Q(**{f"{field}__gt": 480})
+    timesheet_ids = list(Timesheet.objects.filter(over_cap).order_by("pk").values_list("pk", flat=True))
+    if timesheet_ids:
+        raise RuntimeError(
+            "Cannot add the 8-hour daily cap: timesheets "
+            f"{', '.join(map(str, timesheet_ids))} have a day over 480 minutes. "
+            "Reduce their hours and re-run the migration."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("timesheets", "0007_timesheet_templates"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_daily_totals, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="timesheet",
+            constraint=models.CheckConstraint(
+                check=models.Q(("sun_total_minutes__lte", 480)),
+                name="timesheet_sun_total_minutes_cap",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="timesheet",
+            constraint=models.CheckConstraint(
+                check=models.Q(("mon_total_minutes__lte", 480)),
+                name="timesheet_mon_total_minutes_cap",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="timesheet",
+            constraint=models.CheckConstraint(
+                check=models.Q(("tue_total_minutes__lte", 480)),
+                name="timesheet_tue_total_minutes_cap",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="timesheet",
+            constraint=models.CheckConstraint(
+                check=models.Q(("wed_total_minutes__lte", 480)),
+                name="timesheet_wed_total_minutes_cap",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="timesheet",
+            constraint=models.CheckConstraint(
+                check=models.Q(("thu_total_minutes__lte", 480)),
+                name="timesheet_thu_total_minutes_cap",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="timesheet",
+            constraint=models.CheckConstraint(
+                check=models.Q(("fri_total_minutes__lte", 480)),
+                name="timesheet_fri_total_minutes_cap",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="timesheet",
+            constraint=models.CheckConstraint(
+                check=models.Q(("sat_total_minutes__lte", 480)),
+                name="timesheet_sat_total_minutes_cap",
+            ),
+        ),
+    ]
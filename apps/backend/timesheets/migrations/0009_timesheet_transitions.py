@@ -0,0 +1,125 @@
+# Generated by Django 4.2.8 on 2026-10-19 02:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_transitions(apps, schema_editor):
+    """Seed history from the latest submitted/approved timestamps on each timesheet."""
+    Timesheet = apps.get_model("timesheets", "Timesheet")
+    TimesheetTransition = apps.get_model("timesheets", "TimesheetTransition")
+
+    batch = []
+    timesheets = Timesheet.objects.filter(submitted_at__isnull=False).values_list(
+        "id", "employee_id", "submitted_at", "approved_at", "approved_by_id"
+    )
+    for timesheet_id, employee_id, submitted_at, approved_at, approved_by_id in timesheets.iterator():
+        batch.append(
+            TimesheetTransition(
+                timesheet_id=timesheet_id,
+                from_status="draft",
+                to_status="submitted",
+                actor_id=employee_id,
+                at=submitted_at,
+            )
+        )
+        if approved_at:
+            batch.append(
+                TimesheetTransition(
+                    timesheet_id=timesheet_id,
+                    from_status="submitted",
+                    to_status="approved",
+                    actor_id=approved_by_id,
+                    at=approved_at,
+                )
+            )
+        if len(batch) >= 1000:
+            TimesheetTransition.objects.bulk_create(batch)
+            batch = []
+    TimesheetTransition.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employees", "0003_add_fk_fields_with_data_migration"),
+        ("timesheets", "0008_timesheet_daily_cap"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimesheetTransition",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "from_status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Draft"),
+                            ("submitted", "Submitted"),
+                            ("approved", "Approved"),
+                            ("rejected", "Rejected"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "to_status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Draft"),
+                            ("submitted", "Submitted"),
+                            ("approved", "Approved"),
+                            ("rejected", "Rejected"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("at", models.DateTimeField()),
+                (
+                    "actor",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="timesheet_transitions",
+                        to="employees.employee",
+                    ),
+                ),
+                (
+                    "timesheet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transitions",
+                        to="timesheets.timesheet",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["at", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["timesheet", "at"],
+                        name="timesheets__timeshe_840987_idx",
+                    ),
+                    models.Index(
+                        fields=["actor", "to_status", "at"],
+                        name="timesheets__actor_i_4edcfa_idx",
+                    ),
+                    models.Index(
+                        fields=["to_status", "at"],
+                        name="timesheets__to_stat_9a4023_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_transitions, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,16 @@
 """
 Timesheet models.
 """
+import operator
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache, reduce
 from django.db import models
+from django.db.models import Case, Count, F, Prefetch, Q, Sum, Value, When
+from django.db.models.functions import Concat
 from django.core.exceptions import ValidationError
 from employees.models import Employee
 from projects.models import Project
-from common.models import SoftDeleteModel
+from common.models import SoftDeleteModel, SoftDeleteManager
 from datetime import datetime, timedelta
 
 TIMESHEET_STATUS_CHOICES = (
@@ -15,6 +20,95 @@ TIMESHEET_STATUS_CHOICES = (
     ('rejected', 'Rejected'),
 )
 
+DAYS = ('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat')
+DAY_LABELS = ('Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+
+# Hours are exposed as decimals but stored as integer minutes
+DAY_MINUTE_FIELDS = tuple(f'{day}_minutes' for day in DAYS)
+DAY_TOTAL_FIELDS = tuple(f'{day}_total_minutes' for day in DAYS)
+
+MAX_DAILY_HOURS = 8
+MAX_DAILY_MINUTES = MAX_DAILY_HOURS * 60
+
+# The last week of December 9999 would run past date.max
+MAX_YEAR = 9998
+
+TWO_PLACES = Decimal('0.01')
+
+
+def minutes_to_hours(minutes):
+    """Convert integer minutes to decimal hours (2 places)."""
+    return (Decimal(minutes or 0) / 60).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def hours_to_minutes(hours):
+    """Convert decimal hours to whole minutes."""
+    return int((Decimal(str(hours or 0)) * 60).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def sum_daily_minutes(rows):
+    """
+    Sum minutes per day over rows given as model instances or dicts.
+
+    Returns a dict keyed by day label (Sunday..Saturday) in a single pass.
+    """
+    totals = [0] * len(DAY_MINUTE_FIELDS)
+    for row in rows:
+        for index, day_field in enumerate(DAY_MINUTE_FIELDS):
+            value = row.get(day_field) if isinstance(row, dict) else getattr(row, day_field)
+            totals[index] += value or 0
+    return dict(zip(DAY_LABELS, totals))
+
+
+def daily_cap_message(day, minutes):
+    """Error message for a day over the daily cap."""
+    return f'{day} has {minutes_to_hours(minutes)} hours. Maximum allowed is {MAX_DAILY_HOURS} hours per day.'
+
+
+def check_daily_minutes(daily_minutes):
+    """Raise ValidationError if any day exceeds the daily cap."""
+    for day, minutes in daily_minutes.items():
+        if minutes > MAX_DAILY_MINUTES:
+            raise ValidationError(daily_cap_message(day, minutes))
+
+
+def _hours_property(minutes_field):
+    """Decimal-hours view over an integer minutes field."""
+    def getter(self):
+        return minutes_to_hours(getattr(self, minutes_field))
+
+    def setter(self, value):
+        setattr(self, minutes_field, hours_to_minutes(value))
+
+    return property(getter, setter)
+
+
+def full_name(prefix):
+    """Concatenate first and last name of the user behind an employee lookup ('' for Employee itself)."""
+    user = f'{prefix}__user' if prefix else 'user'
+    return Concat(f'{user}__first_name', Value(' '), f'{user}__last_name')
+
+
+class TimesheetQuerySet(models.QuerySet):
+    """Timesheet queryset with list and detail loading strategies."""
+
+    def for_list(self):
+        """Flat rows for list views: names and row counts come from annotations."""
+        return self.select_related('employee').annotate(
+            employee_name=full_name('employee'),
+            approved_by_name=Case(
+                When(approved_by__isnull=False, then=full_name('approved_by')),
+                default=None,
+            ),
+            row_count=Count('rows'),
+        )
+
+    def with_rows(self):
+        """Timesheets with people and rows (plus their projects) loaded up front."""
+        return self.select_related('employee__user', 'approved_by__user').prefetch_related(
+            Prefetch('rows', queryset=TimesheetRow.objects.select_related('project'))
+        )
+
 
 class Timesheet(SoftDeleteModel):
     """Timesheet model - represents a week's timesheet within a month."""
@@ -27,6 +121,16 @@ class Timesheet(SoftDeleteModel):
         default='draft'
     )
     total_hours = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+
+    # Denormalised per-day totals in minutes (Sun-Sat), kept in step with the rows
+    sun_total_minutes = models.PositiveIntegerField(default=0)
+    mon_total_minutes = models.PositiveIntegerField(default=0)
+    tue_total_minutes = models.PositiveIntegerField(default=0)
+    wed_total_minutes = models.PositiveIntegerField(default=0)
+    thu_total_minutes = models.PositiveIntegerField(default=0)
+    fri_total_minutes = models.PositiveIntegerField(default=0)
+    sat_total_minutes = models.PositiveIntegerField(default=0)
+
     submitted_at = models.DateTimeField(null=True, blank=True)
     approved_at = models.DateTimeField(null=True, blank=True)
     approved_by = models.ForeignKey(
@@ -38,66 +142,132 @@ class Timesheet(SoftDeleteModel):
     )
     rejection_reason = models.TextField(blank=True)
 
+    # Bumped on every content change; exposed as the ETag for optimistic concurrency
+    version = models.PositiveIntegerField(default=1)
+
+    objects = SoftDeleteManager.from_queryset(TimesheetQuerySet)()
+
     class Meta:
         ordering = ['-week_start']
         unique_together = ('employee', 'week_start')
         indexes = [
             models.Index(fields=['employee', 'week_start']),
             models.Index(fields=['status']),
+            # Pending-work index for approval queues
+            models.Index(
+                fields=['employee', 'week_start'],
+                condition=Q(status='submitted'),
+                name='timesheet_pending_idx',
+            ),
+        ]
+        # The daily cap is enforced by the database on the per-day totals
+        constraints = [
+            models.CheckConstraint(check=Q(**{f'{field}__lte': MAX_DAILY_MINUTES}), name=f'timesheet_{field}_cap')
+            for field in DAY_TOTAL_FIELDS
         ]
 
     def __str__(self):
         return f'{self.employee.employee_id} - {self.week_start} to {self.week_end}'
 
+    @property
+    def etag(self):
+        """Entity tag for the current version."""
+        return f'"{self.version}"'
+
     def calculate_total_hours(self):
-        """Calculate total hours from all rows."""
-        total = 0
-        for row in self.rows.all():
-            total += (
-                row.sun_hours + row.mon_hours + row.tue_hours +
-                row.wed_hours + row.thu_hours + row.fri_hours + row.sat_hours
-            )
+        """Calculate total hours from the stored daily totals."""
+        total = minutes_to_hours(sum(getattr(self, field) for field in DAY_TOTAL_FIELDS))
         self.total_hours = total
         return total
 
+    def get_daily_minutes(self):
+        """Get stored minutes for each day of the week."""
+        return {label: getattr(self, field) for label, field in zip(DAY_LABELS, DAY_TOTAL_FIELDS)}
+
     def get_daily_totals(self):
         """Get sum of hours for each day of the week."""
-        days = ['sun_hours', 'mon_hours', 'tue_hours', 'wed_hours', 'thu_hours', 'fri_hours', 'sat_hours']
-        day_labels = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-        totals = {}
-        
-        for day_field, day_label in zip(days, day_labels):
-            total = sum(getattr(row, day_field, 0) for row in self.rows.all())
-            totals[day_label] = total
-        
-        return totals
+        return {label: minutes_to_hours(minutes) for label, minutes in self.get_daily_minutes().items()}
+
+    def set_daily_totals(self, daily_minutes):
+        """Store per-day minutes (keyed by day label) and refresh total_hours."""
+        for label, field in zip(DAY_LABELS, DAY_TOTAL_FIELDS):
+            setattr(self, field, daily_minutes[label])
+        self.calculate_total_hours()
+
+    def recalculate_daily_totals(self):
+        """Recompute the stored daily totals from the rows with one integer SUM query."""
+        sums = self.rows.aggregate(**{
+            total_field: Sum(day_field, default=0)
+            for day_field, total_field in zip(DAY_MINUTE_FIELDS, DAY_TOTAL_FIELDS)
+        })
+        self.set_daily_totals({
+            label: sums[field] for label, field in zip(DAY_LABELS, DAY_TOTAL_FIELDS)
+        })
 
     def validate_daily_hours(self):
-        """Validate that no day exceeds 8 hours total."""
-        daily_totals = self.get_daily_totals()
-        for day, total in daily_totals.items():
-            if total > 8:
-                raise ValidationError(f'{day} has {total} hours. Maximum allowed is 8 hours per day.')
+        """Validate that no day exceeds 8 hours total (also enforced by a database constraint)."""
+        check_daily_minutes(self.get_daily_minutes())
 
 
-class TimesheetRow(models.Model):
-    """Timesheet row model - represents a project/task row with daily hours."""
-    timesheet = models.ForeignKey(Timesheet, on_delete=models.CASCADE, related_name='rows')
+class TimesheetRowQuerySet(models.QuerySet):
+    """Row queryset with integer-minute aggregation helpers."""
+
+    def with_total_minutes(self):
+        """Annotate each row with its weekly total in minutes."""
+        return self.annotate(total_minutes=reduce(operator.add, (F(field) for field in DAY_MINUTE_FIELDS)))
+
+    def total_minutes_by(self, *fields):
+        """Integer SUM of minutes per day and overall, grouped by the given fields."""
+        sums = {total: Sum(field) for field, total in zip(DAY_MINUTE_FIELDS, DAY_TOTAL_FIELDS)}
+        return self.values(*fields).annotate(
+            **sums,
+            total_minutes=reduce(operator.add, (Sum(field) for field in DAY_MINUTE_FIELDS)),
+        ).order_by(*fields)
+
+
+class DailyMinutesRow(models.Model):
+    """Abstract project/task row with minutes per day (Sun-Sat)."""
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     task_description = models.CharField(max_length=255)
     
-    # Daily hours (Sun-Sat)
-    sun_hours = models.DecimalField(max_digits=4, decimal_places=2, default=0)
-    mon_hours = models.DecimalField(max_digits=4, decimal_places=2, default=0)
-    tue_hours = models.DecimalField(max_digits=4, decimal_places=2, default=0)
-    wed_hours = models.DecimalField(max_digits=4, decimal_places=2, default=0)
-    thu_hours = models.DecimalField(max_digits=4, decimal_places=2, default=0)
-    fri_hours = models.DecimalField(max_digits=4, decimal_places=2, default=0)
-    sat_hours = models.DecimalField(max_digits=4, decimal_places=2, default=0)
-    
+    # Daily minutes (Sun-Sat)
+    sun_minutes = models.PositiveSmallIntegerField(default=0)
+    mon_minutes = models.PositiveSmallIntegerField(default=0)
+    tue_minutes = models.PositiveSmallIntegerField(default=0)
+    wed_minutes = models.PositiveSmallIntegerField(default=0)
+    thu_minutes = models.PositiveSmallIntegerField(default=0)
+    fri_minutes = models.PositiveSmallIntegerField(default=0)
+    sat_minutes = models.PositiveSmallIntegerField(default=0)
+
+    # Decimal-hours adapters kept for callers of the old hour fields
+    sun_hours = _hours_property('sun_minutes')
+    mon_hours = _hours_property('mon_minutes')
+    tue_hours = _hours_property('tue_minutes')
+    wed_hours = _hours_property('wed_minutes')
+    thu_hours = _hours_property('thu_minutes')
+    fri_hours = _hours_property('fri_minutes')
+    sat_hours = _hours_property('sat_minutes')
+
+    class Meta:
+        abstract = True
+
+    def get_row_minutes(self):
+        """Get total minutes for this row."""
+        return sum(getattr(self, field) for field in DAY_MINUTE_FIELDS)
+
+    def get_row_total(self):
+        """Get total hours for this row."""
+        return minutes_to_hours(self.get_row_minutes())
+
+
+class TimesheetRow(DailyMinutesRow):
+    """Timesheet row model - represents a project/task row with daily hours."""
+    timesheet = models.ForeignKey(Timesheet, on_delete=models.CASCADE, related_name='rows')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TimesheetRowQuerySet.as_manager()
+
     class Meta:
         ordering = ['created_at']
         unique_together = ('timesheet', 'project', 'task_description')
@@ -109,14 +279,89 @@ class TimesheetRow(models.Model):
     def __str__(self):
         return f'{self.timesheet} - {self.project.name} - {self.task_description}'
 
-    def get_row_total(self):
-        """Get total hours for this row."""
-        return (
-            self.sun_hours + self.mon_hours + self.tue_hours +
-            self.wed_hours + self.thu_hours + self.fri_hours + self.sat_hours
-        )
 
+class TimesheetTemplate(SoftDeleteModel):
+    """A saved set of rows an employee can stamp onto any week."""
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='timesheet_templates')
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['employee', 'name'],
+                condition=Q(is_deleted=False),
+                name='unique_active_timesheet_template',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.employee.employee_id} - {self.name}'
+
+
+class TimesheetTemplateRow(DailyMinutesRow):
+    """Row of a timesheet template."""
+    template = models.ForeignKey(TimesheetTemplate, on_delete=models.CASCADE, related_name='rows')
+
+    class Meta:
+        ordering = ['id']
+        unique_together = ('template', 'project', 'task_description')
+
+    def __str__(self):
+        return f'{self.template} - {self.project.name} - {self.task_description}'
 
+
+class TimesheetTransition(models.Model):
+    """Append-only history of timesheet status changes."""
+    timesheet = models.ForeignKey(Timesheet, on_delete=models.CASCADE, related_name='transitions')
+    from_status = models.CharField(max_length=20, choices=TIMESHEET_STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=TIMESHEET_STATUS_CHOICES)
+    actor = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='timesheet_transitions'
+    )
+    at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['at', 'id']
+        indexes = [
+            models.Index(fields=['timesheet', 'at']),
+            # Per-manager and per-period turnaround aggregation
+            models.Index(fields=['actor', 'to_status', 'at']),
+            models.Index(fields=['to_status', 'at']),
+        ]
+
+    def __str__(self):
+        return f'{self.timesheet_id}: {self.from_status} -> {self.to_status} at {self.at}'
+
+    def save(self, *args, **kwargs):
+        """Transitions are never changed once written."""
+        if self.pk:
+            raise ValueError('Timesheet transitions are append-only.')
+        super().save(*args, **kwargs)
+
+
+class TimesheetApprovalDelegation(SoftDeleteModel):
+    """Lets a manager hand their timesheet approvals to a delegate for a period."""
+    manager = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='approval_delegations')
+    delegate = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='delegated_approvals')
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-start_date']
+        indexes = [
+            models.Index(fields=['delegate', 'start_date']),
+        ]
+
+    def __str__(self):
+        return f'{self.manager.employee_id} -> {self.delegate.employee_id} from {self.start_date}'
+
+
+@lru_cache(maxsize=256)
 def get_month_weeks(year, month):
     """
     Calculate week boundaries for a given month (month-bounded weeks).
@@ -142,7 +387,9 @@ def get_month_weeks(year, month):
     - Week 5: Sun 23/11 → Sat 29/11
     - Week 6: Sun 30/11 → Sun 30/11
     
-    Returns: List of tuples (week_start, week_end)
+    Results are memoised, so the returned tuple must not be mutated.
+
+    Returns: Tuple of tuples (week_start, week_end)
     """
     import calendar
     
@@ -197,7 +444,7 @@ def get_month_weeks(year, month):
         if next_date <= last_day:
             weeks.append((next_date.date(), last_day.date()))
     
-    return weeks
+    return tuple(weeks)
 
 
 
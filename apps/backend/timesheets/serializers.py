@@ -2,13 +2,43 @@
 Timesheet serializers.
 """
 from rest_framework import serializers
-from django.core.exceptions import ValidationError
-from .models import Timesheet, TimesheetRow
+from django.db import transaction
+from .models import (
+    Timesheet, TimesheetRow, TimesheetTemplate, TimesheetTemplateRow, DAYS, MAX_YEAR, hours_to_minutes,
+    minutes_to_hours
+)
+from .services import (
+    row_key, create_timesheet, lock_timesheet, sync_timesheet_rows, save_timesheet, save_timesheet_template
+)
 from projects.models import Project
 
 
+class HoursField(serializers.DecimalField):
+    """Decimal hours on the wire, integer minutes in storage."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_digits', 4)
+        kwargs.setdefault('decimal_places', 2)
+        kwargs.setdefault('min_value', 0)
+        kwargs.setdefault('required', False)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return hours_to_minutes(super().to_internal_value(data))
+
+    def to_representation(self, value):
+        return super().to_representation(minutes_to_hours(value))
+
+
 class TimesheetRowSerializer(serializers.ModelSerializer):
     """Timesheet row serializer."""
+    sun_hours = HoursField(source='sun_minutes')
+    mon_hours = HoursField(source='mon_minutes')
+    tue_hours = HoursField(source='tue_minutes')
+    wed_hours = HoursField(source='wed_minutes')
+    thu_hours = HoursField(source='thu_minutes')
+    fri_hours = HoursField(source='fri_minutes')
+    sat_hours = HoursField(source='sat_minutes')
     project_name = serializers.CharField(source='project.name', read_only=True)
     project_client = serializers.CharField(source='project.client', read_only=True)
     row_total = serializers.SerializerMethodField(read_only=True)
@@ -41,12 +71,12 @@ class TimesheetSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'employee', 'employee_id', 'employee_name', 'week_start', 'week_end',
             'status', 'total_hours', 'submitted_at', 'approved_at', 'approved_by',
-            'approved_by_name', 'rejection_reason', 'rows', 'daily_totals',
+            'approved_by_name', 'rejection_reason', 'rows', 'daily_totals', 'version',
             'created_at', 'updated_at'
         )
         read_only_fields = (
             'id', 'submitted_at', 'approved_at', 'approved_by',
-            'created_at', 'updated_at', 'total_hours', 'daily_totals'
+            'created_at', 'updated_at', 'total_hours', 'daily_totals', 'version'
         )
 
     def get_employee_name(self, obj):
@@ -64,9 +94,72 @@ class TimesheetSerializer(serializers.ModelSerializer):
         return obj.get_daily_totals()
 
 
+class TimesheetListSerializer(serializers.ModelSerializer):
+    """
+    Lightweight timesheet serializer for list views.
+
+    Expects a queryset built with Timesheet.objects.for_list(), which
+    annotates employee_name, approved_by_name and row_count.
+    """
+    employee_id = serializers.CharField(source='employee.employee_id', read_only=True)
+    employee_name = serializers.CharField(read_only=True)
+    approved_by_name = serializers.CharField(read_only=True, allow_null=True)
+    row_count = serializers.IntegerField(read_only=True)
+    daily_totals = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = Timesheet
+        fields = (
+            'id', 'employee', 'employee_id', 'employee_name', 'week_start', 'week_end',
+            'status', 'total_hours', 'submitted_at', 'approved_at', 'approved_by',
+            'approved_by_name', 'rejection_reason', 'row_count', 'daily_totals',
+            'created_at', 'updated_at'
+        )
+        read_only_fields = fields
+
+    def get_daily_totals(self, obj):
+        """Get total hours per day."""
+        return obj.get_daily_totals()
+
+
+def validate_rows_payload(rows_data):
+    """Reject empty payloads, duplicate (project, task) rows and unknown projects."""
+    if not rows_data:
+        raise serializers.ValidationError("At least one row is required.")
+
+    keys = set()
+    for row_data in rows_data:
+        key = row_key(row_data['project_id'], row_data['task_description'])
+        if key in keys:
+            raise serializers.ValidationError(
+                f"Duplicate row for project {key[0]} and task '{key[1]}'."
+            )
+        keys.add(key)
+
+    # Validate that all projects exist with a single query
+    project_ids = {project_id for project_id, _ in keys}
+    found = set(Project.objects.filter(id__in=project_ids).values_list('id', flat=True))
+    missing = sorted(project_ids - found)
+    if missing:
+        raise serializers.ValidationError(f"Project {missing[0]} does not exist.")
+
+    return rows_data
+
+
+class TimesheetRowWriteSerializer(TimesheetRowSerializer):
+    """
+    Row serializer used for writes.
+
+    Projects are taken as plain ids and checked in bulk by the parent
+    serializer instead of one lookup per row.
+    """
+    id = serializers.IntegerField(required=False)
+    project = serializers.IntegerField(source='project_id')
+
+
 class TimesheetCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer for creating/updating timesheets with nested rows."""
-    rows = TimesheetRowSerializer(many=True, required=False)
+    rows = TimesheetRowWriteSerializer(many=True, required=False)
 
     class Meta:
         model = Timesheet
@@ -75,101 +168,123 @@ class TimesheetCreateUpdateSerializer(serializers.ModelSerializer):
 
     def validate_rows(self, rows_data):
         """Validate rows data."""
-        if not rows_data:
-            raise serializers.ValidationError("At least one row is required.")
-        
-        # Validate that all projects exist
-        for row_data in rows_data:
-            project = row_data.get('project')
-            
-            # Handle both Project object and ID
-            if isinstance(project, Project):
-                project_id = project.id
-            elif isinstance(project, (int, str)):
-                project_id = int(project)
-            else:
-                raise serializers.ValidationError(f"Invalid project value: {project}")
-            
-            if not Project.objects.filter(id=project_id).exists():
-                raise serializers.ValidationError(f"Project {project_id} does not exist.")
-            
-            # Ensure we store the ID, not the object
-            row_data['project'] = project_id
-        
-        return rows_data
+        return validate_rows_payload(rows_data)
 
     def create(self, validated_data):
-        """Create timesheet with nested rows."""
+        """Create timesheet with nested rows; the daily cap is enforced on insert."""
         rows_data = validated_data.pop('rows')
-        timesheet = Timesheet.objects.create(**validated_data)
-        
-        try:
-            for row_data in rows_data:
-                # Extract project and convert to ID if needed
-                project = row_data.pop('project', None)
-                if project is not None:
-                    if isinstance(project, Project):
-                        project_id = project.id
-                    else:
-                        project_id = int(project)
-                    row_data['project_id'] = project_id
-            
-                TimesheetRow.objects.create(timesheet=timesheet, **row_data)
-            
-            # Validate daily hours after creating rows
-            timesheet.validate_daily_hours()
-            
-            # Calculate total hours
-            timesheet.calculate_total_hours()
-            timesheet.save()
-        except ValidationError:
-            # If validation fails, delete the timesheet and re-raise
-            timesheet.delete()
-            raise
-        
-        return timesheet
+        return create_timesheet(rows_data, **validated_data)
 
     def update(self, instance, validated_data):
-        """Update timesheet with nested rows."""
+        """
+        Update timesheet, diffing incoming rows against the stored ones.
+
+        The timesheet is locked and reloaded first, so the totals and the
+        version are computed from the current rows rather than the snapshot
+        the request started from. `expected_version` is the If-Match version.
+        """
         rows_data = validated_data.pop('rows', None)
-        
-        # Update timesheet fields
-        instance.week_start = validated_data.get('week_start', instance.week_start)
-        instance.week_end = validated_data.get('week_end', instance.week_end)
-        
-        # Only allow update if status is draft or rejected
-        if instance.status not in ['draft', 'rejected']:
-            raise serializers.ValidationError("Cannot modify a submitted or approved timesheet.")
-        
-        if rows_data is not None:
-            # Delete existing rows and create new ones
-            instance.rows.all().delete()
-            for row_data in rows_data:
-                # Extract project and convert to ID if needed
-                project = row_data.pop('project', None)
-                if project is not None:
-                    if isinstance(project, Project):
-                        project_id = project.id
-                    else:
-                        project_id = int(project)
-                    row_data['project_id'] = project_id
-                
-                TimesheetRow.objects.create(timesheet=instance, **row_data)
-        
-        # Validate daily hours
-        try:
-            instance.validate_daily_hours()
-        except ValidationError as e:
-            # Convert Django ValidationError to DRF ValidationError
-            raise serializers.ValidationError(str(e))
-        
-        # Calculate total hours
-        instance.calculate_total_hours()
-        instance.save()
-        
+        expected_version = validated_data.pop('expected_version', None)
+
+        with transaction.atomic():
+            lock_timesheet(instance, expected_version)
+            instance.week_start = validated_data.get('week_start', instance.week_start)
+            instance.week_end = validated_data.get('week_end', instance.week_end)
+            if rows_data is not None:
+                sync_timesheet_rows(instance, rows_data)
+
+            # The daily cap constraint rejects over-cap totals; a failure rolls the row changes back
+            instance.version += 1
+            save_timesheet(instance)
+
         return instance
 
 
+class TimesheetCellSerializer(serializers.Serializer):
+    """A single (row, day) cell edit for autosave."""
+    row = serializers.IntegerField()
+    day = serializers.ChoiceField(choices=DAYS)
+    hours = HoursField(required=True)
+
+
+class TimesheetRowAddSerializer(TimesheetRowWriteSerializer):
+    """A new row for autosave; the project is checked here as there is no parent."""
+
+    def validate_project(self, value):
+        """Validate that the project exists."""
+        if not Project.objects.filter(id=value).exists():
+            raise serializers.ValidationError(f"Project {value} does not exist.")
+        return value
+
+
+class TimesheetCopySerializer(serializers.Serializer):
+    """Copy rows from a previous (or named) week into a week."""
+    week_start = serializers.DateField()
+    source_week_start = serializers.DateField(required=False)
+    include_hours = serializers.BooleanField(default=False)
+
+
+class TimesheetTemplateRowSerializer(TimesheetRowWriteSerializer):
+    """Template row serializer."""
+
+    class Meta:
+        model = TimesheetTemplateRow
+        fields = (
+            'id', 'project', 'project_name', 'project_client', 'task_description',
+            'sun_hours', 'mon_hours', 'tue_hours', 'wed_hours',
+            'thu_hours', 'fri_hours', 'sat_hours', 'row_total'
+        )
+        read_only_fields = ('id',)
+
+
+class TimesheetTemplateSerializer(serializers.ModelSerializer):
+    """Timesheet template serializer with nested rows."""
+    rows = TimesheetTemplateRowSerializer(many=True)
+
+    class Meta:
+        model = TimesheetTemplate
+        fields = ('id', 'name', 'rows', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at')
+
+    def validate_name(self, value):
+        """Template names are unique per employee."""
+        templates = TimesheetTemplate.objects.filter(employee=self.context['request'].user.employee, name=value)
+        if self.instance:
+            templates = templates.exclude(pk=self.instance.pk)
+        if templates.exists():
+            raise serializers.ValidationError("A template with this name already exists.")
+        return value
+
+    def validate_rows(self, rows_data):
+        """Validate rows data."""
+        return validate_rows_payload(rows_data)
+
+    def create(self, validated_data):
+        """Create a template with its rows."""
+        rows_data = validated_data.pop('rows')
+        return save_timesheet_template(TimesheetTemplate(**validated_data), rows_data)
+
+    def update(self, instance, validated_data):
+        """Rename a template and/or replace its rows."""
+        rows_data = validated_data.pop('rows', None)
+        instance.name = validated_data.get('name', instance.name)
+        if rows_data is None:
+            instance.save()
+            return instance
+        return save_timesheet_template(instance, rows_data)
+
+
+class TimesheetMonthSerializer(serializers.Serializer):
+    """A calendar month."""
+    year = serializers.IntegerField(min_value=1, max_value=MAX_YEAR)
+    month = serializers.IntegerField(min_value=1, max_value=12)
+
+
+class TimesheetTemplateApplySerializer(TimesheetMonthSerializer):
+    """Weeks of a month to pre-populate from a template (default: all)."""
+    weeks = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+
+
 class TimesheetApprovalSerializer(serializers.Serializer):
     """Serializer for approval/rejection actions."""
     action = serializers.ChoiceField(choices=['approve', 'reject'])
@@ -182,4 +297,10 @@ class TimesheetApprovalSerializer(serializers.Serializer):
         return data
 
 
-
+class TimesheetBulkApprovalSerializer(TimesheetApprovalSerializer):
+    """Serializer for approving/rejecting a batch of timesheets."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500
+    )
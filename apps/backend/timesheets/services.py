@@ -0,0 +1,933 @@
+"""
+Timesheet services.
+"""
+import operator
+from datetime import timedelta
+from functools import reduce
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Avg, BooleanField, Case, Count, DurationField, Exists, ExpressionWrapper, F, Max, OuterRef, Prefetch, Q,
+    Subquery, Value, When, prefetch_related_objects
+)
+from django.db.models.functions import Round
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from common.exceptions import InvalidTimesheetException, PreconditionFailedException
+from employees.models import Employee
+from leaves.models import Leave
+from settings.services import get_holidays_between, holidays_between
+from .models import (
+    Timesheet, TimesheetRow, TimesheetApprovalDelegation, TimesheetTemplateRow, TimesheetTransition, DAYS, DAY_LABELS,
+    DAY_MINUTE_FIELDS, DAY_TOTAL_FIELDS, MAX_DAILY_HOURS, MAX_DAILY_MINUTES, sum_daily_minutes, check_daily_minutes,
+    daily_cap_message, get_month_weeks, minutes_to_hours, full_name
+)
+
+ROW_FIELDS = ('project_id', 'task_description') + DAY_MINUTE_FIELDS
+EDITABLE_STATUSES = ('draft', 'rejected')
+# Temporary task_description of rows whose key changes mid-sync
+REKEY_PREFIX = '~rekey~'
+
+
+def row_key(project_id, task_description):
+    """Natural key of a row within a timesheet."""
+    return (int(project_id), task_description)
+
+
+def refresh_rows(timesheet):
+    """Reload the rows prefetch cache (with projects) after rows were written."""
+    getattr(timesheet, '_prefetched_objects_cache', {}).pop('rows', None)
+    prefetch_related_objects(
+        [timesheet],
+        Prefetch('rows', queryset=TimesheetRow.objects.select_related('project'))
+    )
+
+
+def save_timesheet(timesheet, **kwargs):
+    """
+    Save a timesheet, mapping constraint violations to API errors.
+
+    The daily cap is a CHECK constraint on the per-day totals, so an
+    over-cap save fails atomically in the database, concurrent writers
+    included, without reading the rows back to validate them.
+    """
+    try:
+        timesheet.save(**kwargs)
+    except IntegrityError as e:
+        message = str(e)
+        for label, field in zip(DAY_LABELS, DAY_TOTAL_FIELDS):
+            if f'timesheet_{field}_cap' in message:
+                raise InvalidTimesheetException(daily_cap_message(label, getattr(timesheet, field))) from e
+        if 'week_start' in message:
+            # unique_together (employee, week_start)
+            raise InvalidTimesheetException(
+                f'A timesheet for the week starting {timesheet.week_start} already exists.'
+            ) from e
+        raise
+
+
+@transaction.atomic
+def create_timesheet(rows_data, **timesheet_fields):
+    """
+    Create a timesheet and its rows.
+
+    The per-day totals are computed from the payload and stored with the
+    timesheet, so an over-cap or duplicate week is rejected by the database
+    before any row is inserted. On success the timesheet and all rows are
+    inserted in one transaction.
+    """
+    timesheet = Timesheet(**timesheet_fields)
+    timesheet.set_daily_totals(sum_daily_minutes(rows_data))
+    save_timesheet(timesheet)
+    TimesheetRow.objects.bulk_create([
+        TimesheetRow(timesheet=timesheet, **{field: row_data[field] for field in ROW_FIELDS if field in row_data})
+        for row_data in rows_data
+    ])
+
+    refresh_rows(timesheet)
+    return timesheet
+
+
+@transaction.atomic
+def sync_timesheet_rows(timesheet, rows_data):
+    """
+    Bring a timesheet's rows in line with the incoming payload.
+
+    Incoming rows claim existing rows by explicit id first; rows without a
+    (known) id then fall back to an unclaimed row with the same (project,
+    task_description) key. Matched rows are updated in place, unmatched
+    incoming rows are inserted and leftover rows are deleted, so unchanged
+    rows keep their ids and created_at. Rows whose key changes are parked
+    on temporary keys first, so keys swapped between rows never collide.
+    The timesheet's daily totals are refreshed in memory; the caller
+    validates and saves it.
+    """
+    existing = list(timesheet.rows.all())
+    by_id = {row.id: row for row in existing}
+    matches = {}
+    claimed = set()
+    for index, row_data in enumerate(rows_data):
+        row = by_id.get(row_data.get('id'))
+        if row is not None and row.id not in claimed:
+            matches[index] = row.id
+            claimed.add(row.id)
+    by_key = {row_key(row.project_id, row.task_description): row for row in existing if row.id not in claimed}
+    for index, row_data in enumerate(rows_data):
+        if index not in matches:
+            row = by_key.pop(row_key(row_data['project_id'], row_data['task_description']), None)
+            if row is not None:
+                matches[index] = row.id
+
+    to_create = []
+    to_update = []
+    rekeyed = []
+    now = timezone.now()
+    for index, row_data in enumerate(rows_data):
+        if index not in matches:
+            values = {field: row_data[field] for field in ROW_FIELDS if field in row_data}
+            to_create.append(TimesheetRow(timesheet=timesheet, **values))
+            continue
+
+        row = by_id[matches[index]]
+        old_key = row_key(row.project_id, row.task_description)
+        changed = False
+        for field in ROW_FIELDS:
+            # Days left out of the payload are cleared, as a full PUT would
+            value = row_data.get(field, 0)
+            if getattr(row, field) != value:
+                setattr(row, field, value)
+                changed = True
+        if changed:
+            row.updated_at = now
+            to_update.append(row)
+            if row_key(row.project_id, row.task_description) != old_key:
+                rekeyed.append(row)
+
+    matched = set(matches.values())
+    stale_ids = [row.id for row in existing if row.id not in matched]
+    if stale_ids:
+        TimesheetRow.objects.filter(id__in=stale_ids).delete()
+    if rekeyed:
+        TimesheetRow.objects.bulk_update(
+            [TimesheetRow(id=row.id, task_description=f'{REKEY_PREFIX}{row.id}') for row in rekeyed],
+            ['task_description']
+        )
+    if to_update:
+        TimesheetRow.objects.bulk_update(to_update, ROW_FIELDS + ('updated_at',))
+    if to_create:
+        TimesheetRow.objects.bulk_create(to_create)
+
+    refresh_rows(timesheet)
+    timesheet.set_daily_totals(sum_daily_minutes(timesheet.rows.all()))
+    return timesheet
+
+
+def check_version(timesheet, expected_version):
+    """Raise 412 when the client's version (from If-Match) is stale."""
+    if expected_version is not None and expected_version != timesheet.version:
+        raise PreconditionFailedException()
+
+
+def apply_daily_deltas(timesheet, deltas, expected_version=None):
+    """
+    Shift a timesheet's stored daily totals by per-day minute deltas.
+
+    `deltas` maps total fields (e.g. 'mon_total_minutes') to signed minutes.
+    A single conditional UPDATE checks the version, the editable status and,
+    for each increased day, the daily cap against the stored total, and
+    bumps the version. When nothing matched, the cause is looked up and
+    raised as a 412 or a timesheet error.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    conditions = Q(pk=timesheet.pk, status__in=EDITABLE_STATUSES)
+    if expected_version is not None:
+        conditions &= Q(version=expected_version)
+    for field, delta in deltas.items():
+        if delta > 0:
+            conditions &= Q(**{f'{field}__lte': MAX_DAILY_MINUTES - delta})
+
+    new_total = reduce(operator.add, (F(field) + deltas.get(field, 0) for field in DAY_TOTAL_FIELDS))
+    updated = Timesheet.objects.filter(conditions).update(
+        **{field: F(field) + delta for field, delta in deltas.items()},
+        total_hours=Round(new_total / 60.0, 2),
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+
+    if not updated:
+        current = Timesheet.objects.filter(pk=timesheet.pk).values('status', 'version', *DAY_TOTAL_FIELDS).first()
+        if current is None:
+            raise NotFound()
+        if current['status'] not in EDITABLE_STATUSES:
+            raise InvalidTimesheetException(f"Cannot modify a {current['status']} timesheet.")
+        if expected_version is not None and current['version'] != expected_version:
+            raise PreconditionFailedException()
+        for label, field in zip(DAY_LABELS, DAY_TOTAL_FIELDS):
+            minutes = current[field] + deltas.get(field, 0)
+            if minutes > MAX_DAILY_MINUTES:
+                raise InvalidTimesheetException(
+                    f"{label} would have {minutes_to_hours(minutes)} hours. "
+                    f"Maximum allowed is {MAX_DAILY_HOURS} hours per day."
+                )
+        raise PreconditionFailedException()
+
+    for field, delta in deltas.items():
+        setattr(timesheet, field, getattr(timesheet, field) + delta)
+    timesheet.calculate_total_hours()
+    timesheet.version += 1
+    return timesheet
+
+
+def lock_timesheet(timesheet, expected_version=None):
+    """
+    Lock a timesheet and its rows for a full update and reload both.
+
+    Rows are locked before the timesheet, the order the autosave actions
+    take them in, so a PUT and a concurrent cell edit queue up instead of
+    deadlocking. The version and status are re-checked under the lock.
+    Must be called inside a transaction.
+    """
+    list(TimesheetRow.objects.select_for_update().filter(timesheet_id=timesheet.pk).order_by('pk').values_list('pk'))
+    if not Timesheet.objects.select_for_update().filter(pk=timesheet.pk).exists():
+        raise NotFound()
+    timesheet.refresh_from_db()
+    check_version(timesheet, expected_version)
+    if timesheet.status not in EDITABLE_STATUSES:
+        raise InvalidTimesheetException(f'Cannot modify a {timesheet.status} timesheet.')
+    refresh_rows(timesheet)
+    return timesheet
+
+
+def _lock_row(timesheet, row_id):
+    """Fetch one of the timesheet's rows with a row lock."""
+    try:
+        return TimesheetRow.objects.select_for_update().get(pk=row_id, timesheet=timesheet)
+    except TimesheetRow.DoesNotExist:
+        raise NotFound('Row not found.')
+
+
+@transaction.atomic
+def update_timesheet_cell(timesheet, row_id, day, minutes, expected_version=None):
+    """
+    Set one (row, day) cell of a timesheet.
+
+    Only the change in minutes is applied to the stored day total, so an
+    autosave costs one UPDATE on the timesheet and one on the row.
+    """
+    field = DAY_MINUTE_FIELDS[DAYS.index(day)]
+    row = _lock_row(timesheet, row_id)
+    delta = minutes - getattr(row, field)
+    if not delta:
+        check_version(timesheet, expected_version)
+        return row
+
+    apply_daily_deltas(timesheet, {DAY_TOTAL_FIELDS[DAYS.index(day)]: delta}, expected_version)
+    row.updated_at = timezone.now()
+    setattr(row, field, minutes)
+    TimesheetRow.objects.filter(pk=row.pk).update(**{field: minutes, 'updated_at': row.updated_at})
+    return row
+
+
+@transaction.atomic
+def add_timesheet_row(timesheet, row_data, expected_version=None):
+    """Add one row to a timesheet, adding its minutes to the day totals."""
+    values = {field: row_data[field] for field in ROW_FIELDS if field in row_data}
+    apply_daily_deltas(
+        timesheet,
+        {total: values.get(field, 0) for field, total in zip(DAY_MINUTE_FIELDS, DAY_TOTAL_FIELDS)},
+        expected_version
+    )
+    try:
+        return TimesheetRow.objects.create(timesheet=timesheet, **values)
+    except IntegrityError:
+        raise InvalidTimesheetException(
+            f"Duplicate row for project {values['project_id']} and task '{values['task_description']}'."
+        )
+
+
+@transaction.atomic
+def remove_timesheet_row(timesheet, row_id, expected_version=None):
+    """Delete one row of a timesheet, subtracting its minutes from the day totals."""
+    row = _lock_row(timesheet, row_id)
+    apply_daily_deltas(
+        timesheet,
+        {total: -getattr(row, field) for field, total in zip(DAY_MINUTE_FIELDS, DAY_TOTAL_FIELDS)},
+        expected_version
+    )
+    row.delete()
+    return timesheet
+
+
+def get_week_bounds(week_start):
+    """(start, end) of the month-bounded week starting on `week_start`, or None."""
+    for start, end in get_month_weeks(week_start.year, week_start.month):
+        if start == week_start:
+            return start, end
+    return None
+
+
+def week_day_fields(week_start, week_end):
+    """Minute fields of the weekdays that fall inside a (possibly partial) week."""
+    return {
+        DAY_MINUTE_FIELDS[(week_start + timedelta(days=offset)).isoweekday() % 7]
+        for offset in range((week_end - week_start).days + 1)
+    }
+
+
+@transaction.atomic
+def populate_weeks(employee, weeks, rows_data):
+    """
+    Add rows to an employee's timesheets for the given (start, end) weeks.
+
+    Missing timesheets are created as drafts; existing ones must still be
+    editable. Rows already present (same project and task) are skipped and
+    minutes on days outside a partial week are dropped. The cost is fixed
+    however many weeks and rows are involved: lock existing timesheets,
+    insert missing ones, read existing row keys, insert rows, update totals.
+    Returns (timesheet, rows_added) pairs in week order.
+    """
+    timesheets = {
+        timesheet.week_start: timesheet
+        # Soft-deleted weeks still hold their (employee, week_start) slot
+        for timesheet in Timesheet.all_objects.select_for_update().filter(
+            employee=employee, week_start__in=[start for start, _ in weeks]
+        )
+    }
+    for timesheet in timesheets.values():
+        if timesheet.is_deleted:
+            raise InvalidTimesheetException(
+                f'A timesheet for the week starting {timesheet.week_start} already exists.'
+            )
+        if timesheet.status not in EDITABLE_STATUSES:
+            raise InvalidTimesheetException(
+                f'Cannot modify the {timesheet.status} timesheet for {timesheet.week_start}.'
+            )
+    try:
+        created = Timesheet.objects.bulk_create([
+            Timesheet(employee=employee, week_start=start, week_end=end)
+            for start, end in weeks if start not in timesheets
+        ])
+    except IntegrityError as e:
+        # A concurrent request created one of the weeks after the lookup above
+        raise InvalidTimesheetException(
+            'A timesheet for one of these weeks was created by another request. Please retry.'
+        ) from e
+    timesheets.update((timesheet.week_start, timesheet) for timesheet in created)
+
+    existing = set(
+        TimesheetRow.objects.filter(timesheet__in=list(timesheets.values()))
+        .values_list('timesheet_id', 'project_id', 'task_description')
+    )
+    to_create = []
+    changed = []
+    results = []
+    now = timezone.now()
+    for start, end in weeks:
+        timesheet = timesheets[start]
+        inside = week_day_fields(start, end)
+        daily = timesheet.get_daily_minutes()
+        added = 0
+        for row_data in rows_data:
+            key = (timesheet.id, row_data['project_id'], row_data['task_description'])
+            if key in existing:
+                continue
+            existing.add(key)
+            minutes = {field: row_data.get(field, 0) if field in inside else 0 for field in DAY_MINUTE_FIELDS}
+            for label, field in zip(DAY_LABELS, DAY_MINUTE_FIELDS):
+                daily[label] += minutes[field]
+            to_create.append(TimesheetRow(
+                timesheet=timesheet,
+                project_id=row_data['project_id'],
+                task_description=row_data['task_description'],
+                **minutes
+            ))
+            added += 1
+
+        try:
+            check_daily_minutes(daily)
+        except ValidationError as e:
+            raise InvalidTimesheetException(f'Week of {start}: {e.messages[0]}')
+        if added:
+            timesheet.set_daily_totals(daily)
+            timesheet.version += 1
+            timesheet.updated_at = now
+            changed.append(timesheet)
+        results.append((timesheet, added))
+
+    TimesheetRow.objects.bulk_create(to_create)
+    Timesheet.objects.bulk_update(changed, DAY_TOTAL_FIELDS + ('total_hours', 'version', 'updated_at'))
+    return results
+
+
+def copy_timesheet_week(employee, week, source_week_start=None, include_hours=False):
+    """
+    Copy rows from another week into `week` (a (start, end) pair).
+
+    The source is the employee's timesheet for `source_week_start`, or the
+    latest one before the target week; its rows are read with one query.
+    Hours are copied only when `include_hours` is set.
+    """
+    sources = Timesheet.objects.filter(employee=employee)
+    if source_week_start:
+        sources = sources.filter(week_start=source_week_start)
+    else:
+        sources = sources.filter(week_start__lt=week[0]).order_by('-week_start')
+    fields = ('project_id', 'task_description') + (DAY_MINUTE_FIELDS if include_hours else ())
+    rows_data = list(
+        TimesheetRow.objects.filter(timesheet=Subquery(sources.values('id')[:1]))
+        .order_by('created_at').values(*fields)
+    )
+    if not rows_data:
+        raise NotFound('No timesheet rows to copy from.')
+
+    timesheet, _ = populate_weeks(employee, [week], rows_data)[0]
+    return timesheet
+
+
+def apply_timesheet_template(template, weeks):
+    """Stamp a template's rows (with their hours) onto the given weeks."""
+    rows_data = list(
+        TimesheetTemplateRow.objects.filter(template=template)
+        .values('project_id', 'task_description', *DAY_MINUTE_FIELDS)
+    )
+    return populate_weeks(template.employee, weeks, rows_data)
+
+
+@transaction.atomic
+def save_timesheet_template(template, rows_data):
+    """Save a template and replace its rows."""
+    template.save()
+    template.rows.all().delete()
+    TimesheetTemplateRow.objects.bulk_create([
+        TimesheetTemplateRow(template=template, **{field: row_data[field] for field in ROW_FIELDS if field in row_data})
+        for row_data in rows_data
+    ])
+    getattr(template, '_prefetched_objects_cache', {}).pop('rows', None)
+    return template
+
+
+def _hours_list(values, fields):
+    """Seven-slot list of hours (Sun-Sat) from a dict of minute columns."""
+    return [float(minutes_to_hours(values[field])) for field in fields]
+
+
+def get_month_grid(timesheets, year, month):
+    """
+    Build a compact week x project x day matrix for one month.
+
+    `timesheets` is an already scoped queryset (typically one employee).
+    The month's timesheets and their rows are read with two range queries;
+    weeks without a timesheet are returned as empty placeholders.
+    """
+    weeks = get_month_weeks(year, month)
+    sheets = {
+        sheet['week_start']: sheet
+        for sheet in timesheets.filter(
+            week_start__range=(weeks[0][0], weeks[-1][1])
+        ).values('id', 'week_start', 'status', 'total_hours', *DAY_TOTAL_FIELDS)
+    }
+
+    rows_by_sheet = {}
+    projects = {}
+    rows = TimesheetRow.objects.filter(
+        timesheet_id__in=[sheet['id'] for sheet in sheets.values()]
+    ).values(
+        'id', 'timesheet_id', 'project_id', 'project__name', 'project__client',
+        'task_description', *DAY_MINUTE_FIELDS
+    ).order_by('created_at')
+    for row in rows:
+        projects[row['project_id']] = {'name': row['project__name'], 'client': row['project__client']}
+        rows_by_sheet.setdefault(row['timesheet_id'], []).append({
+            'id': row['id'],
+            'project': row['project_id'],
+            'task_description': row['task_description'],
+            'hours': _hours_list(row, DAY_MINUTE_FIELDS),
+        })
+
+    grid = []
+    for number, (week_start, week_end) in enumerate(weeks, start=1):
+        sheet = sheets.get(week_start)
+        grid.append({
+            'week': number,
+            'week_start': week_start,
+            'week_end': week_end,
+            'timesheet': sheet and {
+                'id': sheet['id'],
+                'status': sheet['status'],
+                'total_hours': sheet['total_hours'],
+            },
+            'daily_totals': _hours_list(sheet, DAY_TOTAL_FIELDS) if sheet else [0.0] * len(DAY_TOTAL_FIELDS),
+            'rows': rows_by_sheet.get(sheet['id'], []) if sheet else [],
+        })
+
+    return {'year': year, 'month': month, 'weeks': grid, 'projects': projects}
+
+
+def record_transitions(timesheet_ids, from_status, to_status, actor, at):
+    """Append one history row per timesheet; call in the status update's transaction."""
+    TimesheetTransition.objects.bulk_create([
+        TimesheetTransition(timesheet_id=timesheet_id, from_status=from_status, to_status=to_status, actor=actor, at=at)
+        for timesheet_id in timesheet_ids
+    ])
+
+
+def review_timesheets(reviewer, ids, decision, rejection_reason=''):
+    """
+    Approve or reject many submitted timesheets at once.
+
+    Ownership and state are checked for all ids with one locking query,
+    then every eligible timesheet is transitioned with a single conditional
+    UPDATE. Returns one outcome dict per distinct requested id, in request order.
+    """
+    new_status = 'approved' if decision == 'approve' else 'rejected'
+    approver_for = get_reviewable_manager_ids(reviewer)
+    # A repeated id is reviewed (and recorded in the history) once
+    ids = list(dict.fromkeys(ids))
+    outcomes = {}
+
+    with transaction.atomic():
+        found = {
+            timesheet_id: (current_status, manager_id)
+            for timesheet_id, current_status, manager_id in Timesheet.objects.select_for_update(of=('self',))
+            .filter(id__in=ids)
+            .values_list('id', 'status', 'employee__reporting_manager_id')
+        }
+
+        eligible = []
+        for timesheet_id in ids:
+            current_status, manager_id = found.get(timesheet_id, (None, None))
+            if manager_id not in approver_for:
+                # Timesheets the reviewer may not act on are reported like missing ones,
+                # so the outcome does not reveal which ids exist
+                outcomes[timesheet_id] = {'id': timesheet_id, 'success': False, 'detail': 'Not found.'}
+            elif current_status != 'submitted':
+                outcomes[timesheet_id] = {
+                    'id': timesheet_id,
+                    'success': False,
+                    'detail': f'Can only {decision} submitted timesheets. Current status: {current_status}',
+                }
+            else:
+                eligible.append(timesheet_id)
+
+        if eligible:
+            now = timezone.now()
+            changes = {'status': new_status, 'updated_at': now}
+            if new_status == 'approved':
+                changes.update(approved_at=now, approved_by=reviewer)
+            else:
+                changes.update(rejection_reason=rejection_reason)
+            Timesheet.objects.filter(id__in=eligible, status='submitted').update(**changes)
+            record_transitions(eligible, 'submitted', new_status, reviewer, now)
+
+    for timesheet_id in eligible:
+        outcomes[timesheet_id] = {'id': timesheet_id, 'success': True, 'status': new_status}
+    return [outcomes[timesheet_id] for timesheet_id in ids]
+
+
+def submit_month(employee, year, month):
+    """
+    Submit all of an employee's draft timesheets for a month.
+
+    Every week is checked with one locking query (status and whether it
+    has rows; daily totals are already capped by constraint), then all
+    valid drafts are flipped to submitted with a single UPDATE. Returns one
+    outcome dict per week of the month, in order; invalid weeks do not
+    block the others.
+    """
+    weeks = get_month_weeks(year, month)
+    outcomes = []
+    eligible = []
+
+    with transaction.atomic():
+        found = {
+            sheet['week_start']: sheet
+            for sheet in Timesheet.objects.select_for_update(of=('self',))
+            .filter(employee=employee, week_start__in=[start for start, _ in weeks])
+            .annotate(has_rows=Exists(TimesheetRow.objects.filter(timesheet=OuterRef('pk'))))
+            .values('id', 'week_start', 'status', 'has_rows')
+        }
+
+        for number, (week_start, week_end) in enumerate(weeks, start=1):
+            outcome = {'week': number, 'week_start': week_start, 'week_end': week_end}
+            sheet = found.get(week_start)
+            if sheet is None:
+                outcome.update(id=None, success=False, detail='No timesheet for this week.')
+            elif sheet['status'] != 'draft':
+                outcome.update(id=sheet['id'], success=False, detail=f"Cannot submit a {sheet['status']} timesheet.")
+            elif not sheet['has_rows']:
+                outcome.update(id=sheet['id'], success=False, detail='Timesheet has no rows.')
+            else:
+                outcome.update(id=sheet['id'], success=True, status='submitted')
+                eligible.append(sheet['id'])
+            outcomes.append(outcome)
+
+        if eligible:
+            now = timezone.now()
+            Timesheet.objects.filter(id__in=eligible, status='draft').update(
+                status='submitted', submitted_at=now, updated_at=now
+            )
+            record_transitions(eligible, 'draft', 'submitted', employee, now)
+
+    return outcomes
+
+
+def get_delegating_manager_ids(delegate, on_date=None):
+    """Ids of managers whose approvals are delegated to `delegate` on a date."""
+    on_date = on_date or timezone.localdate()
+    return set(
+        TimesheetApprovalDelegation.objects.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=on_date),
+            delegate=delegate,
+            start_date__lte=on_date,
+        ).values_list('manager_id', flat=True)
+    )
+
+
+def get_reviewable_manager_ids(reviewer):
+    """Managers whose reports `reviewer` may approve: themselves plus active delegations."""
+    return {reviewer.id} | get_delegating_manager_ids(reviewer)
+
+
+def get_reporting_subtree(manager):
+    """
+    Ids of everyone below `manager` in the reporting hierarchy.
+
+    Walks the tree one level per query and tolerates cycles.
+    """
+    seen = set()
+    frontier = [manager.id]
+    while frontier:
+        frontier = list(
+            Employee.objects.filter(reporting_manager_id__in=frontier)
+            .exclude(id__in=seen | {manager.id})
+            .values_list('id', flat=True)
+        )
+        seen.update(frontier)
+    return seen
+
+
+def get_approval_queue(reviewer, scope='direct'):
+    """
+    Submitted timesheets awaiting `reviewer`, as summary rows.
+
+    scope: 'direct' (own reports), 'subtree' (whole reporting subtree) or
+    'delegated' (reports of managers who delegated to the reviewer).
+    The subtree scope is an overview: skip-level timesheets are listed but
+    only their reporting manager (or a delegate) may review them.
+    Filters on status='submitted' so the pending-work partial index applies.
+    """
+    pending = Timesheet.objects.filter(status='submitted')
+    if scope == 'subtree':
+        pending = pending.filter(employee_id__in=get_reporting_subtree(reviewer))
+    elif scope == 'delegated':
+        pending = pending.filter(employee__reporting_manager_id__in=get_delegating_manager_ids(reviewer))
+    else:
+        pending = pending.filter(employee__reporting_manager=reviewer)
+    return pending
+
+
+def summarize_approval_queue(pending, reviewer):
+    """Summary rows for a pending-timesheet queryset; can_review marks what `reviewer` may approve or reject."""
+    return pending.annotate(
+        employee_code=F('employee__employee_id'),
+        employee_name=full_name('employee'),
+        manager=F('employee__reporting_manager_id'),
+        can_review=Case(
+            When(employee__reporting_manager_id__in=get_reviewable_manager_ids(reviewer), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    ).values(
+        'id', 'employee_id', 'employee_code', 'employee_name', 'manager',
+        'week_start', 'week_end', 'total_hours', 'submitted_at', 'can_review'
+    )
+
+
+def count_pending_by_manager(pending):
+    """Pending timesheet counts per reporting manager in one grouped query."""
+    return list(
+        pending.values(manager_id=F('employee__reporting_manager_id'))
+        .annotate(manager_name=full_name('employee__reporting_manager'), pending=Count('id'))
+        .order_by('-pending', 'manager_id')
+    )
+
+
+FILED_STATUSES = ('submitted', 'approved')
+DEFAULTERS_CACHE_TIMEOUT = 60 * 60
+
+
+def defaulters_cache_key(year, month):
+    """Cache key for one period's defaulter report."""
+    return f'timesheets:defaulters:{year}-{month:02d}'
+
+
+def get_expected_weeks(year, month, today=None):
+    """
+    Weeks of a month that require a timesheet, with their working days.
+
+    Working days are Monday-Friday minus non-optional holidays. Weeks that
+    have not ended yet, or have no working day left, are not expected.
+    """
+    today = today or timezone.localdate()
+    weeks = get_month_weeks(year, month)
+    holidays = get_holidays_between(weeks[0][0], weeks[-1][1])
+
+    expected = []
+    for number, (week_start, week_end) in enumerate(weeks, start=1):
+        if week_end >= today:
+            continue
+        working_days = [
+            day for day in date_range(week_start, week_end)
+            if day.weekday() < 5 and day not in holidays
+        ]
+        if working_days:
+            expected.append((number, week_start, week_end, working_days))
+    return expected
+
+
+def find_defaulters(year, month, today=None):
+    """
+    Active employees with missing or unsubmitted timesheets for a month.
+
+    The expected (employee, week) grid is expressed as per-week annotations
+    on the active employee queryset, so the whole month is evaluated in one
+    query: each week gets the status of the employee's timesheet (NULL when
+    missing) and an exemption flag that is true when the employee had not
+    joined, had left, or was on approved leave for every working day.
+    Only employees defaulting on at least one week are returned.
+    """
+    expected = get_expected_weeks(year, month, today)
+    if not expected:
+        return []
+
+    annotations = {}
+    defaulting = []
+    for number, week_start, week_end, working_days in expected:
+        on_leave = [
+            Exists(Leave.objects.filter(
+                employee=OuterRef('pk'), status='approved', start_date__lte=day, end_date__gte=day
+            ))
+            for day in working_days
+        ]
+        annotations[f'week_{number}_status'] = Subquery(
+            Timesheet.objects.filter(employee=OuterRef('pk'), week_start=week_start).values('status')[:1]
+        )
+        # Case/When rather than a bare boolean so a NULL termination_date reads as False
+        annotations[f'week_{number}_exempt'] = Case(
+            When(
+                Q(date_of_joining__gt=working_days[-1])
+                | Q(termination_date__lt=working_days[0])
+                | reduce(operator.and_, on_leave),
+                then=Value(True)
+            ),
+            default=Value(False),
+            output_field=BooleanField()
+        )
+        defaulting.append(
+            (Q(**{f'week_{number}_status__isnull': True}) | ~Q(**{f'week_{number}_status__in': FILED_STATUSES}))
+            & Q(**{f'week_{number}_exempt': False})
+        )
+
+    rows = Employee.objects.filter(employment_status='active').annotate(
+        employee_name=full_name(''), **annotations
+    ).filter(reduce(operator.or_, defaulting)).values(
+        'id', 'employee_id', 'employee_name', 'department__name', 'reporting_manager_id', *annotations
+    ).order_by('employee_id')
+
+    defaulters = []
+    for row in rows:
+        weeks = [
+            {
+                'week': number,
+                'week_start': week_start,
+                'week_end': week_end,
+                'status': row[f'week_{number}_status'] or 'missing',
+            }
+            for number, week_start, week_end, _ in expected
+            if row[f'week_{number}_status'] not in FILED_STATUSES and not row[f'week_{number}_exempt']
+        ]
+        defaulters.append({
+            'employee': row['id'],
+            'employee_id': row['employee_id'],
+            'employee_name': row['employee_name'],
+            'department': row['department__name'],
+            'reporting_manager': row['reporting_manager_id'],
+            'weeks': weeks,
+        })
+    return defaulters
+
+
+def date_range(start, end):
+    """Every date from start to end, inclusive."""
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def reconcile_timesheets(timesheets, start, end):
+    """
+    Flag hours logged on approved-leave days and holidays in [start, end].
+
+    `timesheets` is an already scoped queryset. Three range queries load
+    the per-day totals of overlapping timesheets, the non-optional holidays
+    and the approved leaves of the employees involved; leaves and holidays
+    are expanded into date sets and joined against the logged days in
+    memory. Returns one conflict dict per (employee, date), ordered by
+    employee and date.
+    """
+    sheets = list(
+        timesheets.filter(week_start__lte=end, week_end__gte=start, total_hours__gt=0)
+        .annotate(employee_code=F('employee__employee_id'), employee_name=full_name('employee'))
+        .values('id', 'employee_id', 'employee_code', 'employee_name', 'status', 'week_start', 'week_end',
+                *DAY_TOTAL_FIELDS)
+        .order_by('employee_code', 'week_start')
+    )
+    if not sheets:
+        return []
+
+    holidays = {holiday.date: holiday.name for holiday in holidays_between(start, end)}
+    leave_days = {}
+    leaves = Leave.objects.filter(
+        employee_id__in={sheet['employee_id'] for sheet in sheets},
+        status='approved',
+        start_date__lte=end,
+        end_date__gte=start,
+    ).values_list('employee_id', 'start_date', 'end_date', 'leave_type')
+    for employee_id, leave_start, leave_end, leave_type in leaves:
+        days = leave_days.setdefault(employee_id, {})
+        for day in date_range(max(leave_start, start), min(leave_end, end)):
+            days[day] = leave_type
+
+    conflicts = []
+    for sheet in sheets:
+        employee_leave = leave_days.get(sheet['employee_id'], {})
+        for day in date_range(max(sheet['week_start'], start), min(sheet['week_end'], end)):
+            minutes = sheet[DAY_TOTAL_FIELDS[day.isoweekday() % 7]]
+            if not minutes:
+                continue
+            if day in employee_leave:
+                kind, reason = 'leave', employee_leave[day]
+            elif day in holidays:
+                kind, reason = 'holiday', holidays[day]
+            else:
+                continue
+            conflicts.append({
+                'employee': sheet['employee_id'],
+                'employee_id': sheet['employee_code'],
+                'employee_name': sheet['employee_name'],
+                'timesheet': sheet['id'],
+                'status': sheet['status'],
+                'date': day,
+                'hours': minutes_to_hours(minutes),
+                'conflict': kind,
+                'reason': reason,
+            })
+    return conflicts
+
+
+def get_defaulters(year, month, refresh=False):
+    """Defaulter report for a period, cached per (year, month)."""
+    key = defaulters_cache_key(year, month)
+    report = None if refresh else cache.get(key)
+    if report is None:
+        report = {
+            'year': year,
+            'month': month,
+            'generated_at': timezone.now(),
+            'defaulters': find_defaulters(year, month),
+        }
+        cache.set(key, report, DEFAULTERS_CACHE_TIMEOUT)
+    return report
+
+
+def get_review_turnaround(start=None, end=None, sla=timedelta(hours=48), manager_ids=None):
+    """
+    Review turnaround per reviewer, from the transition history.
+
+    Each approval or rejection in [start, end) is paired with the latest
+    submission of the same timesheet before it, and the durations are
+    aggregated per reviewer in one grouped query: decisions, approvals,
+    rejections, average and worst turnaround and how many met the SLA.
+    """
+    decisions = TimesheetTransition.objects.filter(to_status__in=['approved', 'rejected'])
+    if start:
+        decisions = decisions.filter(at__gte=start)
+    if end:
+        decisions = decisions.filter(at__lt=end)
+    if manager_ids is not None:
+        decisions = decisions.filter(actor_id__in=manager_ids)
+
+    submitted_at = Subquery(
+        TimesheetTransition.objects.filter(
+            timesheet=OuterRef('timesheet'), to_status='submitted', at__lte=OuterRef('at')
+        ).order_by('-at').values('at')[:1]
+    )
+    rows = decisions.annotate(
+        turnaround=ExpressionWrapper(F('at') - submitted_at, output_field=DurationField())
+    ).values('actor_id').annotate(
+        reviewer_name=full_name('actor'),
+        decided=Count('id'),
+        approved=Count('id', filter=Q(to_status='approved')),
+        rejected=Count('id', filter=Q(to_status='rejected')),
+        avg_turnaround=Avg('turnaround'),
+        max_turnaround=Max('turnaround'),
+        within_sla=Count('id', filter=Q(turnaround__lte=sla)),
+    ).order_by('actor_id')
+
+    return [
+        {
+            'reviewer': row['actor_id'],
+            'reviewer_name': row['reviewer_name'],
+            'decided': row['decided'],
+            'approved': row['approved'],
+            'rejected': row['rejected'],
+            'avg_turnaround_hours': _duration_hours(row['avg_turnaround']),
+            'max_turnaround_hours': _duration_hours(row['max_turnaround']),
+            'within_sla': row['within_sla'],
+        }
+        for row in rows
+    ]
+
+
+def _duration_hours(duration):
+    """Hours in a timedelta, to two places (None stays None)."""
+    return None if duration is None else round(duration.total_seconds() / 3600, 2)
@@ -0,0 +1,748 @@
+"""
+Tests for timesheet APIs.
+"""
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TransactionTestCase
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+from common.exceptions import PreconditionFailedException
+from accounts.models import Role, UserRole
+from employees.models import Employee
+from projects.models import Project
+from .models import Timesheet, TimesheetRow, hours_to_minutes, minutes_to_hours
+from .serializers import HoursField, TimesheetCreateUpdateSerializer
+
+User = get_user_model()
+
+
+class TimesheetTestCase(APITestCase):
+    """Base test case with employees, projects and timesheet helpers."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.client = APIClient()
+        self.manager = self.create_employee('manager@example.com', 'EMP001', roles=['reporting_manager'])
+        self.employee = self.create_employee('employee@example.com', 'EMP002', manager=self.manager)
+        self.project = Project.objects.create(
+            name='Apollo',
+            client='Acme',
+            billing_type='time_and_material',
+            start_date=date(2025, 1, 1),
+        )
+
+    def create_employee(self, email, employee_id, roles=('employee',), manager=None):
+        """Create a user with roles and an employee profile."""
+        user = User.objects.create_user(
+            email=email,
+            password='testpass123',
+            first_name=employee_id.title(),
+            last_name='User'
+        )
+        for role in roles:
+            UserRole.objects.create(user=user, role=Role.objects.get(name=role))
+        return Employee.objects.create(
+            user=user,
+            employee_id=employee_id,
+            employment_type='full_time',
+            date_of_joining=date(2024, 1, 1),
+            reporting_manager=manager,
+        )
+
+    def authenticate(self, employee):
+        """Authenticate as a freshly loaded user, as a real request would be."""
+        self.client.force_authenticate(user=User.objects.get(pk=employee.user_id))
+
+    def create_timesheet(self, employee, week_start, rows=3, status='draft', **fields):
+        """Create a timesheet with `rows` rows of one hour on Monday."""
+        timesheet = Timesheet.objects.create(
+            employee=employee,
+            week_start=week_start,
+            week_end=week_start + timedelta(days=6),
+            status=status,
+            **fields
+        )
+        TimesheetRow.objects.bulk_create([
+            TimesheetRow(timesheet=timesheet, project=self.project, task_description=f'Task {i}', mon_minutes=60)
+            for i in range(rows)
+        ])
+        timesheet.recalculate_daily_totals()
+        timesheet.save()
+        return timesheet
+
+
+class TimesheetQueryCountTests(TimesheetTestCase):
+    """Pin the number of queries issued by list and detail endpoints."""
+
+    def test_list_query_count_is_constant(self):
+        """List view costs the same number of queries for 1 or many timesheets."""
+        self.authenticate(self.manager)
+        self.create_timesheet(self.employee, date(2025, 12, 7), approved_by=self.manager)
+
+        # roles, manager profile, count, page
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/v1/timesheets/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for week in range(1, 6):
+            self.create_timesheet(self.employee, date(2025, 12, 7) + timedelta(weeks=week))
+        self.authenticate(self.manager)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/v1/timesheets/')
+        self.assertEqual(response.data['count'], 6)
+
+    def test_list_uses_annotations(self):
+        """List rows carry names and row counts without nested rows."""
+        self.authenticate(self.employee)
+        self.create_timesheet(self.employee, date(2025, 12, 7), rows=2, approved_by=self.manager)
+
+        response = self.client.get('/api/v1/timesheets/')
+        item = response.data['results'][0]
+        self.assertNotIn('rows', item)
+        self.assertEqual(item['row_count'], 2)
+        self.assertEqual(item['employee_name'], 'Emp002 User')
+        self.assertEqual(item['approved_by_name'], 'Emp001 User')
+        self.assertEqual(item['daily_totals']['Monday'], 2)
+
+    def test_detail_query_count_is_constant(self):
+        """Detail view loads rows and their projects with a fixed number of queries."""
+        self.authenticate(self.employee)
+        timesheet = self.create_timesheet(self.employee, date(2025, 12, 7), rows=8, approved_by=self.manager)
+
+        # roles, employee profile, timesheet, rows with projects
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/v1/timesheets/{timesheet.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['rows']), 8)
+        self.assertEqual(response.data['rows'][0]['project_name'], 'Apollo')
+
+
+class TimesheetMonthGridTests(TimesheetTestCase):
+    """Tests for the monthly grid endpoint."""
+
+    def test_month_grid_includes_placeholder_weeks(self):
+        """Every week of the month is present; unfiled weeks are empty."""
+        self.authenticate(self.employee)
+        self.create_timesheet(self.employee, date(2025, 12, 7), rows=2)
+        self.create_timesheet(self.employee, date(2025, 11, 23), rows=1)
+
+        # employee profile, timesheets, rows
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/timesheets/month/?year=2025&month=12')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        weeks = response.data['weeks']
+        self.assertEqual(len(weeks), 5)
+        self.assertIsNone(weeks[0]['timesheet'])
+        self.assertEqual(weeks[0]['rows'], [])
+        self.assertEqual(weeks[1]['week_start'], date(2025, 12, 7))
+        self.assertEqual(len(weeks[1]['rows']), 2)
+        self.assertEqual(weeks[1]['rows'][0]['hours'], [0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(weeks[1]['daily_totals'][1], 2.0)
+        self.assertEqual(response.data['projects'][self.project.id]['name'], 'Apollo')
+
+    def test_month_grid_rejects_invalid_month(self):
+        """Out-of-range months, and years whose last week would overflow, are rejected."""
+        self.authenticate(self.employee)
+        response = self.client.get('/api/v1/timesheets/month/?year=2025&month=13')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/v1/timesheets/month/?year=9999&month=12')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/v1/timesheets/submit_month/', {'year': 9999, 'month': 12}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/v1/timesheets/month/?year=9998&month=12')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TimesheetBulkReviewTests(TimesheetTestCase):
+    """Tests for batch approval/rejection."""
+
+    def test_bulk_approve_reports_per_id_outcomes(self):
+        """Eligible timesheets are approved; others are reported individually."""
+        outsider = self.create_employee('outsider@example.com', 'EMP003')
+        submitted = self.create_timesheet(self.employee, date(2025, 12, 7), status='submitted')
+        draft = self.create_timesheet(self.employee, date(2025, 12, 14))
+        foreign = self.create_timesheet(outsider, date(2025, 12, 7), status='submitted')
+        self.authenticate(self.manager)
+
+        response = self.client.post('/api/v1/timesheets/bulk_review/', {
+            'ids': [submitted.id, draft.id, foreign.id, 9999],
+            'action': 'approve',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([r['success'] for r in response.data['results']], [True, False, False, False])
+        # Another manager's timesheet is indistinguishable from a missing one
+        self.assertEqual([r['detail'] for r in response.data['results'][2:]], ['Not found.', 'Not found.'])
+
+        submitted.refresh_from_db()
+        self.assertEqual(submitted.status, 'approved')
+        self.assertEqual(submitted.approved_by, self.manager)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, 'submitted')
+
+    def test_bulk_review_ignores_repeated_ids(self):
+        """A repeated id is approved once and gets a single history entry."""
+        from .models import TimesheetTransition
+        submitted = self.create_timesheet(self.employee, date(2025, 12, 7), status='submitted')
+        self.authenticate(self.manager)
+        response = self.client.post('/api/v1/timesheets/bulk_review/', {
+            'ids': [submitted.id, submitted.id], 'action': 'approve',
+        }, format='json')
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(TimesheetTransition.objects.filter(timesheet=submitted).count(), 1)
+
+    def test_bulk_reject_requires_reason(self):
+        """Rejecting a batch needs a rejection reason."""
+        submitted = self.create_timesheet(self.employee, date(2025, 12, 7), status='submitted')
+        self.authenticate(self.manager)
+        response = self.client.post('/api/v1/timesheets/bulk_review/', {
+            'ids': [submitted.id], 'action': 'reject',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TimesheetApprovalQueueTests(TimesheetTestCase):
+    """Tests for the approval queue."""
+
+    def setUp(self):
+        super().setUp()
+        self.director = self.create_employee('director@example.com', 'EMP000', roles=['reporting_manager'])
+        self.manager.reporting_manager = self.director
+        self.manager.save()
+
+    def test_subtree_scope_covers_skip_levels(self):
+        """The subtree queue includes reports of reports, read-only; direct does not."""
+        employee_sheet = self.create_timesheet(self.employee, date(2025, 12, 7), status='submitted')
+        manager_sheet = self.create_timesheet(self.manager, date(2025, 12, 7), status='submitted')
+        self.create_timesheet(self.employee, date(2025, 12, 14), status='draft')
+        self.authenticate(self.director)
+
+        response = self.client.get('/api/v1/timesheets/approval_queue/')
+        self.assertEqual(len(response.data['results']), 1)
+
+        response = self.client.get('/api/v1/timesheets/approval_queue/?scope=subtree')
+        self.assertEqual(len(response.data['results']), 2)
+        reviewable = {row['id']: row['can_review'] for row in response.data['results']}
+        self.assertEqual(reviewable, {manager_sheet.id: True, employee_sheet.id: False})
+        pending = {row['manager_id']: row['pending'] for row in response.data['pending_by_manager']}
+        self.assertEqual(pending, {self.director.id: 1, self.manager.id: 1})
+
+    def test_delegated_queue_and_approval(self):
+        """A delegate sees and can approve the delegating manager's queue."""
+        from .models import TimesheetApprovalDelegation
+        delegate = self.create_employee('delegate@example.com', 'EMP004')
+        TimesheetApprovalDelegation.objects.create(
+            manager=self.manager, delegate=delegate, start_date=date(2020, 1, 1)
+        )
+        timesheet = self.create_timesheet(self.employee, date(2025, 12, 7), status='submitted')
+        self.authenticate(delegate)
+
+        response = self.client.get('/api/v1/timesheets/approval_queue/?scope=delegated')
+        self.assertEqual([row['id'] for row in response.data['results']], [timesheet.id])
+
+        response = self.client.post('/api/v1/timesheets/bulk_review/', {
+            'ids': [timesheet.id], 'action': 'approve',
+        }, format='json')
+        self.assertEqual(response.data['updated'], 1)
+
+    def test_keyset_pagination(self):
+        """Pages follow (week_start, id) order via an opaque cursor."""
+        for week in range(5):
+            self.create_timesheet(self.employee, date(2025, 10, 5) + timedelta(weeks=week), status='submitted')
+        self.authenticate(self.manager)
+
+        response = self.client.get('/api/v1/timesheets/approval_queue/?page_size=2')
+        first = [row['week_start'] for row in response.data['results']]
+        response = self.client.get(response.data['next'])
+        second = [row['week_start'] for row in response.data['results']]
+        self.assertEqual(first + second, [date(2025, 10, 5) + timedelta(weeks=week) for week in range(4)])
+
+
+class TimesheetDefaulterTests(TimesheetTestCase):
+    """Tests for defaulter detection."""
+
+    def test_defaulters_skip_filed_leave_and_holiday_weeks(self):
+        """Missing and draft weeks are reported; filed, leave and holiday weeks are not."""
+        from leaves.models import Leave
+        from settings.models import Holiday
+        from .services import find_defaulters
+        self.create_timesheet(self.employee, date(2025, 12, 7), status='submitted')
+        self.create_timesheet(self.employee, date(2025, 12, 14), status='draft')
+        Leave.objects.create(
+            employee=self.employee, leave_type='paid_leave', start_date=date(2025, 12, 22),
+            end_date=date(2025, 12, 24), number_of_days=3, status='approved'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(name='Christmas', date=date(2025, 12, 25))
+            Holiday.objects.create(name='Boxing Day', date=date(2025, 12, 26))
+            for day in range(1, 6):
+                Holiday.objects.create(name=f'Shutdown {day}', date=date(2025, 12, day))
+
+        # holidays, employees with per-week annotations
+        with self.assertNumQueries(2):
+            defaulters = find_defaulters(2025, 12, today=date(2026, 1, 15))
+
+        weeks = {row['employee_id']: [(week['week'], week['status']) for week in row['weeks']] for row in defaulters}
+        self.assertEqual(weeks['EMP002'], [(3, 'draft'), (5, 'missing')])
+        self.assertEqual(weeks['EMP001'], [(2, 'missing'), (3, 'missing'), (4, 'missing'), (5, 'missing')])
+
+    def test_defaulters_endpoint_requires_hr(self):
+        """Only HR and admins can read the report."""
+        self.authenticate(self.employee)
+        response = self.client.get('/api/v1/timesheets/defaulters/?year=2025&month=12')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.authenticate(self.create_employee('hr@example.com', 'EMP005', roles=['hr_user']))
+        response = self.client.get('/api/v1/timesheets/defaulters/?year=2025&month=12')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('EMP002', [row['employee_id'] for row in response.data['defaulters']])
+
+
+class TimesheetAutosaveTests(TimesheetTestCase):
+    """Tests for single-cell autosave with optimistic concurrency."""
+
+    def setUp(self):
+        super().setUp()
+        self.timesheet = self.create_timesheet(self.employee, date(2025, 12, 7), rows=2)
+        self.row = self.timesheet.rows.first()
+        self.url = f'/api/v1/timesheets/{self.timesheet.id}/'
+        self.authenticate(self.employee)
+
+    def test_cell_patch_updates_totals_and_version(self):
+        """A cell edit adjusts the stored day total and bumps the ETag."""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(
+            f'{self.url}cells/', {'row': self.row.id, 'day': 'mon', 'hours': '3.5'},
+            format='json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['daily_totals']['Monday'], 4.5)
+        self.assertNotEqual(response['ETag'], etag)
+
+        self.timesheet.refresh_from_db()
+        self.assertEqual(self.timesheet.mon_total_minutes, 270)
+        self.assertEqual(self.timesheet.total_hours, 4.5)
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.mon_minutes, 210)
+
+    def test_stale_if_match_is_rejected(self):
+        """An edit against an old version fails with 412 and changes nothing."""
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(f'{self.url}cells/', {'row': self.row.id, 'day': 'tue', 'hours': 1}, format='json')
+        response = self.client.patch(
+            f'{self.url}cells/', {'row': self.row.id, 'day': 'tue', 'hours': 2},
+            format='json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.tue_minutes, 60)
+
+    def test_cell_patch_enforces_daily_cap(self):
+        """A cell that would push the day past 8 hours is rejected."""
+        response = self.client.patch(
+            f'{self.url}cells/', {'row': self.row.id, 'day': 'mon', 'hours': 7.5}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['detail'], 'Monday would have 8.50 hours. Maximum allowed is 8 hours per day.'
+        )
+        self.timesheet.refresh_from_db()
+        self.assertEqual(self.timesheet.mon_total_minutes, 120)
+
+    def test_add_and_remove_row(self):
+        """Rows can be added and removed one at a time."""
+        response = self.client.post(f'{self.url}rows/', {
+            'project': self.project.id, 'task_description': 'Review', 'wed_hours': 2,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['daily_totals']['Wednesday'], 2)
+
+        response = self.client.delete(f"{self.url}rows/{response.data['row']['id']}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['daily_totals']['Wednesday'], 0)
+        self.assertEqual(self.timesheet.rows.count(), 2)
+
+    def test_full_update_reloads_the_locked_timesheet(self):
+        """An update works from the current timesheet, not the snapshot the request loaded."""
+        stale = Timesheet.objects.with_rows().get(pk=self.timesheet.pk)
+        response = self.client.patch(f'{self.url}cells/', {'row': self.row.id, 'day': 'tue', 'hours': 2}, format='json')
+
+        serializer = TimesheetCreateUpdateSerializer(stale, data={}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(expected_version=response.data['version'])
+
+        self.timesheet.refresh_from_db()
+        self.assertEqual(self.timesheet.tue_total_minutes, 120)
+        self.assertEqual(self.timesheet.version, response.data['version'] + 1)
+
+        with self.assertRaises(PreconditionFailedException):
+            serializer.save(expected_version=response.data['version'])
+
+
+class TimesheetRowSyncTests(TimesheetTestCase):
+    """Tests for in-place row updates on a full timesheet edit."""
+
+    def setUp(self):
+        super().setUp()
+        self.timesheet = self.create_timesheet(self.employee, date(2025, 12, 7), rows=2)
+        self.first, self.second = self.timesheet.rows.order_by('task_description')
+        self.url = f'/api/v1/timesheets/{self.timesheet.id}/'
+        self.authenticate(self.employee)
+
+    def save_rows(self, *rows):
+        return self.client.patch(self.url, {
+            'rows': [{'project': self.project.id, **row} for row in rows],
+        }, format='json')
+
+    def test_rows_keep_their_ids(self):
+        """Rows matched by id or by key are updated in place; an explicit id wins over a key match."""
+        response = self.save_rows(
+            {'task_description': 'Task 0', 'mon_hours': 2},
+            {'id': self.first.id, 'task_description': 'Design', 'mon_hours': 1},
+            {'task_description': 'Task 1', 'tue_hours': 1},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {row.task_description: row.id for row in self.timesheet.rows.all()}
+        self.assertEqual(rows['Design'], self.first.id)
+        self.assertEqual(rows['Task 1'], self.second.id)
+        self.assertNotIn(rows['Task 0'], [self.first.id, self.second.id])
+
+    def test_swapped_keys_do_not_collide(self):
+        """Two rows can trade task descriptions in one edit."""
+        response = self.save_rows(
+            {'id': self.first.id, 'task_description': 'Task 1', 'mon_hours': 3},
+            {'id': self.second.id, 'task_description': 'Task 0', 'mon_hours': 1},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(self.timesheet.rows.values_list('id', 'task_description', 'mon_minutes')),
+            sorted([(self.first.id, 'Task 1', 180), (self.second.id, 'Task 0', 60)])
+        )
+
+
+class TimesheetCopyAndTemplateTests(TimesheetTestCase):
+    """Tests for copying weeks and applying templates."""
+
+    def test_copy_from_previous_week(self):
+        """Rows of the latest earlier week are copied; hours only on request."""
+        self.create_timesheet(self.employee, date(2025, 12, 7), rows=2)
+        self.authenticate(self.employee)
+
+        response = self.client.post('/api/v1/timesheets/copy_from/', {'week_start': '2025-12-14'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['rows']), 2)
+        self.assertEqual(float(response.data['total_hours']), 0)
+
+        response = self.client.post('/api/v1/timesheets/copy_from/', {
+            'week_start': '2025-12-21', 'source_week_start': '2025-12-07', 'include_hours': True,
+        }, format='json')
+        self.assertEqual(response.data['daily_totals']['Monday'], 2)
+
+    def test_copy_into_soft_deleted_week_is_a_client_error(self):
+        """A deleted timesheet still occupies its week; copying into it is a 400, not a 500."""
+        self.create_timesheet(self.employee, date(2025, 12, 7), rows=2)
+        self.create_timesheet(self.employee, date(2025, 12, 14), rows=1).soft_delete()
+        self.authenticate(self.employee)
+
+        response = self.client.post('/api/v1/timesheets/copy_from/', {'week_start': '2025-12-14'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], 'A timesheet for the week starting 2025-12-14 already exists.')
+
+    def test_copy_from_rejects_unknown_week(self):
+        """The target must be a week from the month calendar."""
+        self.authenticate(self.employee)
+        response = self.client.post('/api/v1/timesheets/copy_from/', {'week_start': '2025-12-09'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_apply_template_to_month(self):
+        """Templates fill every week, skip existing rows and clip partial weeks."""
+        self.authenticate(self.employee)
+        response = self.client.post('/api/v1/timesheets/templates/', {
+            'name': 'Standard week',
+            'rows': [{'project': self.project.id, 'task_description': 'Task 0', 'sun_hours': 1, 'mon_hours': 4}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.create_timesheet(self.employee, date(2025, 12, 7), rows=1)
+
+        response = self.client.post(
+            f"/api/v1/timesheets/templates/{response.data['id']}/apply/", {'year': 2025, 'month': 12}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([week['rows_added'] for week in response.data], [1, 0, 1, 1, 1])
+        # Week 1 (Mon 1st - Sat 6th) has no Sunday
+        self.assertEqual(float(response.data[0]['total_hours']), 4)
+        self.assertEqual(float(response.data[2]['total_hours']), 5)
+        self.assertEqual(Timesheet.objects.filter(employee=self.employee).count(), 5)
+
+
+class TimesheetIdempotencyTests(TimesheetTestCase):
+    """Tests for Idempotency-Key handling on create."""
+
+    def setUp(self):
+        super().setUp()
+        self.payload = {
+            'week_start': '2025-12-07',
+            'week_end': '2025-12-13',
+            'rows': [{'project': self.project.id, 'task_description': 'Build', 'mon_hours': 2}],
+        }
+        self.authenticate(self.employee)
+
+    def test_replay_returns_stored_response(self):
+        """A retried create with the same key replays the first response."""
+        first = self.client.post('/api/v1/timesheets/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        # savepoint, key lookup, release: the serializer never runs
+        with self.assertNumQueries(3):
+            replay = self.client.post('/api/v1/timesheets/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.data['id'], first.data['id'])
+        self.assertEqual(Timesheet.objects.filter(employee=self.employee).count(), 1)
+
+    def test_key_reuse_with_different_payload(self):
+        """The same key cannot be used for a different request."""
+        self.client.post('/api/v1/timesheets/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.payload['week_start'] = '2025-12-14'
+        response = self.client.post('/api/v1/timesheets/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_duplicate_week_is_a_client_error(self):
+        """A second timesheet for the same week is rejected, not a server error."""
+        self.client.post('/api/v1/timesheets/', self.payload, format='json')
+        response = self.client.post('/api/v1/timesheets/', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Timesheet.objects.filter(employee=self.employee).count(), 1)
+
+
+class TimesheetDailyCapTests(TimesheetTestCase):
+    """Tests for the database-enforced daily cap."""
+
+    def test_constraint_rejects_over_cap_totals(self):
+        """Per-day totals above 8 hours cannot be stored, whatever the writer."""
+        from django.db import IntegrityError, transaction
+        timesheet = self.create_timesheet(self.employee, date(2025, 12, 7))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Timesheet.objects.filter(pk=timesheet.pk).update(mon_total_minutes=481)
+
+    def test_over_cap_writes_are_client_errors(self):
+        """Create and update map the constraint to a 400 and write nothing."""
+        self.authenticate(self.employee)
+        payload = {
+            'week_start': '2025-12-07',
+            'week_end': '2025-12-13',
+            'rows': [
+                {'project': self.project.id, 'task_description': 'Build', 'mon_hours': 5},
+                {'project': self.project.id, 'task_description': 'Test', 'mon_hours': 4},
+            ],
+        }
+        response = self.client.post('/api/v1/timesheets/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], 'Monday has 9.00 hours. Maximum allowed is 8 hours per day.')
+        self.assertFalse(Timesheet.objects.exists())
+
+        timesheet = self.create_timesheet(self.employee, date(2025, 12, 7), rows=1)
+        response = self.client.put(f'/api/v1/timesheets/{timesheet.id}/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(timesheet.rows.count(), 1)
+
+
+class TimesheetSubmitMonthTests(TimesheetTestCase):
+    """Tests for whole-month submission."""
+
+    def test_submit_month_reports_per_week(self):
+        """Valid drafts are submitted together; other weeks carry their error."""
+        draft = self.create_timesheet(self.employee, date(2025, 12, 7))
+        self.create_timesheet(self.employee, date(2025, 12, 14), status='approved')
+        empty = self.create_timesheet(self.employee, date(2025, 12, 21), rows=0)
+        self.authenticate(self.employee)
+
+        response = self.client.post('/api/v1/timesheets/submit_month/', {'year': 2025, 'month': 12}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['submitted'], 1)
+        details = [result.get('detail') for result in response.data['results']]
+        self.assertEqual(details, [
+            'No timesheet for this week.', None, 'Cannot submit a approved timesheet.',
+            'Timesheet has no rows.', 'No timesheet for this week.',
+        ])
+
+        draft.refresh_from_db()
+        self.assertEqual(draft.status, 'submitted')
+        self.assertIsNotNone(draft.submitted_at)
+        empty.refresh_from_db()
+        self.assertEqual(empty.status, 'draft')
+
+
+class TimesheetTransitionTests(TimesheetTestCase):
+    """Tests for the status history and turnaround report."""
+
+    def test_transitions_and_turnaround(self):
+        """Batch status changes are recorded and aggregate per reviewer."""
+        from .models import TimesheetTransition
+        first = self.create_timesheet(self.employee, date(2025, 12, 7))
+        second = self.create_timesheet(self.employee, date(2025, 12, 14))
+        self.authenticate(self.employee)
+        self.client.post('/api/v1/timesheets/submit_month/', {'year': 2025, 'month': 12}, format='json')
+        TimesheetTransition.objects.filter(to_status='submitted').update(
+            at=datetime(2025, 12, 20, 9, tzinfo=dt_timezone.utc)
+        )
+
+        self.authenticate(self.manager)
+        self.client.post('/api/v1/timesheets/bulk_review/', {'ids': [first.id], 'action': 'approve'}, format='json')
+        self.client.post('/api/v1/timesheets/bulk_review/', {
+            'ids': [second.id], 'action': 'reject', 'rejection_reason': 'Missing tasks',
+        }, format='json')
+        TimesheetTransition.objects.filter(timesheet=first, to_status='approved').update(
+            at=datetime(2025, 12, 21, 9, tzinfo=dt_timezone.utc)
+        )
+        TimesheetTransition.objects.filter(timesheet=second, to_status='rejected').update(
+            at=datetime(2025, 12, 23, 9, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual(
+            list(first.transitions.values_list('from_status', 'to_status')),
+            [('draft', 'submitted'), ('submitted', 'approved')]
+        )
+
+        response = self.client.get('/api/v1/timesheets/turnaround/?from=2025-12-01&to=2025-12-31')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [reviewer] = response.data['reviewers']
+        self.assertEqual(reviewer['reviewer'], self.manager.id)
+        self.assertEqual((reviewer['approved'], reviewer['rejected']), (1, 1))
+        self.assertEqual(reviewer['avg_turnaround_hours'], 48)
+        self.assertEqual(reviewer['max_turnaround_hours'], 72)
+        self.assertEqual(reviewer['within_sla'], 1)
+
+        for sla_hours in ['inf', 'nan', '0', '-1', '1e300']:
+            response = self.client.get('/api/v1/timesheets/turnaround/', {'sla_hours': sla_hours})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, sla_hours)
+
+    def test_transitions_are_append_only(self):
+        """Saved transitions cannot be edited through the model."""
+        from .models import TimesheetTransition
+        transition = TimesheetTransition.objects.create(
+            timesheet=self.create_timesheet(self.employee, date(2025, 12, 7)),
+            from_status='draft', to_status='submitted', actor=self.employee,
+            at=datetime(2025, 12, 20, tzinfo=dt_timezone.utc)
+        )
+        with self.assertRaises(ValueError):
+            transition.save()
+
+
+class TimesheetReconciliationTests(TimesheetTestCase):
+    """Tests for the leave/holiday reconciliation."""
+
+    def test_hours_on_leave_and_holidays_are_flagged(self):
+        """Logged days that fall on approved leave or a holiday are reported."""
+        from leaves.models import Leave
+        from settings.models import Holiday
+        timesheet = self.create_timesheet(self.employee, date(2025, 12, 21), rows=1)
+        TimesheetRow.objects.filter(timesheet=timesheet).update(wed_minutes=120, thu_minutes=60)
+        timesheet.recalculate_daily_totals()
+        timesheet.save()
+        Leave.objects.create(
+            employee=self.employee, leave_type='sick_leave', start_date=date(2025, 12, 22),
+            end_date=date(2025, 12, 22), number_of_days=1, status='approved'
+        )
+        Leave.objects.create(
+            employee=self.employee, leave_type='casual_leave', start_date=date(2025, 12, 24),
+            end_date=date(2025, 12, 24), number_of_days=1, status='rejected'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(name='Christmas', date=date(2025, 12, 25))
+        self.authenticate(self.employee)
+
+        response = self.client.get('/api/v1/timesheets/reconciliation/?from=2025-12-01&to=2025-12-31')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(c['date'], c['conflict'], c['reason']) for c in response.data['conflicts']],
+            [(date(2025, 12, 22), 'leave', 'sick_leave'), (date(2025, 12, 25), 'holiday', 'Christmas')]
+        )
+
+
+class MinutesConversionTests(SimpleTestCase):
+    """Tests for decimal hours on the wire over integer minutes in storage."""
+
+    def test_hours_and_minutes_convert_with_half_up_rounding(self):
+        """Hours become whole minutes and minutes become hours to two places."""
+        cases = [(Decimal('7.5'), 450), (Decimal('0.33'), 20), ('1.25', 75), (0.1, 6), (Decimal('0.005'), 0), (None, 0)]
+        for hours, minutes in cases:
+            self.assertEqual(hours_to_minutes(hours), minutes, hours)
+        self.assertEqual(minutes_to_hours(20), Decimal('0.33'))
+        self.assertEqual(minutes_to_hours(50), Decimal('0.83'))
+        self.assertEqual(minutes_to_hours(None), Decimal('0.00'))
+
+    def test_hours_field_round_trips(self):
+        """HoursField reads hours into minutes and writes minutes back as hours."""
+        field = HoursField()
+        self.assertEqual(field.to_internal_value('7.50'), 450)
+        self.assertEqual(field.to_representation(450), '7.50')
+        for hours in ('0.25', '1.00', '2.75', '8.00'):
+            self.assertEqual(field.to_representation(field.to_internal_value(hours)), hours)
+
+
+class TimesheetMinutesMigrationTests(TransactionTestCase):
+    """Tests for the daily totals backfill (0003) and the hours/minutes conversion (0004)."""
+    serialized_rollback = True
+    before = [('timesheets', '0002_timesheetrow_delete_timesheetentry_and_more')]
+    totals = [('timesheets', '0003_timesheet_daily_totals')]
+    minutes = [('timesheets', '0004_timesheet_integer_minutes')]
+
+    def migrate(self, targets):
+        """Migrate to `targets` and return the historical app registry."""
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_hours_convert_to_minutes_and_back(self):
+        """Existing hours are totalled, converted to minutes and restored on the way back."""
+        user = User.objects.create_user(email='migrate@example.com', password='testpass123')
+        employee = Employee.objects.create(
+            user=user, employee_id='EMP900', employment_type='full_time', date_of_joining=date(2024, 1, 1)
+        )
+        project = Project.objects.create(
+            name='Apollo', client='Acme', billing_type='time_and_material', start_date=date(2025, 1, 1)
+        )
+
+        apps = self.migrate(self.before)
+        timesheet = apps.get_model('timesheets', 'Timesheet').objects.create(
+            employee_id=employee.pk, week_start=date(2025, 12, 7), week_end=date(2025, 12, 13)
+        )
+        row = apps.get_model('timesheets', 'TimesheetRow')
+        row.objects.create(
+            timesheet=timesheet, project_id=project.pk, task_description='Build',
+            mon_hours=Decimal('7.50'), tue_hours=Decimal('0.33')
+        )
+        row.objects.create(
+            timesheet=timesheet, project_id=project.pk, task_description='Review', mon_hours=Decimal('0.25')
+        )
+
+        apps = self.migrate(self.totals)
+        backfilled = apps.get_model('timesheets', 'Timesheet').objects.get()
+        self.assertEqual((backfilled.mon_total, backfilled.tue_total), (Decimal('7.75'), Decimal('0.33')))
+
+        apps = self.migrate(self.minutes)
+        converted = apps.get_model('timesheets', 'Timesheet').objects.get()
+        self.assertEqual((converted.mon_total_minutes, converted.tue_total_minutes), (465, 20))
+        rows = apps.get_model('timesheets', 'TimesheetRow').objects.order_by('task_description')
+        self.assertEqual(
+            [(r.mon_minutes, r.tue_minutes, r.wed_minutes) for r in rows], [(450, 20, 0), (15, 0, 0)]
+        )
+
+        apps = self.migrate(self.totals)
+        restored = apps.get_model('timesheets', 'Timesheet').objects.get()
+        self.assertEqual((restored.mon_total, restored.tue_total), (Decimal('7.75'), Decimal('0.33')))
+        rows = apps.get_model('timesheets', 'TimesheetRow').objects.order_by('task_description')
+        self.assertEqual(
+            [(r.mon_hours, r.tue_hours) for r in rows], [(Decimal('7.50'), Decimal('0.33')), (Decimal('0.25'), 0)]
+        )
@@ -3,9 +3,11 @@ Timesheet URLs.
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TimesheetViewSet
+from .views import TimesheetViewSet, TimesheetTemplateViewSet
 
 router = DefaultRouter()
+# Registered before the timesheet routes so 'templates' is not read as a timesheet id
+router.register('templates', TimesheetTemplateViewSet, basename='timesheet-template')
 router.register('', TimesheetViewSet, basename='timesheet')
 
 urlpatterns = [
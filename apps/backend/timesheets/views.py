@@ -1,24 +1,70 @@
 """
 Timesheet views.
 """
+from datetime import date, datetime, time, timedelta
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
+from rest_framework.exceptions import PermissionDenied
 from django.utils import timezone
-from django.core.exceptions import ValidationError
-from .models import Timesheet
+from django.db import transaction
+from django.db.models import Prefetch
+from .models import MAX_YEAR, Timesheet, TimesheetTemplate, TimesheetTemplateRow, get_month_weeks
 from .serializers import (
     TimesheetSerializer,
+    TimesheetListSerializer,
     TimesheetCreateUpdateSerializer,
-    TimesheetApprovalSerializer
+    TimesheetApprovalSerializer,
+    TimesheetBulkApprovalSerializer,
+    TimesheetCellSerializer,
+    TimesheetRowAddSerializer,
+    TimesheetRowSerializer,
+    TimesheetCopySerializer,
+    TimesheetTemplateSerializer,
+    TimesheetTemplateApplySerializer,
+    TimesheetMonthSerializer
 )
-from common.permissions import IsReportingManager
+from .services import (
+    get_month_grid,
+    review_timesheets,
+    get_approval_queue,
+    summarize_approval_queue,
+    count_pending_by_manager,
+    get_defaulters,
+    check_version,
+    update_timesheet_cell,
+    add_timesheet_row,
+    remove_timesheet_row,
+    get_week_bounds,
+    copy_timesheet_week,
+    apply_timesheet_template,
+    refresh_rows,
+    submit_month,
+    record_transitions,
+    get_review_turnaround,
+    reconcile_timesheets,
+)
+from common.exceptions import PreconditionFailedException
+from common.permissions import IsReportingManager, IsHROrSystemAdmin
+from common.utils import idempotent
+
+# Upper bound for the turnaround SLA (one year); also keeps timedelta in range
+MAX_SLA_HOURS = 24 * 365
+
+
+class ApprovalQueuePagination(CursorPagination):
+    """Keyset pagination for approval queues, oldest week first."""
+    ordering = ('week_start', 'id')
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
 
 
 class TimesheetViewSet(viewsets.ModelViewSet):
     """Timesheet viewset."""
-    queryset = Timesheet.objects.all().select_related('employee', 'approved_by').prefetch_related('rows')
+    queryset = Timesheet.objects.all()
     serializer_class = TimesheetSerializer
     permission_classes = [IsAuthenticated]
     search_fields = ['employee__employee_id']
@@ -27,24 +73,29 @@ class TimesheetViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Filter timesheets based on user role."""
+        queryset = self.scope_queryset(Timesheet.objects.all())
+        if self.action == 'list':
+            return queryset.for_list()
+        if self.action in ['cells', 'add_row', 'remove_row']:
+            # Autosave touches single rows; no need to load them all
+            return queryset
+        return queryset.with_rows()
+
+    def scope_queryset(self, queryset):
+        """Restrict a timesheet queryset to what the current user may see."""
         user = self.request.user
-        
-        # Admins see all timesheets
-        if user.has_role('system_admin') or user.has_role('hr_user'):
-            return Timesheet.objects.all().select_related('employee', 'approved_by').prefetch_related('rows')
-        
-        # Reporting managers see their subordinates' timesheets
-        if user.has_role('reporting_manager'):
-            employee = user.employee
-            subordinates = Employee.objects.filter(reporting_manager=employee)
-            return Timesheet.objects.filter(
-                employee__in=subordinates
-            ).select_related('employee', 'approved_by').prefetch_related('rows')
-        
-        # Employees see only their own timesheets
-        return Timesheet.objects.filter(
-            employee=user.employee
-        ).select_related('employee', 'approved_by').prefetch_related('rows')
+        roles = set(user.get_role_names())
+
+        if roles & {'system_admin', 'hr_user'}:
+            # Admins see all timesheets
+            pass
+        elif 'reporting_manager' in roles:
+            # Reporting managers see their subordinates' timesheets
+            queryset = queryset.filter(employee__reporting_manager=user.employee)
+        else:
+            # Employees see only their own timesheets
+            queryset = queryset.filter(employee=user.employee)
+        return queryset
 
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -52,10 +103,55 @@ class TimesheetViewSet(viewsets.ModelViewSet):
             return TimesheetCreateUpdateSerializer
         elif self.action in ['approve', 'reject']:
             return TimesheetApprovalSerializer
+        elif self.action == 'bulk_review':
+            return TimesheetBulkApprovalSerializer
+        elif self.action == 'cells':
+            return TimesheetCellSerializer
+        elif self.action == 'add_row':
+            return TimesheetRowAddSerializer
+        elif self.action == 'copy_from':
+            return TimesheetCopySerializer
+        elif self.action == 'submit_month':
+            return TimesheetMonthSerializer
+        elif self.action == 'list':
+            return TimesheetListSerializer
         return TimesheetSerializer
 
+    def get_expected_version(self):
+        """Version the client last saw, from the If-Match header (None if absent)."""
+        header = self.request.headers.get('If-Match')
+        if not header or header.strip() == '*':
+            return None
+        try:
+            return int(header.strip().removeprefix('W/').strip('"'))
+        except ValueError:
+            raise PreconditionFailedException('Malformed If-Match header.')
+
+    def get_own_timesheet(self):
+        """Get the timesheet for an autosave action, enforcing ownership."""
+        timesheet = self.get_object()
+        if timesheet.employee_id != self.request.user.employee.id:
+            raise PermissionDenied('You can only edit your own timesheets.')
+        return timesheet
+
+    def autosave_response(self, timesheet, **data):
+        """Response for autosave actions: new totals and version, plus the ETag."""
+        return Response({
+            **data,
+            'daily_totals': timesheet.get_daily_totals(),
+            'total_hours': timesheet.total_hours,
+            'version': timesheet.version,
+        }, headers={'ETag': timesheet.etag})
+
+    def retrieve(self, request, *args, **kwargs):
+        """Get a timesheet; the ETag carries its version for If-Match."""
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, headers={'ETag': instance.etag})
+
+    @idempotent
     def create(self, request, *args, **kwargs):
-        """Create a new timesheet."""
+        """Create a new timesheet. Retries are safe with an Idempotency-Key header."""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
@@ -86,28 +182,119 @@ class TimesheetViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        check_version(instance, self.get_expected_version())
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         
-        # Validate daily hours
-        try:
-            instance.validate_daily_hours()
-        except ValidationError as e:
-            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        
         self.perform_update(serializer)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': instance.etag})
+
+    def perform_update(self, serializer):
+        """Save an update; the serializer re-checks If-Match once the timesheet is locked."""
+        serializer.save(expected_version=self.get_expected_version())
+
+    @action(detail=True, methods=['patch'])
+    def cells(self, request, pk=None):
+        """
+        Autosave a single cell.
+
+        Body: {"row": <row id>, "day": "sun".."sat", "hours": 2.5}. Send the
+        ETag from the last read or write as If-Match to reject stale edits
+        with 412. Returns the new daily totals and version.
+        """
+        timesheet = self.get_own_timesheet()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        row = update_timesheet_cell(
+            timesheet,
+            serializer.validated_data['row'],
+            serializer.validated_data['day'],
+            serializer.validated_data['hours'],
+            self.get_expected_version()
+        )
+        return self.autosave_response(timesheet, row=TimesheetRowSerializer(row).data)
+
+    @action(detail=True, methods=['post'], url_path='rows')
+    def add_row(self, request, pk=None):
+        """Autosave: add a row (project, task_description and optional day hours)."""
+        timesheet = self.get_own_timesheet()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        row = add_timesheet_row(timesheet, serializer.validated_data, self.get_expected_version())
+        response = self.autosave_response(timesheet, row=TimesheetRowSerializer(row).data)
+        response.status_code = status.HTTP_201_CREATED
+        return response
+
+    @action(detail=True, methods=['delete'], url_path=r'rows/(?P<row_id>\d+)')
+    def remove_row(self, request, pk=None, row_id=None):
+        """Autosave: remove a row."""
+        timesheet = self.get_own_timesheet()
+        remove_timesheet_row(timesheet, int(row_id), self.get_expected_version())
+        return self.autosave_response(timesheet)
 
     @action(detail=False, methods=['get'])
     def my_timesheets(self, request):
         """Get current user's timesheets."""
         employee = request.user.employee
-        timesheets = Timesheet.objects.filter(
-            employee=employee
-        ).select_related('employee', 'approved_by').prefetch_related('rows')
+        timesheets = Timesheet.objects.filter(employee=employee).with_rows()
         serializer = self.get_serializer(timesheets, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def copy_from(self, request):
+        """
+        Start a week from another week's rows.
+
+        Body: {"week_start": date, "source_week_start": date (default: the
+        latest earlier week), "include_hours": false}. The target timesheet is
+        created if needed; rows it already has are kept.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        week = get_week_bounds(serializer.validated_data['week_start'])
+        if week is None:
+            return Response(
+                {'detail': 'week_start must be the first day of a week of the month.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        timesheet = copy_timesheet_week(
+            request.user.employee,
+            week,
+            serializer.validated_data.get('source_week_start'),
+            serializer.validated_data['include_hours']
+        )
+        refresh_rows(timesheet)
+        return Response(TimesheetSerializer(timesheet).data, headers={'ETag': timesheet.etag})
+
+    @action(detail=False, methods=['get'])
+    def month(self, request):
+        """
+        Get a month as a compact week x project x day grid.
+
+        Query params: year, month (default: current month) and optionally
+        employee (id) for managers/HR; defaults to the current user.
+        """
+        today = timezone.localdate()
+        try:
+            year = int(request.query_params.get('year', today.year))
+            month = int(request.query_params.get('month', today.month))
+            employee_id = int(request.query_params.get('employee', request.user.employee.id))
+        except (TypeError, ValueError):
+            return Response(
+                {'detail': 'year, month and employee must be integers.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= month <= 12 or not 1 <= year <= MAX_YEAR:
+            return Response({'detail': 'Invalid year or month.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        timesheets = Timesheet.objects.filter(employee_id=employee_id)
+        if employee_id != request.user.employee.id:
+            timesheets = self.scope_queryset(timesheets)
+        return Response(get_month_grid(timesheets, year, month))
+
     @action(detail=False, methods=['get'])
     def team(self, request):
         """Get team's (subordinates') submitted timesheets for approval."""
@@ -120,16 +307,128 @@ class TimesheetViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        employee = user.employee
-        subordinates = Employee.objects.filter(reporting_manager=employee)
         timesheets = Timesheet.objects.filter(
-            employee__in=subordinates,
+            employee__reporting_manager=user.employee,
             status__in=['submitted', 'rejected']
-        ).select_related('employee', 'approved_by').prefetch_related('rows').order_by('-week_start')
+        ).with_rows().order_by('-week_start')
         
         serializer = self.get_serializer(timesheets, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def approval_queue(self, request):
+        """
+        Get submitted timesheets awaiting the current user's approval.
+
+        Query params: scope=direct|subtree|delegated (default direct),
+        cursor, page_size. Includes pending counts per reporting manager.
+        Rows carry can_review; subtree rows below your direct reports are
+        read-only for you.
+        """
+        scope = request.query_params.get('scope', 'direct')
+        if scope not in ['direct', 'subtree', 'delegated']:
+            return Response(
+                {'detail': 'scope must be one of direct, subtree, delegated.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        reviewer = request.user.employee
+        pending = get_approval_queue(reviewer, scope)
+        paginator = ApprovalQueuePagination()
+        # No view: the viewset's OrderingFilter would override the queue's keyset ordering
+        page = paginator.paginate_queryset(summarize_approval_queue(pending, reviewer), request)
+        response = paginator.get_paginated_response(page)
+        response.data['pending_by_manager'] = count_pending_by_manager(pending)
+        return response
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsHROrSystemAdmin])
+    def defaulters(self, request):
+        """
+        Get employees with missing or unsubmitted timesheets for a month.
+
+        Query params: year, month (default: current month), refresh=true to
+        bypass the cached report.
+        """
+        today = timezone.localdate()
+        try:
+            year = int(request.query_params.get('year', today.year))
+            month = int(request.query_params.get('month', today.month))
+        except (TypeError, ValueError):
+            return Response({'detail': 'year and month must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= month <= 12 or not 1 <= year <= MAX_YEAR:
+            return Response({'detail': 'Invalid year or month.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        refresh = request.query_params.get('refresh') in ['1', 'true']
+        return Response(get_defaulters(year, month, refresh=refresh))
+
+    @action(detail=False, methods=['get'])
+    def reconciliation(self, request):
+        """
+        Hours logged on approved-leave days or holidays.
+
+        Query params: from, to (YYYY-MM-DD; default: the current month).
+        Covers the timesheets the current user can see.
+        """
+        today = timezone.localdate()
+        try:
+            start = date.fromisoformat(request.query_params.get('from', today.replace(day=1).isoformat()))
+            end = request.query_params.get('to')
+            end = date.fromisoformat(end) if end else get_month_weeks(start.year, start.month)[-1][1]
+        except ValueError:
+            return Response({'detail': 'from/to must be YYYY-MM-DD dates.'}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start or (end - start).days > 366:
+            return Response(
+                {'detail': 'to must be on or after from, at most a year apart.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        conflicts = reconcile_timesheets(self.scope_queryset(Timesheet.objects.all()), start, end)
+        return Response({'from': start, 'to': end, 'count': len(conflicts), 'conflicts': conflicts})
+
+    @action(detail=False, methods=['get'])
+    def turnaround(self, request):
+        """
+        Review turnaround per reviewer from the status history.
+
+        Query params: from, to (dates, on the decision time), sla_hours
+        (default 48). HR and admins see every reviewer; reporting managers
+        see their own figures.
+        """
+        user = request.user
+        roles = set(user.get_role_names())
+        if roles & {'system_admin', 'hr_user'}:
+            manager_ids = None
+        elif 'reporting_manager' in roles:
+            manager_ids = [user.employee.id]
+        else:
+            return Response(
+                {'detail': 'Only reporting managers, HR and admins can view turnaround.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            start = request.query_params.get('from')
+            end = request.query_params.get('to')
+            start = start and timezone.make_aware(datetime.combine(date.fromisoformat(start), time.min))
+            end = end and timezone.make_aware(datetime.combine(date.fromisoformat(end) + timedelta(days=1), time.min))
+            sla_hours = float(request.query_params.get('sla_hours', 48))
+        except ValueError:
+            return Response(
+                {'detail': 'from/to must be YYYY-MM-DD dates and sla_hours a number.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # Also rejects nan and inf, which float() accepts
+        if not 0 < sla_hours <= MAX_SLA_HOURS:
+            return Response(
+                {'detail': f'sla_hours must be greater than 0 and at most {MAX_SLA_HOURS}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'sla_hours': sla_hours,
+            'reviewers': get_review_turnaround(start, end, timedelta(hours=sla_hours), manager_ids),
+        })
+
     @action(detail=True, methods=['post'])
     def submit(self, request, pk=None):
         """Submit a timesheet."""
@@ -148,19 +447,36 @@ class TimesheetViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Validate daily hours before submission
-        try:
-            timesheet.validate_daily_hours()
-        except ValidationError as e:
-            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        
-        timesheet.status = 'submitted'
-        timesheet.submitted_at = timezone.now()
-        timesheet.save()
+        with transaction.atomic():
+            timesheet.status = 'submitted'
+            timesheet.submitted_at = timezone.now()
+            timesheet.save()
+            record_transitions([timesheet.id], 'draft', 'submitted', request.user.employee, timesheet.submitted_at)
         
         serializer = self.get_serializer(timesheet)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def submit_month(self, request):
+        """
+        Submit all of the current user's draft timesheets for a month.
+
+        Body: {"year": 2025, "month": 12}. Returns a per-week outcome list;
+        weeks that cannot be submitted are reported without blocking the rest.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = submit_month(
+            request.user.employee,
+            serializer.validated_data['year'],
+            serializer.validated_data['month']
+        )
+        return Response({
+            'submitted': sum(1 for result in results if result['success']),
+            'results': results,
+        })
+
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         """Approve a timesheet."""
@@ -179,10 +495,12 @@ class TimesheetViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        timesheet.status = 'approved'
-        timesheet.approved_at = timezone.now()
-        timesheet.approved_by = request.user.employee
-        timesheet.save()
+        with transaction.atomic():
+            timesheet.status = 'approved'
+            timesheet.approved_at = timezone.now()
+            timesheet.approved_by = request.user.employee
+            timesheet.save()
+            record_transitions([timesheet.id], 'submitted', 'approved', request.user.employee, timesheet.approved_at)
         
         serializer = self.get_serializer(timesheet)
         return Response(serializer.data)
@@ -208,16 +526,93 @@ class TimesheetViewSet(viewsets.ModelViewSet):
         serializer = TimesheetApprovalSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        timesheet.status = 'rejected'
-        timesheet.rejection_reason = serializer.validated_data.get('rejection_reason', '')
-        timesheet.save()
+        with transaction.atomic():
+            timesheet.status = 'rejected'
+            timesheet.rejection_reason = serializer.validated_data.get('rejection_reason', '')
+            timesheet.save()
+            record_transitions([timesheet.id], 'submitted', 'rejected', request.user.employee, timezone.now())
         
         serializer = self.get_serializer(timesheet)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def bulk_review(self, request):
+        """
+        Approve or reject a batch of timesheets.
+
+        Body: {"ids": [...], "action": "approve"|"reject", "rejection_reason": "..."}
+        Returns a per-id outcome list; ids that cannot be transitioned are
+        reported individually without failing the whole batch.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = review_timesheets(
+            request.user.employee,
+            serializer.validated_data['ids'],
+            serializer.validated_data['action'],
+            serializer.validated_data.get('rejection_reason', '')
+        )
+        return Response({
+            'updated': sum(1 for result in results if result['success']),
+            'results': results,
+        })
 
-# Import Employee at the end to avoid circular imports
-from employees.models import Employee
 
+class TimesheetTemplateViewSet(viewsets.ModelViewSet):
+    """The current user's saved timesheet templates."""
+    serializer_class = TimesheetTemplateSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
 
+    def get_queryset(self):
+        """Only the current user's templates."""
+        return TimesheetTemplate.objects.filter(employee=self.request.user.employee).prefetch_related(
+            Prefetch('rows', queryset=TimesheetTemplateRow.objects.select_related('project'))
+        )
+
+    def get_serializer_class(self):
+        """Return appropriate serializer based on action."""
+        if self.action == 'apply':
+            return TimesheetTemplateApplySerializer
+        return TimesheetTemplateSerializer
+
+    def perform_create(self, serializer):
+        """Templates belong to the current user."""
+        serializer.save(employee=self.request.user.employee)
+
+    def perform_destroy(self, instance):
+        """Soft delete the template."""
+        instance.soft_delete()
+
+    @action(detail=True, methods=['post'])
+    def apply(self, request, pk=None):
+        """
+        Pre-populate weeks of a month from this template.
+
+        Body: {"year": 2025, "month": 12, "weeks": [2, 3]} where weeks are
+        1-based positions in the month (default: every week).
+        """
+        template = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        month_weeks = get_month_weeks(serializer.validated_data['year'], serializer.validated_data['month'])
+        numbers = serializer.validated_data.get('weeks') or range(1, len(month_weeks) + 1)
+        if any(number > len(month_weeks) for number in numbers):
+            return Response(
+                {'detail': f'This month has {len(month_weeks)} weeks.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        results = apply_timesheet_template(template, [month_weeks[number - 1] for number in sorted(set(numbers))])
+        return Response([
+            {
+                'id': timesheet.id,
+                'week_start': timesheet.week_start,
+                'week_end': timesheet.week_end,
+                'rows_added': added,
+                'total_hours': timesheet.total_hours,
+            }
+            for timesheet, added in results
+        ])